@@ -0,0 +1,9 @@
+from django.db import transaction
+
+
+class AtomicSaveMixin:
+    """Сохраняет объект в транзакции вместе с обработчиками post_save (счетчики курса)"""
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "django_filters",
     "drf_yasg",
@@ -169,6 +170,33 @@ if CACHE_ENABLED:
         }
     }
 
+if "test" in sys.argv:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+RESPONSE_CACHE_TIMEOUT = 60 * 15
+# Сколько устаревший ответ хранится после истечения, чтобы отдавать его, пока другой процесс пересчитывает запись
+CACHE_STALE_GRACE = int(os.getenv("CACHE_STALE_GRACE", 60 * 5))
+# Кэш сериализованных представлений отдельных курсов и уроков для списков
+FRAGMENT_CACHE = os.getenv("FRAGMENT_CACHE", "True").lower() == "true"
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+# Справочные данные (курс по умолчанию, модераторы, города): LRU в памяти процесса перед Redis
+REFERENCE_CACHE = os.getenv("REFERENCE_CACHE", "True").lower() == "true"
+if "test" in sys.argv:
+    # TestCase откатывает созданные строки, а кэш в памяти процесса переживает тест, поэтому в тестах он включается явно
+    REFERENCE_CACHE = False
+REFERENCE_CACHE_TIMEOUT = 60 * 60
+REFERENCE_CACHE_LOCAL_TIMEOUT = 60
+# Множества id курсов, на которые подписан пользователь, для признака is_subscribed
+SUBSCRIPTION_CACHE = os.getenv("SUBSCRIPTION_CACHE", "True").lower() == "true"
+if "test" in sys.argv:
+    # как и справочный кэш, множества переживают откат TestCase, поэтому в тестах кэш включается явно
+    SUBSCRIPTION_CACHE = False
+SUBSCRIPTION_CACHE_TIMEOUT = 60 * 60 * 24
+
 
 # Logging settings
 
@@ -185,10 +213,55 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "lms.paginators.PageNumberOrKeysetPagination",
     "PAGE_SIZE": 10,
 }
 
+# Кодирование и разбор JSON через orjson (вывод совпадает со стандартным JSONRenderer)
+FAST_JSON = os.getenv("FAST_JSON", "True").lower() == "true"
+if FAST_JSON:
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] = [
+        "lms.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ]
+    REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"] = [
+        "lms.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ]
+
+# Быстрые read-only сериализаторы списков курсов и уроков поверх values()
+
+FAST_LIST_SERIALIZERS = os.getenv("FAST_LIST_SERIALIZERS", "True").lower() == "true"
+COURSE_DOCUMENTS = os.getenv("COURSE_DOCUMENTS", "True").lower() == "true"
+if "test" in sys.argv:
+    # TestCase не выполняет on_commit, поэтому представления курсов в тестах включаются явно
+    COURSE_DOCUMENTS = False
+LESSONS_PREVIEW_SIZE = int(os.getenv("LESSONS_PREVIEW_SIZE", 5))
+LESSON_BULK_MAX_SIZE = int(os.getenv("LESSON_BULK_MAX_SIZE", 1000))
+SUBSCRIPTION_BULK_MAX_SIZE = int(os.getenv("SUBSCRIPTION_BULK_MAX_SIZE", 500))
+BUNDLE_IMPORT_BATCH_SIZE = int(os.getenv("BUNDLE_IMPORT_BATCH_SIZE", 1000))
+# Курсы, у которых уроков, подписок и покупок в сумме не меньше порога, удаляются асинхронно (0 - только по ?async=true)
+COURSE_ASYNC_DELETE_THRESHOLD = int(os.getenv("COURSE_ASYNC_DELETE_THRESHOLD", 1000))
+COURSE_DELETE_BATCH_SIZE = int(os.getenv("COURSE_DELETE_BATCH_SIZE", 1000))
+COURSE_DELETE_TASK_SECONDS = int(os.getenv("COURSE_DELETE_TASK_SECONDS", 60))
+COURSE_DELETE_STALLED_AFTER = timedelta(minutes=int(os.getenv("COURSE_DELETE_STALLED_AFTER_MINUTES", 30)))
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", 500))
+SYNC_TOMBSTONE_RETENTION = timedelta(days=int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", 30)))
+# Насколько курсор прочитанного до конца источника отступает от начала синхронизации: строки, записанные раньше,
+# но зафиксированные после чтения, придут в следующей синхронизации (клиент применяет строки по id повторно)
+SYNC_SAFETY_MARGIN = timedelta(seconds=int(os.getenv("SYNC_SAFETY_MARGIN_SECONDS", 60)))
+
+# Статический экспорт каталога, отдается nginx из CATALOG_EXPORT_ROOT/public по адресу CATALOG_EXPORT_URL,
+# рабочие файлы экспорта пишутся в CATALOG_EXPORT_ROOT/work на той же файловой системе
+CATALOG_EXPORT = os.getenv("CATALOG_EXPORT", "True").lower() == "true"
+if "test" in sys.argv:
+    CATALOG_EXPORT = False
+CATALOG_EXPORT_ROOT = Path(os.getenv("CATALOG_EXPORT_ROOT", BASE_DIR / "catalog"))
+CATALOG_EXPORT_URL = "/catalog/"
+CATALOG_EXPORT_KEEP_VERSIONS = int(os.getenv("CATALOG_EXPORT_KEEP_VERSIONS", 3))
+CATALOG_EXPORT_DEBOUNCE = int(os.getenv("CATALOG_EXPORT_DEBOUNCE", 60))
+
 # CORS
 
 CORS_ALLOWED_ORIGINS = [
@@ -212,11 +285,26 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 
+if "test" in sys.argv:
+    CELERY_TASK_ALWAYS_EAGER = True
+
 CELERY_BEAT_SCHEDULE = {
     "block_nonactive_user": {
         "task": "lms.tasks.block_nonactive_user",
         "schedule": timedelta(hours=24),
     },
+    "purge_tombstones": {
+        "task": "lms.tasks.purge_tombstones",
+        "schedule": timedelta(hours=24),
+    },
+    "export_catalog": {
+        "task": "lms.tasks.export_catalog",
+        "schedule": timedelta(hours=1),
+    },
+    "resume_course_deletions": {
+        "task": "lms.tasks.resume_course_deletions",
+        "schedule": timedelta(minutes=30),
+    },
 }
 
 
@@ -1,25 +1,179 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db import transaction
+from django.utils import timezone
 
 from lms.models import Course, Lesson
+from lms.paginators import EstimatedCountPaginator
+from lms.signals import courses_bulk_updated, lessons_bulk_saved
+from users.models import CustomUser
+
+
+class RelatedIdFilter(admin.SimpleListFilter):
+    """
+    Фильтр списка по id связанного объекта из поля ввода.
+    В отличие от фильтра по внешнему ключу не загружает и не выводит все курсы или всех пользователей
+    """
+
+    template = "admin/lms/related_id_filter.html"
+    field_name = None
+
+    def lookups(self, request, model_admin):
+        # фильтр выводится, только если есть варианты, сами варианты шаблон не показывает
+        return [(self.value(), self.value())]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(**{f"{self.field_name}_id": value})
+        return queryset
+
+    def choices(self, changelist):
+        """Передает в шаблон сброс фильтра и параметры запроса, которые форма фильтра должна сохранить"""
+
+        yield {
+            "selected": self.value() is None,
+            "query_string": changelist.get_query_string(remove=[self.parameter_name]),
+            "display": "Все",
+            "params": [
+                (name, value)
+                for name, values in changelist.filter_params.items()
+                if name != self.parameter_name
+                for value in values
+            ],
+        }
+
+
+class CategoryIdFilter(RelatedIdFilter):
+    title = "курсу (id)"
+    parameter_name = "category_id"
+    field_name = "category"
+
+
+class OwnerIdFilter(RelatedIdFilter):
+    title = "владельцу (id)"
+    parameter_name = "owner_id"
+    field_name = "owner"
+
+
+def autocomplete_choice(model, field_name, queryset, label):
+    """Поле формы действия с выбором объекта через автодополнение (варианты не загружаются целиком)"""
+
+    return forms.ModelChoiceField(
+        queryset=queryset,
+        required=False,
+        label=label,
+        widget=AutocompleteSelect(model._meta.get_field(field_name), admin.site),
+    )
+
+
+class CourseActionForm(ActionForm):
+    """Форма действий со списком курсов: значения для массового изменения"""
+
+    price = forms.DecimalField(label="Цена", required=False, max_digits=8, decimal_places=2, min_value=0)
+    owner = autocomplete_choice(Course, "owner", CustomUser.objects.all(), "Владелец")
+
+
+class LessonActionForm(CourseActionForm):
+    """Форма действий со списком уроков"""
+
+    owner = autocomplete_choice(Lesson, "owner", CustomUser.objects.all(), "Владелец")
+    category = autocomplete_choice(Lesson, "category", Course.visible.all(), "Курс")
+
+
+class BulkUpdateAdmin(admin.ModelAdmin):
+    """
+    Список без точного COUNT(*) по большим таблицам и массовые действия, которые меняют выбранные строки
+    одним UPDATE (сигналы при этом не отправляются, их работу выполняет bulk_updated)
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ("reprice", "reassign_owner")
+    bulk_fields = ("pk",)
+
+    def get_action_value(self, request, name):
+        """Возвращает значение поля формы действия или None, сообщив об ошибке"""
+
+        form = self.action_form(request.POST, auto_id=None)
+        form.fields["action"].choices = self.get_action_choices(request)
+        if form.is_valid() and form.cleaned_data[name] is not None:
+            return form.cleaned_data[name]
+        self.message_user(request, f"Укажите поле «{form.fields[name].label}»", level=messages.ERROR)
+        return None
+
+    def bulk_update(self, request, queryset, **values):
+        """Изменяет выбранные строки одним UPDATE в транзакции вместе с действиями сигналов"""
+
+        with transaction.atomic():
+            rows = list(queryset.values_list(*self.bulk_fields))
+            updated = queryset.order_by().update(updated_at=timezone.now(), **values)
+            self.bulk_updated(rows, values)
+        self.message_user(request, f"Изменено записей: {updated}", level=messages.SUCCESS)
+
+    def bulk_updated(self, rows, values):
+        """
+        Получает строки bulk_fields до изменения и новые значения, выполняет работу обработчиков сигналов.
+        По умолчанию ничего не делает: модели без обработчиков сигналов его не переопределяют
+        """
+
+    @admin.action(description="Изменить цену")
+    def reprice(self, request, queryset):
+        price = self.get_action_value(request, "price")
+        if price is not None:
+            self.bulk_update(request, queryset, price=price)
+
+    @admin.action(description="Сменить владельца")
+    def reassign_owner(self, request, queryset):
+        owner = self.get_action_value(request, "owner")
+        if owner is not None:
+            self.bulk_update(request, queryset, owner=owner)
 
 
 @admin.register(Course)
-class CoursesAdmin(admin.ModelAdmin):
+class CoursesAdmin(BulkUpdateAdmin):
     """Добавляет курсы в админ-панель"""
 
-    list_display = ("id", "title", "preview", "description", "price")
+    list_display = ("id", "title", "preview", "description", "owner", "price")
     list_editable = ("title", "preview", "description", "price")
+    list_select_related = ("owner",)
+    autocomplete_fields = ("owner",)
     search_fields = (
         "id",
         "title",
     )
+    action_form = CourseActionForm
+
+    def bulk_updated(self, rows, values):
+        courses_bulk_updated([pk for (pk,) in rows])
 
 
 @admin.register(Lesson)
-class LessonsAdmin(admin.ModelAdmin):
+class LessonsAdmin(BulkUpdateAdmin):
     """Добавляет уроки в админ-панель"""
 
     list_display = ("id", "title", "category", "owner", "price", "created_at")
-    list_editable = ("title", "category", "owner", "price")
-    list_filter = ("category", "owner")
+    # курс и владелец меняются действиями и в форме урока: в строках списка выпадающие списки были бы огромными
+    list_editable = ("title", "price")
+    list_select_related = ("category", "owner")
+    list_filter = (CategoryIdFilter, OwnerIdFilter)
+    autocomplete_fields = ("category", "owner")
     search_fields = ("id", "title")
+    action_form = LessonActionForm
+    actions = (*BulkUpdateAdmin.actions, "move_category")
+    bulk_fields = ("pk", "category_id")
+
+    def bulk_updated(self, rows, values):
+        """Переносит счетчики уроков между курсами и инвалидирует и прежние, и новые курсы"""
+
+        category = values.get("category")
+        lessons = [Lesson(pk=pk, category_id=category.pk if category else category_id) for pk, category_id in rows]
+        lessons_bulk_saved(lessons, dict(rows))
+
+    @admin.action(description="Перенести в курс")
+    def move_category(self, request, queryset):
+        category = self.get_action_value(request, "category")
+        if category is not None:
+            self.bulk_update(request, queryset, category=category)
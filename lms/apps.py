@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LmsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "lms"
+
+    def ready(self):
+        """Подключает обработчики сигналов моделей"""
+        import lms.signals  # noqa: F401
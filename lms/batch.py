@@ -0,0 +1,60 @@
+from drf_yasg import openapi
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.response import Response
+
+BATCH_IDS_PARAMETER = openapi.Parameter(
+    "ids", openapi.IN_QUERY, description="Идентификаторы через запятую, например 1,2,3", type=openapi.TYPE_STRING
+)
+
+
+class BatchRetrieveMixin:
+    """
+    Пакетное получение объектов по ?ids=1,2,3 одним запросом id__in с теми же аннотациями и prefetch, что и retrieve.
+    Объектные права проверяются для каждого объекта без дополнительных запросов к БД
+    (принадлежность к модераторам определяется один раз на запрос).
+    Результаты возвращаются в порядке id из запроса, недоступные id - с кодом и текстом ошибки
+    """
+
+    batch_query_param = "ids"
+    batch_max_size = 50
+
+    def get_batch_ids(self):
+        """Возвращает уникальные id из параметра запроса в исходном порядке"""
+
+        raw = self.request.query_params.get(self.batch_query_param, "")
+        try:
+            ids = list(dict.fromkeys(int(value) for value in raw.split(",") if value.strip()))
+        except ValueError:
+            raise ValidationError({self.batch_query_param: "Идентификаторы должны быть целыми числами"})
+        if not ids:
+            raise ValidationError({self.batch_query_param: "Укажите хотя бы один идентификатор"})
+        if len(ids) > self.batch_max_size:
+            raise ValidationError({self.batch_query_param: f"Не более {self.batch_max_size} идентификаторов"})
+        return ids
+
+    def batch_retrieve(self, request, *args, **kwargs):
+        """Возвращает объекты по списку id с ошибкой для каждого ненайденного или недоступного объекта"""
+
+        ids = self.get_batch_ids()
+        objects = {obj.pk: obj for obj in self.get_queryset().filter(pk__in=ids)}
+
+        allowed = []
+        errors = {}
+        for pk in ids:
+            try:
+                if pk not in objects:
+                    raise NotFound()
+                self.check_object_permissions(request, objects[pk])
+            except APIException as exc:
+                errors[pk] = exc
+            else:
+                allowed.append(objects[pk])
+
+        data = dict(zip((obj.pk for obj in allowed), self.get_serializer(allowed, many=True).data))
+        results = []
+        for pk in ids:
+            if pk in errors:
+                results.append({"id": pk, "status": errors[pk].status_code, "detail": errors[pk].detail})
+            else:
+                results.append({"id": pk, "status": 200, "data": data[pk]})
+        return Response({"results": results})
@@ -0,0 +1,139 @@
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from rest_framework.exceptions import ValidationError
+
+from lms.models import Lesson
+from lms.renderers import FastJSONRenderer
+from lms.serializers import CourseBundleSerializer, LessonBundleSerializer
+from lms.signals import lessons_bulk_saved
+
+BUNDLE_FORMAT = 1
+BUNDLE_MAX_LINE_SIZE = 1024 * 1024
+
+
+def _bundle_line(kind, row):
+    """Кодирует строку пакета: объект JSON с типом записи, цена - строкой, как в API"""
+
+    row = {"type": kind, **row}
+    row["price"] = str(row["price"])
+    return FastJSONRenderer().render(row) + b"\n"
+
+
+def iter_course_bundle(course, chunk_size=2000):
+    """
+    Генерирует пакет курса course (загруженного до начала выгрузки) в формате NDJSON:
+    первая строка - курс, затем уроки в порядке id.
+    Уроки читаются итератором пачками по chunk_size, поэтому память не зависит от размера курса.
+    id, курс и владелец в пакет не входят: они задаются при импорте
+    """
+
+    row = {name: getattr(course, name) for name in CourseBundleSerializer.Meta.fields}
+    yield _bundle_line("course", {"format": BUNDLE_FORMAT, **row})
+    lessons = Lesson.objects.filter(category_id=course.pk).order_by("pk").values(*LessonBundleSerializer.Meta.fields)
+    for row in lessons.iterator(chunk_size=chunk_size):
+        yield _bundle_line("lesson", row)
+
+
+def bundle_error(line, detail):
+    """Возвращает ValidationError с номером строки пакета"""
+
+    if not isinstance(detail, dict):
+        detail = {"non_field_errors": detail if isinstance(detail, list) else [detail]}
+    return ValidationError({"line": line, **detail})
+
+
+def read_bundle(stream, max_size=BUNDLE_MAX_LINE_SIZE):
+    """Читает пакет построчно и возвращает пары (номер строки, объект), пустые строки пропускаются"""
+
+    number = 0
+    while True:
+        line = stream.readline(max_size + 1)
+        if not line:
+            return
+        number += 1
+        if len(line) > max_size and not line.endswith(b"\n"):
+            raise bundle_error(number, f"Строка длиннее {max_size} байт")
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise bundle_error(number, "Некорректный JSON")
+        if not isinstance(row, dict):
+            raise bundle_error(number, "Строка пакета должна быть объектом JSON")
+        yield number, row
+
+
+def _create_course(number, row, owner):
+    """Проверяет первую строку пакета и создает курс"""
+
+    if row.get("type") != "course":
+        raise bundle_error(number, "Пакет должен начинаться с курса")
+    if row.get("format", BUNDLE_FORMAT) != BUNDLE_FORMAT:
+        raise bundle_error(number, f"Неподдерживаемая версия пакета {row['format']}")
+    serializer = CourseBundleSerializer(data=row)
+    if not serializer.is_valid():
+        raise bundle_error(number, serializer.errors)
+    return serializer.save(owner=owner)
+
+
+def _create_lessons(course, owner, batch):
+    """
+    Создает пачку уроков одним bulk_create. Занятые названия проверяются одним запросом:
+    уроки предыдущих пачек уже записаны в этой транзакции, поэтому повторы между пачками тоже находятся
+    """
+
+    titles = {}
+    for number, attrs in batch:
+        if attrs["title"] in titles:
+            raise bundle_error(number, {"title": ["Название повторяется в пакете"]})
+        titles[attrs["title"]] = number
+    taken = Lesson.objects.filter(title__in=titles).values_list("title", flat=True).first()
+    if taken is not None:
+        raise bundle_error(titles[taken], {"title": ["Урок с таким наименованием уже существует"]})
+
+    lessons = Lesson.objects.bulk_create(Lesson(category=course, owner=owner, **attrs) for _, attrs in batch)
+    lessons_bulk_saved(lessons)
+    return len(lessons)
+
+
+def import_course_bundle(stream, owner=None, batch_size=None):
+    """
+    Импортирует пакет курса из бинарного потока (файл, тело запроса) в одной транзакции:
+    строки разбираются по одной, уроки записываются пачками по batch_size через bulk_create,
+    поэтому память не зависит от размера пакета. При ошибке в любой строке ничего не сохраняется,
+    ValidationError содержит номер строки. Возвращает (курс, количество уроков)
+    """
+
+    batch_size = batch_size or settings.BUNDLE_IMPORT_BATCH_SIZE
+    lesson_serializer = LessonBundleSerializer()
+    course = None
+    count = 0
+    batch = []
+    try:
+        with transaction.atomic():
+            for number, row in read_bundle(stream):
+                if course is None:
+                    course = _create_course(number, row, owner)
+                    continue
+                if row.get("type") != "lesson":
+                    raise bundle_error(number, "Ожидается урок")
+                try:
+                    batch.append((number, lesson_serializer.run_validation(row)))
+                except ValidationError as exc:
+                    raise bundle_error(number, exc.detail)
+                if len(batch) >= batch_size:
+                    count += _create_lessons(course, owner, batch)
+                    batch = []
+            if course is None:
+                raise bundle_error(0, "Пакет пуст")
+            if batch:
+                count += _create_lessons(course, owner, batch)
+    except IntegrityError:
+        raise ValidationError(
+            {"non_field_errors": ["Пакет конфликтует с параллельными изменениями, повторите импорт"]}
+        )
+    return course, count
@@ -0,0 +1,499 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import partial, update_wrapper
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from redis.exceptions import WatchError
+from rest_framework.response import Response
+
+CACHE_PREFIX = "lms"
+RESPONSE_CACHE_NAMES = ("courses-list", "courses-retrieve", "courses-lessons", "lessons-list", "lessons-retrieve")
+CACHE_EVENTS = ("hits", "misses", "stale", "lock_waits")
+RECOMPUTE_LOCK_TIMEOUT = 10
+RECOMPUTE_LOCK_WAIT = 2
+RECOMPUTE_POLL_INTERVAL = 0.05
+REFERENCE_INVALIDATION_CHANNEL = f"{CACHE_PREFIX}:reference:invalidate"
+# элемент, который всегда есть в построенном множестве подписок: пустое множество Redis не хранит
+SUBSCRIPTIONS_LOADED_MARKER = 0
+SUBSCRIPTIONS_UPDATE_SCRIPT = """
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call(ARGV[1], KEYS[1], unpack(ARGV, 3))
+end
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def get_redis_client():
+    """Возвращает клиент Redis настроенного кэша или None, если кэш не в Redis"""
+
+    redis_cache = getattr(cache, "_cache", None)
+    if redis_cache is None or not hasattr(redis_cache, "get_client"):
+        return None
+    return redis_cache.get_client(write=True)
+
+
+def _incr(key, initial=0):
+    """Атомарно увеличивает счетчик в кэше, создавая его со значением initial при отсутствии"""
+
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, timeout=None)
+        return cache.incr(key)
+
+
+def _new_version():
+    """
+    Начальное значение версии - текущее время в микросекундах: версия, вытесненная из кэша и созданная заново,
+    не повторяет прежних значений (по версиям строятся ETag списков)
+    """
+    return time.time_ns() // 1000
+
+
+def _version_key(namespace):
+    """Возвращает ключ версии пространства имен"""
+    return f"{CACHE_PREFIX}:version:{namespace}"
+
+
+def _stats_key(name, event):
+    """Возвращает ключ счетчика попаданий/промахов"""
+    return f"{CACHE_PREFIX}:stats:{name}:{event}"
+
+
+def bump_versions(*namespaces):
+    """Инвалидирует все закэшированные ответы, зависящие от переданных пространств имен"""
+
+    for namespace in namespaces:
+        _incr(_version_key(namespace), _new_version())
+
+
+def run_on_commit(func, *args, **kwargs):
+    """
+    Вызывает func(*args, **kwargs) после фиксации текущей транзакции (вне транзакции - сразу),
+    ошибка записывается в журнал.
+    Django пишет в журнал __qualname__ обработчика, которого у partial нет, поэтому имя копируется из func
+    """
+    transaction.on_commit(update_wrapper(partial(func, *args, **kwargs), func), robust=True)
+
+
+def bump_versions_on_commit(*namespaces):
+    """
+    Инвалидирует ответы после фиксации текущей транзакции (вне транзакции - сразу).
+    Если поднять версию до фиксации, параллельный запрос прочитает еще старые строки
+    и закэширует их под новой версией
+    """
+    run_on_commit(bump_versions, *namespaces)
+
+
+def get_versions(namespaces):
+    """Возвращает текущие версии пространств имен одним обращением к кэшу (отсутствующие версии создаются)"""
+
+    keys = [_version_key(namespace) for namespace in namespaces]
+    stored = cache.get_many(keys)
+    missing = [key for key in keys if key not in stored]
+    if missing:
+        for key in missing:
+            cache.add(key, _new_version(), timeout=None)
+        stored.update(cache.get_many(missing))
+    return tuple(stored.get(key, 0) for key in keys)
+
+
+def record_cache_event(name, event):
+    """
+    Увеличивает счетчик события кэша: попадание (hits), промах (misses),
+    отдача устаревшего значения (stale) или ожидание пересчета другим процессом (lock_waits)
+    """
+    _incr(_stats_key(name, event))
+
+
+def get_response_cache_stats(names):
+    """Возвращает словарь {имя: {событие: счетчик}} для переданных имен кэшей и событий CACHE_EVENTS"""
+
+    keys = {(name, event): _stats_key(name, event) for name in names for event in CACHE_EVENTS}
+    stored = cache.get_many(list(keys.values()))
+    stats = {}
+    for (name, event), key in keys.items():
+        stats.setdefault(name, {})[event] = stored.get(key, 0)
+    return stats
+
+
+def get_or_recompute(key, versions, recompute, name, timeout, grace=None):
+    """
+    Возвращает значение из кэша с защитой от одновременного пересчета (cache stampede).
+    Запись свежая, пока совпадают версии и не истек timeout. Устаревшую запись пересчитывает
+    только процесс, взявший короткую блокировку cache.add, остальные в это время отдают
+    устаревшее значение (оно хранится еще grace секунд). Если записи нет совсем, процессы без блокировки
+    ждут результата до RECOMPUTE_LOCK_WAIT секунд или снятия блокировки, затем считают сами.
+    recompute() возвращает (результат, значение для кэша или None, если кэшировать нельзя).
+    Возвращает (значение, состояние, версии значения): "hit", "stale" и "wait" - значение из кэша
+    (у устаревшего значения версии прежние), "miss" - результат recompute
+    """
+
+    grace = settings.CACHE_STALE_GRACE if grace is None else grace
+    entry = cache.get(key)
+    if entry is not None and len(entry) != 3:
+        # запись старого формата (версии, значение) без срока свежести
+        entry = None
+    if entry is not None and entry[0] == versions and time.time() < entry[2]:
+        record_cache_event(name, "hits")
+        return entry[1], "hit", entry[0]
+
+    lock_key = f"{key}:lock"
+    locked = cache.add(lock_key, 1, RECOMPUTE_LOCK_TIMEOUT)
+    if not locked and entry is not None:
+        record_cache_event(name, "stale")
+        return entry[1], "stale", entry[0]
+    if not locked:
+        record_cache_event(name, "lock_waits")
+        deadline = time.monotonic() + RECOMPUTE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(RECOMPUTE_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None and entry[0] == versions:
+                record_cache_event(name, "hits")
+                return entry[1], "wait", entry[0]
+            if not cache.has_key(lock_key):
+                # пересчет завершился, но результат не кэшируется (например, ответ с ошибкой)
+                break
+
+    record_cache_event(name, "misses")
+    try:
+        result, value = recompute()
+        if value is not None:
+            cache.set(key, (versions, value, time.time() + timeout), timeout + grace)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return result, "miss", versions
+
+
+class ResponseCacheMixin:
+    """
+    Кэширует ответы list/retrieve в Redis.
+    Ключ строится по маршруту, параметрам запроса и (при необходимости) пользователю,
+    а актуальность записи проверяется версиями пространств имен, которые увеличивают сигналы моделей
+    """
+
+    cache_basename = None
+    cache_per_user = False
+
+    def get_cache_namespaces(self, kind):
+        """Возвращает пространства имен, от которых зависит ответ"""
+
+        if kind == "list":
+            namespaces = [f"{self.cache_basename}:list"]
+        else:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            namespaces = [f"{self.cache_basename}:{self.kwargs[lookup_url_kwarg]}"]
+        if self.cache_per_user:
+            namespaces.append(f"users:{self.request.user.pk}")
+        return namespaces
+
+    def get_response_cache_key(self, kind):
+        """Формирует ключ ответа по маршруту, отсортированным параметрам запроса и пользователю"""
+
+        request = self.request
+        params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+        parts = [request.get_host(), request.path, repr(params)]
+        if self.cache_per_user:
+            parts.append(str(request.user.pk))
+        digest = hashlib.md5("|".join(parts).encode()).hexdigest()
+        return f"{CACHE_PREFIX}:response:{self.cache_basename}:{kind}:{digest}"
+
+    def cached_response(self, kind, handler, request, *args, **kwargs):
+        """
+        Возвращает ответ из кэша или вызывает обработчик и сохраняет успешный ответ.
+        Пока другой процесс пересчитывает инвалидированный ответ, отдается прежний (X-Cache: STALE)
+        с Cache-Control: no-cache. Версии, к которым относится тело ответа, сохраняются в response.cache_versions
+        """
+
+        if not settings.CACHE_ENABLED:
+            return handler(request, *args, **kwargs)
+
+        def recompute():
+            response = handler(request, *args, **kwargs)
+            return response, response.data if response.status_code == 200 else None
+
+        name = f"{self.cache_basename}-{kind}"
+        key = self.get_response_cache_key(kind)
+        versions = get_versions(self.get_cache_namespaces(kind))
+        result, state, served_versions = get_or_recompute(
+            key, versions, recompute, name, settings.RESPONSE_CACHE_TIMEOUT
+        )
+        response = result if state == "miss" else Response(result)
+        response.cache_versions = served_versions
+        response["X-Cache"] = "STALE" if state == "stale" else "MISS" if state == "miss" else "HIT"
+        if state == "stale":
+            response["Cache-Control"] = "no-cache"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """Возвращает список объектов через кэш ответов"""
+        return self.cached_response("list", super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Возвращает объект через кэш ответов"""
+        return self.cached_response("retrieve", super().retrieve, request, *args, **kwargs)
+
+
+class ReferenceCache:
+    """
+    Двухуровневый кэш небольших, редко меняющихся справочных данных: LRU в памяти процесса перед Redis.
+    Изменение данных поднимает поколение ключа, удаляет ключ из Redis и рассылает его через Redis pub/sub:
+    каждый процесс (воркеры gunicorn и Celery) слушает канал в фоновом потоке и удаляет ключ из своего LRU.
+    Записи LRU живут не дольше REFERENCE_CACHE_LOCAL_TIMEOUT на случай потерянного сообщения
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.listener_pid = None
+        # увеличивается при каждой инвалидации в процессе
+        self.local_generation = 0
+
+    @staticmethod
+    def redis_key(key):
+        """Возвращает ключ значения в Redis"""
+        return f"{CACHE_PREFIX}:reference:{key}"
+
+    @staticmethod
+    def namespace(key):
+        """Возвращает пространство имен версии (поколения) ключа"""
+        return f"reference:{key}"
+
+    def get(self, key, loader):
+        """
+        Возвращает значение из памяти процесса, затем из Redis, при промахе обоих вызывает loader().
+        Значение в Redis хранится с поколением ключа на момент до вызова loader(): если loader прочитал данные
+        до фиксации изменения, а записал их после инвалидации, запись со старым поколением не используется.
+        По той же причине в LRU не сохраняется значение, загрузка которого пересеклась с инвалидацией
+        """
+
+        if not settings.REFERENCE_CACHE:
+            return loader()
+        self.ensure_listener()
+
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(key)
+                return entry[0]
+            local_generation = self.local_generation
+
+        (generation,) = get_versions([self.namespace(key)])
+        stored = cache.get(self.redis_key(key))
+        if stored is None or len(stored) != 2 or stored[1] != generation:
+            stored = (loader(), generation)
+            cache.set(self.redis_key(key), stored, settings.REFERENCE_CACHE_TIMEOUT)
+        self.set_local(key, stored[0], local_generation)
+        return stored[0]
+
+    def set_local(self, key, value, generation=None):
+        """
+        Сохраняет значение в LRU процесса, вытесняя самые давние записи.
+        Если передано поколение процесса и с тех пор была инвалидация, значение не сохраняется
+        """
+
+        with self.lock:
+            if generation is not None and generation != self.local_generation:
+                return
+            self.entries[key] = (value, time.monotonic() + settings.REFERENCE_CACHE_LOCAL_TIMEOUT)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def drop_local(self, *keys):
+        """Удаляет ключи из LRU процесса (все ключи, если не переданы)"""
+
+        with self.lock:
+            self.local_generation += 1
+            if not keys:
+                self.entries.clear()
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def invalidate(self, *keys):
+        """Поднимает поколения ключей и удаляет ключи из Redis и из памяти всех процессов"""
+
+        bump_versions(*(self.namespace(key) for key in keys))
+        cache.delete_many([self.redis_key(key) for key in keys])
+        self.drop_local(*keys)
+        client = get_redis_client()
+        if client is not None:
+            for key in keys:
+                client.publish(REFERENCE_INVALIDATION_CHANNEL, key)
+
+    def ensure_listener(self):
+        """Запускает поток подписки на инвалидацию в текущем процессе (после fork - заново)"""
+
+        if self.listener_pid == os.getpid():
+            return
+        with self.lock:
+            if self.listener_pid == os.getpid():
+                return
+            self.listener_pid = os.getpid()
+            # записи, унаследованные от родительского процесса, могли пропустить инвалидацию
+            self.entries.clear()
+        client = get_redis_client()
+        if client is not None:
+            threading.Thread(target=self.listen, args=(client,), name="reference-cache", daemon=True).start()
+
+    def listen(self, client):
+        """Удаляет из LRU ключи из сообщений канала инвалидации, при обрыве соединения переподключается"""
+
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REFERENCE_INVALIDATION_CHANNEL)
+                # пока подписки не было, сообщения могли быть потеряны
+                self.drop_local()
+                for message in pubsub.listen():
+                    data = message["data"]
+                    self.drop_local(data.decode() if isinstance(data, bytes) else data)
+            except Exception:
+                logger.warning("Подписка на инвалидацию справочного кэша прервана", exc_info=True)
+                time.sleep(1)
+
+
+reference_cache = ReferenceCache()
+
+
+class SubscriptionCache:
+    """
+    Множества id курсов, на которые подписан пользователь, в Redis: подписка и отписка дописываются в множество
+    после фиксации транзакции (SADD/SREM), проверка страницы курсов - один SMISMEMBER.
+    Множество строится из БД при первом обращении. Запись увеличивает счетчик поколения пользователя,
+    а построение сохраняет множество только если поколение не изменилось (WATCH), поэтому множество,
+    прочитанное из БД до параллельной подписки, не перезаписывает ее.
+    Если кэш не в Redis, множество хранится значением кэша и при изменениях удаляется
+    """
+
+    def __init__(self):
+        # get_client() возвращает новый объект клиента при каждом вызове, поэтому скрипт регистрируется
+        # один раз, а клиент передается при вызове
+        self.update_script = None
+
+    @staticmethod
+    def name(user_id):
+        """Возвращает имя значения с подписками пользователя для API кэша Django"""
+        return f"{CACHE_PREFIX}:subscriptions:{user_id}"
+
+    def key(self, user_id):
+        """Возвращает ключ множества подписок пользователя в Redis"""
+        return cache.make_key(self.name(user_id))
+
+    @staticmethod
+    def generation_key(user_id):
+        """Возвращает ключ счетчика изменений подписок пользователя"""
+        return cache.make_key(f"{CACHE_PREFIX}:subscriptions-generation:{user_id}")
+
+    def get_subscribed(self, user_id, course_ids, loader):
+        """
+        Возвращает множество id из course_ids, на которые подписан пользователь.
+        loader() возвращает все id курсов пользователя из БД и вызывается при отсутствии множества
+        """
+
+        course_ids = list(course_ids)
+        if not course_ids:
+            return set()
+        client = get_redis_client()
+        if client is None:
+            subscribed = cache.get(self.name(user_id))
+            if subscribed is None:
+                subscribed = frozenset(loader())
+                cache.set(self.name(user_id), subscribed, settings.SUBSCRIPTION_CACHE_TIMEOUT)
+            return subscribed.intersection(course_ids)
+
+        loaded, *flags = client.smismember(self.key(user_id), [SUBSCRIPTIONS_LOADED_MARKER, *course_ids])
+        if loaded:
+            return {course_id for course_id, flag in zip(course_ids, flags) if flag}
+        return self.rebuild(user_id, loader).intersection(course_ids)
+
+    def rebuild(self, user_id, loader):
+        """Строит множество подписок из БД и сохраняет его, если подписки не менялись во время чтения"""
+
+        client = get_redis_client()
+        if client is None:
+            subscribed = frozenset(loader())
+            cache.set(self.name(user_id), subscribed, settings.SUBSCRIPTION_CACHE_TIMEOUT)
+            return subscribed
+
+        key = self.key(user_id)
+        with client.pipeline() as pipe:
+            pipe.watch(self.generation_key(user_id))
+            subscribed = frozenset(loader())
+            pipe.multi()
+            pipe.delete(key)
+            pipe.sadd(key, SUBSCRIPTIONS_LOADED_MARKER, *subscribed)
+            pipe.expire(key, settings.SUBSCRIPTION_CACHE_TIMEOUT)
+            try:
+                pipe.execute()
+            except WatchError:
+                # множество изменилось во время чтения, его построит следующий запрос
+                pass
+        return subscribed
+
+    def add(self, user_id, course_ids):
+        """Добавляет курсы в построенное множество подписок пользователя"""
+        self.update(user_id, course_ids, "SADD")
+
+    def remove(self, user_id, course_ids):
+        """Удаляет курсы из построенного множества подписок пользователя"""
+        self.update(user_id, course_ids, "SREM")
+
+    def update(self, user_id, course_ids, command):
+        """Применяет SADD/SREM к множеству, только если оно уже построено, и увеличивает поколение"""
+
+        course_ids = list(course_ids)
+        if not course_ids:
+            return
+        client = get_redis_client()
+        if client is None:
+            cache.delete(self.name(user_id))
+            return
+        if self.update_script is None:
+            self.update_script = client.register_script(SUBSCRIPTIONS_UPDATE_SCRIPT)
+        self.update_script(
+            keys=[self.key(user_id), self.generation_key(user_id)],
+            args=[command, settings.SUBSCRIPTION_CACHE_TIMEOUT, *course_ids],
+            client=client,
+        )
+
+    def get_cached(self, user_ids):
+        """Возвращает {id пользователя: множество id курсов} для пользователей с построенным множеством"""
+
+        user_ids = list(user_ids)
+        client = get_redis_client()
+        if client is None:
+            stored = cache.get_many([self.name(user_id) for user_id in user_ids])
+            return {user_id: set(stored[self.name(user_id)]) for user_id in user_ids if self.name(user_id) in stored}
+
+        with client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.smembers(self.key(user_id))
+            members = pipe.execute()
+        cached = {}
+        for user_id, values in zip(user_ids, members):
+            course_ids = {int(value) for value in values}
+            if SUBSCRIPTIONS_LOADED_MARKER in course_ids:
+                cached[user_id] = course_ids - {SUBSCRIPTIONS_LOADED_MARKER}
+        return cached
+
+    def delete(self, *user_ids):
+        """Удаляет множества подписок пользователей (следующее обращение построит их заново)"""
+        cache.delete_many([self.name(user_id) for user_id in user_ids])
+
+
+subscription_cache = SubscriptionCache()
@@ -0,0 +1,105 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from lms.cache import get_versions
+
+
+def make_etag(*parts):
+    """Формирует строгий ETag из частей, определяющих содержимое ответа"""
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """
+    Добавляет к list/retrieve валидаторы ETag и Last-Modified.
+    Валидаторы считаются до сериализации, поэтому для неизмененных ресурсов ответ 304 отдается
+    без запуска сериализатора. ETag строится по версиям кэша ответов (ResponseCacheMixin), а ETag самого ответа -
+    по версиям записи кэша, из которой взято тело. Если кэш выключен, ETag списка считается
+    по агрегатам get_list_validators, объекта - по get_object_validators.
+    Last-Modified отдается только там, где любое изменение сдвигает updated_at:
+    удаление строк из списка меняет лишь количество строк, поэтому для списков достаточно ETag
+    """
+
+    def get_conditional_queryset(self):
+        """Возвращает queryset, по которому считаются валидаторы списка"""
+        return self.get_queryset()
+
+    def get_list_validators(self, queryset):
+        """Возвращает кортеж (части ETag, Last-Modified) для страницы списка, (None, None) - без валидаторов"""
+        return None, None
+
+    def get_version_validators(self, kind):
+        """
+        Возвращает валидаторы по версиям пространств имен кэша ответов или None, если ответы не кэшируются.
+        Любое изменение, после которого закэшированный ответ устаревает, поднимает версию и меняет ETag,
+        поэтому проверка не читает таблиц
+        """
+
+        if not settings.CACHE_ENABLED or not hasattr(self, "get_cache_namespaces"):
+            return None
+        return get_versions(self.get_cache_namespaces(kind)), None
+
+    def get_object_validators(self, obj):
+        """Возвращает кортеж (части ETag, Last-Modified) для объекта"""
+        return (obj.pk, obj.updated_at), self.get_object_last_modified(obj)
+
+    def get_object_last_modified(self, obj):
+        """Возвращает Last-Modified объекта или None, если updated_at сдвигается не при каждом изменении ответа"""
+        return obj.updated_at
+
+    def get_object(self):
+        """Запоминает объект, чтобы не загружать его повторно при формировании ответа"""
+
+        if not hasattr(self, "_conditional_object"):
+            self._conditional_object = super().get_object()
+        return self._conditional_object
+
+    def conditional_response(self, validators, handler, request, *args, **kwargs):
+        """
+        Возвращает 304, если клиентская копия актуальна, иначе ответ обработчика с валидаторами.
+        ETag ответа из кэша ответов строится по версиям отданной записи (response.cache_versions):
+        устаревшая запись (X-Cache: STALE) получает свой прежний ETag, и повторная проверка с ним 304 не вернет
+        """
+
+        etag_parts, last_modified = validators
+        if etag_parts is None and last_modified is None:
+            return handler(request, *args, **kwargs)
+        etag = make_etag(request.get_full_path(), request.user.pk, *etag_parts)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            served_versions = getattr(response, "cache_versions", None)
+            if served_versions is not None:
+                etag = make_etag(request.get_full_path(), request.user.pk, *served_versions)
+            if response.get("X-Cache") == "STALE":
+                # Last-Modified считается по текущей строке, а не по отданному телу
+                timestamp = None
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """Возвращает список объектов с поддержкой условных запросов"""
+
+        validators = self.get_version_validators("list")
+        if validators is None:
+            validators = self.get_list_validators(self.filter_queryset(self.get_conditional_queryset()).order_by())
+        return self.conditional_response(validators, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Возвращает объект с поддержкой условных запросов"""
+
+        obj = self.get_object()
+        validators = self.get_version_validators("retrieve")
+        if validators is None:
+            validators = self.get_object_validators(obj)
+        else:
+            validators = validators[0], self.get_object_last_modified(obj)
+        return self.conditional_response(validators, super().retrieve, request, *args, **kwargs)
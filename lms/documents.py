@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.utils import timezone
+
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from lms.cache import CACHE_PREFIX, bump_versions_on_commit
+from lms.models import Course, CourseDocument
+from lms.serializers import CourseSerializer
+from lms.services import COURSE_REQUIRED_COLUMNS, annotate_courses
+
+DOCUMENT_OVERLAY_FIELDS = ("lessons_amount", "subscribers_amount", "purchases_amount", "is_subscribed")
+DOCUMENT_FIELDS = tuple(name for name in CourseSerializer.Meta.fields if name not in DOCUMENT_OVERLAY_FIELDS)
+DOCUMENT_BATCH_SIZE = 500
+DOCUMENT_REBUILD_DEBOUNCE = 60
+
+
+def document_pending_key(course_id):
+    """Возвращает ключ отметки о том, что перестроение представления курса уже в очереди"""
+    return f"{CACHE_PREFIX}:document-pending:{course_id}"
+
+
+def build_course_documents(course_ids=None, batch_size=DOCUMENT_BATCH_SIZE):
+    """
+    Строит представления курсов (все курсы, если course_ids не передан) пачками:
+    одна выборка курсов с превью уроков и один INSERT ... ON CONFLICT DO UPDATE на пачку.
+    URL файлов сохраняются относительными, абсолютными их делает render_course_document.
+    Возвращает количество построенных представлений
+    """
+
+    queryset = Course.visible.all() if course_ids is None else Course.visible.filter(pk__in=course_ids)
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    context = {"fields": set(DOCUMENT_FIELDS), "expand": {"lessons"}}
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start : start + batch_size]
+        courses = annotate_courses(Course.objects.filter(pk__in=batch), None, DOCUMENT_FIELDS)
+        built_at = timezone.now()
+        documents = [
+            CourseDocument(course_id=data["id"], data=data, built_at=built_at)
+            for data in CourseSerializer(courses, many=True, context=context).data
+        ]
+        CourseDocument.objects.bulk_create(
+            documents, update_conflicts=True, unique_fields=["course"], update_fields=["data", "built_at"]
+        )
+        bump_versions_on_commit(*(f"courses:{pk}" for pk in batch))
+    return len(ids)
+
+
+def _absolute_file_urls(data, serializer, request):
+    """Делает абсолютными URL файловых полей представления (в том числе вложенных списков)"""
+
+    for name, field in serializer.fields.items():
+        value = data.get(name)
+        if not value:
+            continue
+        if isinstance(field, serializers.FileField):
+            data[name] = request.build_absolute_uri(value)
+        elif isinstance(field, serializers.ListSerializer):
+            data[name] = [_absolute_file_urls(dict(item), field.child, request) for item in value]
+    return data
+
+
+def render_course_document(course, document, context):
+    """
+    Собирает ответ курса из представления: добавляет счетчики и признак подписки текущего пользователя
+    из уже загруженной строки курса и восстанавливает порядок полей CourseSerializer
+    """
+
+    request = context["request"]
+    overlay_context = {**context, "fields": set(DOCUMENT_OVERLAY_FIELDS), "expand": set()}
+    data = _absolute_file_urls(dict(document.data), CourseSerializer(context={"request": request}), request)
+    data.update(CourseSerializer(course, context=overlay_context).data)
+    return {name: data[name] for name in CourseSerializer.Meta.fields if name in data}
+
+
+class CourseDocumentMixin:
+    """
+    Отдает детальное представление курса из таблицы CourseDocument: для ответа загружается
+    одна строка курса (владелец, счетчики, признак подписки) вместе с готовым документом.
+    Используется, когда клиент не выбирает поля (?fields=) и не управляет раскрытием (?expand=)
+    """
+
+    def use_course_document(self):
+        """Проверяет, можно ли отдать курс из готового представления"""
+
+        params = self.request.query_params
+        if not settings.COURSE_DOCUMENTS or self.action != "retrieve":
+            return False
+        return "fields" not in params and "expand" not in params
+
+    def get_document_queryset(self, queryset):
+        """Загружает только столбцы для прав, счетчиков и подписки вместе с представлением курса"""
+        return (
+            annotate_courses(queryset, self.request.user, DOCUMENT_OVERLAY_FIELDS)
+            .select_related("document")
+            .only(*COURSE_REQUIRED_COLUMNS, "document__data", "document__built_at")
+        )
+
+    def get_course_document(self, course):
+        """Возвращает представление курса, при отсутствии строит его сразу"""
+
+        document = getattr(course, "document", None)
+        if document is None:
+            build_course_documents([course.pk])
+            document = CourseDocument.objects.get(course_id=course.pk)
+        return document
+
+    def retrieve(self, request, *args, **kwargs):
+        """Возвращает курс из готового представления с данными текущего пользователя"""
+
+        if not self.use_course_document():
+            return super().retrieve(request, *args, **kwargs)
+        course = self.get_object()
+        document = self.get_course_document(course)
+        return Response(render_course_document(course, document, self.get_serializer_context()))
@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+
+from lms.cache import CACHE_PREFIX
+from lms.models import Course, Lesson
+from lms.serializers import CatalogLessonValuesSerializer, CourseValuesSerializer
+
+CATALOG_COURSE_FIELDS = ("id", "title", "preview", "description", "lessons_amount", "price")
+CATALOG_EXPORT_PENDING_KEY = f"{CACHE_PREFIX}:catalog-export-pending"
+
+
+def render_catalog():
+    """
+    Возвращает словарь {имя файла: JSON-содержимое} публичного каталога курсов и уроков.
+    Каталог отдается без авторизации, поэтому в него входят только публичные поля
+    и только курсы, не скрытые до удаления, и их уроки
+    """
+
+    renderer = JSONRenderer()
+    files = {}
+    for name, serializer, queryset in (
+        (
+            "courses.json",
+            CourseValuesSerializer(context={"fields": set(CATALOG_COURSE_FIELDS)}),
+            Course.visible.all(),
+        ),
+        ("lessons.json", CatalogLessonValuesSerializer(), Lesson.objects.filter(category__is_hidden=False)),
+    ):
+        files[name] = renderer.render(serializer.to_representation_many(serializer.get_values_queryset(queryset)))
+    return files
+
+
+def _replace_atomically(path, work_dir, write):
+    """Создает файл или ссылку в рабочем каталоге под временным именем и атомарно подменяет path через rename"""
+
+    tmp_path = work_dir / f"{path.name}.{os.getpid()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _prune_versions(versions_dir, current, keep):
+    """
+    Удаляет старые версии, оставляя текущую и keep - 1 последних предыдущих:
+    клиенты, получившие прежний манифест, еще успевают скачать его файлы
+    """
+
+    previous = [path for path in versions_dir.iterdir() if path.name != current]
+    previous.sort(key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in previous[max(keep - 1, 0) :]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def write_catalog_snapshot(root=None):
+    """
+    Записывает снимок каталога в CATALOG_EXPORT_ROOT/public для отдачи nginx:
+    versions/<хеш содержимого>/*.json и *.json.gz (для gzip_static), ссылку current на последнюю версию
+    и manifest.json с URL файлов. Версия собирается в CATALOG_EXPORT_ROOT/work (nginx его не отдает,
+    а rename внутри одной файловой системы атомарен) и появляется одним rename,
+    ссылка и манифест подменяются атомарно, поэтому nginx никогда не отдает частично записанные файлы.
+    Если содержимое не изменилось, новая версия не создается. Возвращает имя версии
+    """
+
+    root = Path(root or settings.CATALOG_EXPORT_ROOT)
+    public_dir = root / "public"
+    work_dir = root / "work"
+    versions_dir = public_dir / "versions"
+    versions_dir.mkdir(parents=True, exist_ok=True)
+    work_dir.mkdir(exist_ok=True)
+
+    files = render_catalog()
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(name.encode())
+        digest.update(files[name])
+    version = digest.hexdigest()[:16]
+
+    version_dir = versions_dir / version
+    if not version_dir.exists():
+        build_dir = Path(tempfile.mkdtemp(prefix="build-", dir=work_dir))
+        for name, content in files.items():
+            (build_dir / name).write_bytes(content)
+            (build_dir / f"{name}.gz").write_bytes(gzip.compress(content, compresslevel=9, mtime=0))
+        build_dir.chmod(0o755)
+        try:
+            os.rename(build_dir, version_dir)
+        except OSError:
+            # ту же версию уже опубликовал параллельный экспорт
+            shutil.rmtree(build_dir, ignore_errors=True)
+    os.utime(version_dir)
+
+    url = settings.CATALOG_EXPORT_URL
+    manifest = {
+        "version": version,
+        "generated_at": timezone.now().isoformat(),
+        "files": {name.removesuffix(".json"): f"{url}versions/{version}/{name}" for name in files},
+    }
+    _replace_atomically(public_dir / "current", work_dir, lambda path: os.symlink(Path("versions") / version, path))
+    _replace_atomically(public_dir / "manifest.json", work_dir, lambda path: path.write_text(json.dumps(manifest)))
+    _prune_versions(versions_dir, version, settings.CATALOG_EXPORT_KEEP_VERSIONS)
+    return version
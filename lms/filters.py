@@ -0,0 +1,27 @@
+from django_filters import rest_framework as filters
+
+from lms.models import Course
+
+
+class CourseFilterSet(filters.FilterSet):
+    """
+    Фильтры каталога курсов. Каждому фильтру соответствует индекс курса:
+    цена - (price, id), владелец с окном создания - (owner, created_at), окно создания - (created_at, id),
+    окно изменения - (updated_at, id), курсы с уроками - частичный индекс по title при lessons_count > 0
+    """
+
+    price_min = filters.NumberFilter(field_name="price", lookup_expr="gte", label="Цена от")
+    price_max = filters.NumberFilter(field_name="price", lookup_expr="lte", label="Цена до")
+    created_after = filters.IsoDateTimeFilter(field_name="created_at", lookup_expr="gte", label="Создан не раньше")
+    created_before = filters.IsoDateTimeFilter(field_name="created_at", lookup_expr="lt", label="Создан раньше")
+    updated_after = filters.IsoDateTimeFilter(field_name="updated_at", lookup_expr="gte", label="Изменен не раньше")
+    updated_before = filters.IsoDateTimeFilter(field_name="updated_at", lookup_expr="lt", label="Изменен раньше")
+    has_lessons = filters.BooleanFilter(method="filter_has_lessons", label="Есть уроки")
+
+    class Meta:
+        model = Course
+        fields = ("owner",)
+
+    def filter_has_lessons(self, queryset, name, value):
+        """Фильтрует по счетчику уроков курса, без JOIN с уроками"""
+        return queryset.filter(lessons_count__gt=0) if value else queryset.filter(lessons_count=0)
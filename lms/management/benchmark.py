@@ -0,0 +1,70 @@
+import timeit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest_framework.test import APIRequestFactory
+
+from lms.models import Course, Lesson
+
+
+class BenchmarkCommand(BaseCommand):
+    """
+    Основа команд-бенчмарков: для каждого размера из --sizes создает курсы с уроками в транзакции,
+    которая затем откатывается, и сравнивает лучшее время двух реализаций (baseline_name и candidate_name).
+    Подкласс перечисляет замеры в get_measurements
+    """
+
+    baseline_name = None
+    candidate_name = None
+    default_lessons = 2
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Количество курсов")
+        parser.add_argument("--lessons", type=int, default=self.default_lessons, help="Уроков в каждом курсе")
+        parser.add_argument("--repeat", type=int, default=5, help="Количество повторов каждого замера")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email="benchmark@test.com", username="benchmark", password="benchmark"
+            )
+            host = settings.ALLOWED_HOSTS[0].lstrip(".").replace("*", "localhost")
+            request = APIRequestFactory().get("/lms/", HTTP_HOST=host)
+            request.user = user
+            context = {"request": request, "expand": {"lessons"}, "fields": None}
+
+            for size in options["sizes"]:
+                self.create_rows(size, options["lessons"], user)
+                for label, baseline, candidate in self.get_measurements(size, user, context):
+                    self.measure(label, baseline, candidate, options["repeat"])
+            transaction.set_rollback(True)
+
+    def get_measurements(self, size, user, context):
+        """Возвращает замеры для size курсов: (подпись, функция baseline, функция candidate)"""
+        return []
+
+    @staticmethod
+    def create_rows(size, lessons, user):
+        """Создает size курсов (названия с префиксом bench-<size>-) и по lessons уроков в каждом"""
+
+        courses = Course.objects.bulk_create(
+            Course(title=f"bench-{size}-{i}", owner=user, description="Описание курса " * 20) for i in range(size)
+        )
+        Lesson.objects.bulk_create(
+            Lesson(title=f"bench-{size}-{i}-{j}", category=course, owner=user, description="x" * 200)
+            for i, course in enumerate(courses)
+            for j in range(lessons)
+        )
+
+    def measure(self, label, baseline, candidate, repeat):
+        """Замеряет лучшее время обеих реализаций и выводит ускорение"""
+
+        baseline_time = min(timeit.repeat(baseline, number=1, repeat=repeat))
+        candidate_time = min(timeit.repeat(candidate, number=1, repeat=repeat))
+        self.stdout.write(
+            f"{label}: {self.baseline_name} {baseline_time * 1000:.2f} ms, "
+            f"{self.candidate_name} {candidate_time * 1000:.2f} ms, ускорение x{baseline_time / candidate_time:.1f}"
+        )
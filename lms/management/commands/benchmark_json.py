@@ -0,0 +1,39 @@
+from io import BytesIO
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from lms.management.benchmark import BenchmarkCommand
+from lms.models import Course
+from lms.renderers import FastJSONParser, FastJSONRenderer
+from lms.serializers import CourseSerializer
+from lms.services import annotate_courses
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Сравнивает скорость стандартных JSONRenderer/JSONParser и FastJSONRenderer/FastJSONParser "
+        "на выводе CourseSerializer с уроками. Тестовые данные создаются в транзакции и откатываются"
+    )
+    baseline_name = "DRF"
+    candidate_name = "orjson"
+    default_lessons = 5
+
+    def get_measurements(self, size, user, context):
+        courses = annotate_courses(Course.objects.filter(title__startswith=f"bench-{size}-"), user)
+        data = CourseSerializer(courses, many=True, context=context).data
+        body = JSONRenderer().render(data)
+        if FastJSONRenderer().render(data) != body:
+            self.stderr.write(f"courses x{size}: вывод FastJSONRenderer отличается от JSONRenderer")
+        return [
+            (
+                f"render courses x{size} ({len(body) / 1024:.0f} KiB)",
+                lambda: JSONRenderer().render(data),
+                lambda: FastJSONRenderer().render(data),
+            ),
+            (
+                f"parse courses x{size}",
+                lambda: JSONParser().parse(BytesIO(body)),
+                lambda: FastJSONParser().parse(BytesIO(body)),
+            ),
+        ]
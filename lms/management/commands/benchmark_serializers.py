@@ -0,0 +1,36 @@
+from lms.management.benchmark import BenchmarkCommand
+from lms.models import Course, Lesson
+from lms.serializers import CourseSerializer, CourseValuesSerializer, LessonSerializer, LessonValuesSerializer
+from lms.services import annotate_courses
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Сравнивает скорость ModelSerializer и быстрых read-only сериализаторов списков уроков и курсов. "
+        "Тестовые данные создаются в транзакции и откатываются"
+    )
+    baseline_name = "ModelSerializer"
+    candidate_name = "values()"
+
+    def get_measurements(self, size, user, context):
+        lessons = Lesson.objects.filter(title__startswith=f"bench-{size}-")[:size]
+        courses = annotate_courses(Course.objects.filter(title__startswith=f"bench-{size}-"), user)
+        return [
+            (
+                f"lessons x{size}",
+                lambda: LessonSerializer(lessons.all(), many=True, context=context).data,
+                lambda: self.fast(LessonValuesSerializer, lessons, context),
+            ),
+            (
+                f"courses x{size}",
+                lambda: CourseSerializer(courses.all(), many=True, context=context).data,
+                lambda: self.fast(CourseValuesSerializer, courses, context),
+            ),
+        ]
+
+    @staticmethod
+    def fast(serializer_class, queryset, context):
+        """Сериализует queryset быстрым сериализатором"""
+
+        serializer = serializer_class(context=context)
+        return serializer.to_representation_many(serializer.get_values_queryset(queryset))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from lms.cache import RESPONSE_CACHE_NAMES, get_response_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Выводит счетчики попаданий, промахов, отдачи устаревших ответов и ожиданий пересчета "
+        "кэша ответов API курсов и уроков"
+    )
+
+    def handle(self, *args, **options):
+        for name, stats in get_response_cache_stats(RESPONSE_CACHE_NAMES).items():
+            total = stats["hits"] + stats["misses"]
+            ratio = stats["hits"] / total * 100 if total else 0
+            self.stdout.write(
+                f"{name}: hits={stats['hits']} misses={stats['misses']} stale={stats['stale']} "
+                f"lock_waits={stats['lock_waits']} hit_ratio={ratio:.1f}%"
+            )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from lms.services import check_subscription_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает множества подписок пользователей в кэше (Redis) с таблицей подписок и выводит расхождения. "
+        "С --fix множества с расхождениями удаляются и строятся заново при следующем обращении"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Удалить множества с расхождениями")
+        parser.add_argument("--batch-size", type=int, default=500, help="Пользователей в одной пачке")
+
+    def handle(self, *args, **options):
+        mismatches = check_subscription_cache(fix=options["fix"], batch_size=options["batch_size"])
+        for user_id, missing, extra in mismatches:
+            self.stdout.write(f"Пользователь {user_id}: нет в кэше {missing}, лишние в кэше {extra}")
+        if mismatches and not options["fix"]:
+            raise CommandError(f"Расхождений: {len(mismatches)}")
+        self.stdout.write(f"Расхождений: {len(mismatches)}" + (", множества сброшены" if mismatches else ""))
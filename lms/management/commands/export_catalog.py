@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from lms.export import write_catalog_snapshot
+
+
+class Command(BaseCommand):
+    help = "Записывает статический снимок каталога курсов и уроков для отдачи через nginx"
+
+    def handle(self, *args, **options):
+        version = write_catalog_snapshot()
+        self.stdout.write(f"Версия каталога {version} записана в {settings.CATALOG_EXPORT_ROOT / 'public'}")
@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lms.bundle import iter_course_bundle
+from lms.models import Course
+
+
+class Command(BaseCommand):
+    help = "Выгружает курс со всеми уроками пакетом NDJSON в файл или в stdout (для переноса между окружениями)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_id", type=int, help="id курса")
+        parser.add_argument("-o", "--output", default="-", help="Файл пакета, по умолчанию stdout")
+
+    def handle(self, *args, **options):
+        course = Course.visible.filter(pk=options["course_id"]).first()
+        if course is None:
+            raise CommandError(f"Курс {options['course_id']} не найден")
+
+        if options["output"] == "-":
+            self.write(sys.stdout.buffer, course)
+            return
+        with open(options["output"], "wb") as output:
+            self.write(output, course)
+        self.stdout.write(f"Курс {options['course_id']} выгружен в {options['output']}")
+
+    @staticmethod
+    def write(output, course):
+        """Записывает строки пакета по мере чтения уроков"""
+
+        for line in iter_course_bundle(course):
+            output.write(line)
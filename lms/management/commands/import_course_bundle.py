@@ -0,0 +1,37 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from rest_framework.exceptions import ValidationError
+
+from lms.bundle import import_course_bundle
+
+
+class Command(BaseCommand):
+    help = (
+        "Создает курс с уроками из пакета NDJSON (выгрузка export_course_bundle или API). "
+        "Пакет читается построчно, уроки записываются пачками в одной транзакции"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл пакета, - для stdin")
+        parser.add_argument("--owner", help="email владельца курса и уроков")
+        parser.add_argument("--batch-size", type=int, default=None, help="Уроков в одном bulk_create")
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            owner = get_user_model().objects.filter(email=options["owner"]).first()
+            if owner is None:
+                raise CommandError(f"Пользователь {options['owner']} не найден")
+
+        try:
+            if options["path"] == "-":
+                course, lessons_count = import_course_bundle(sys.stdin.buffer, owner, options["batch_size"])
+            else:
+                with open(options["path"], "rb") as bundle:
+                    course, lessons_count = import_course_bundle(bundle, owner, options["batch_size"])
+        except ValidationError as exc:
+            raise CommandError(f"Пакет не импортирован: {exc.detail}")
+        self.stdout.write(f"Создан курс {course.pk} ({course.title}), уроков: {lessons_count}")
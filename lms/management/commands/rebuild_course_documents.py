@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from lms.documents import DOCUMENT_BATCH_SIZE, build_course_documents
+
+
+class Command(BaseCommand):
+    help = "Перестраивает готовые представления всех курсов пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=DOCUMENT_BATCH_SIZE, help="Курсов в одной пачке")
+
+    def handle(self, *args, **options):
+        built = build_course_documents(batch_size=options["batch_size"])
+        self.stdout.write(f"Перестроено представлений курсов: {built}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from lms.services import recompute_course_counters
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счетчики уроков, подписчиков и покупок курсов и исправляет расхождения"
+
+    def handle(self, *args, **options):
+        repaired = recompute_course_counters()
+        self.stdout.write(f"Исправлено курсов: {repaired}")
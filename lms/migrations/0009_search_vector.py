@@ -0,0 +1,81 @@
+# Generated by Django 5.2.9 on 2026-10-18 07:26
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_TABLES = ("lms_course", "lms_lesson")
+
+CREATE_SEARCH_SQL = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION lms_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+CREATE_TABLE_SEARCH_SQL = """
+CREATE TRIGGER {table}_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON {table}
+    FOR EACH ROW EXECUTE FUNCTION lms_search_vector_update();
+
+UPDATE {table} SET search_vector =
+    setweight(to_tsvector('pg_catalog.russian', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.russian', coalesce(description, '')), 'B');
+
+CREATE INDEX {table}_search_vector_gin ON {table} USING gin (search_vector);
+CREATE INDEX {table}_title_trgm_gin ON {table} USING gin (title gin_trgm_ops);
+"""
+
+DROP_TABLE_SEARCH_SQL = """
+DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table};
+DROP INDEX IF EXISTS {table}_search_vector_gin;
+DROP INDEX IF EXISTS {table}_title_trgm_gin;
+"""
+
+DROP_SEARCH_SQL = "DROP FUNCTION IF EXISTS lms_search_vector_update();"
+
+
+def create_search_objects(apps, schema_editor):
+    """Создает триггеры, поддерживающие search_vector, и GIN-индексы (только PostgreSQL)"""
+
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(CREATE_SEARCH_SQL)
+    for table in SEARCH_TABLES:
+        schema_editor.execute(CREATE_TABLE_SEARCH_SQL.format(table=table))
+
+
+def drop_search_objects(apps, schema_editor):
+    """Удаляет триггеры и индексы полнотекстового поиска (только PostgreSQL)"""
+
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in SEARCH_TABLES:
+        schema_editor.execute(DROP_TABLE_SEARCH_SQL.format(table=table))
+    schema_editor.execute(DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lms", "0008_alter_course_created_at_alter_course_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="lesson",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_objects, drop_search_objects),
+    ]
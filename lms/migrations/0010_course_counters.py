@@ -0,0 +1,55 @@
+# Generated by Django 5.2.9 on 2026-10-18 07:34
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_by_course(model, course_field):
+    """Подзапрос количества строк модели для курса из внешнего запроса"""
+
+    counts = (
+        model.objects.filter(**{course_field: OuterRef("pk")})
+        .order_by()
+        .values(course_field)
+        .annotate(amount=Count("pk"))
+        .values("amount")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счетчики существующих курсов одним UPDATE"""
+
+    apps.get_model("lms", "Course").objects.update(
+        lessons_count=count_by_course(apps.get_model("lms", "Lesson"), "category"),
+        subscribers_count=count_by_course(apps.get_model("lms", "CourseSubscription"), "course"),
+        purchases_count=count_by_course(apps.get_model("users", "Payment"), "paid_course"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lms", "0009_search_vector"),
+        ("users", "0005_remove_payment_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="lessons_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество уроков"),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="purchases_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество покупок"),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="subscribers_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество подписчиков"),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
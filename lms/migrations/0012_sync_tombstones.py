@@ -0,0 +1,45 @@
+# Generated by Django 5.2.9 on 2026-10-18 07:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lms", "0011_lesson_category_title_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("course", "Курс"), ("lesson", "Урок")], max_length=6, verbose_name="Тип объекта"
+                    ),
+                ),
+                ("object_id", models.PositiveIntegerField(verbose_name="ID удаленного объекта")),
+                ("deleted_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата удаления")),
+            ],
+            options={
+                "verbose_name": "отметка об удалении",
+                "verbose_name_plural": "отметки об удалении",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="course",
+            index=models.Index(fields=["updated_at", "id"], name="lms_course_updated_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="lesson",
+            index=models.Index(fields=["updated_at", "id"], name="lms_lesson_updated_at_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(fields=["deleted_at", "id"], name="lms_tombstone_deleted_at_idx"),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.9 on 2026-10-18 08:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lms", "0012_sync_tombstones"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourseDocument",
+            fields=[
+                (
+                    "course",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="document",
+                        serialize=False,
+                        to="lms.course",
+                    ),
+                ),
+                ("data", models.JSONField(verbose_name="Представление курса")),
+                ("built_at", models.DateTimeField(verbose_name="Дата построения")),
+            ],
+            options={
+                "verbose_name": "представление курса",
+                "verbose_name_plural": "представления курсов",
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lms", "0014_course_filter_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="lesson",
+            index=models.Index(fields=["category", "updated_at", "id"], name="lms_lesson_cat_updated_idx"),
+        ),
+    ]
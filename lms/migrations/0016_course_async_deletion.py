@@ -0,0 +1,77 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("lms", "0015_list_plan_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourseDeletion",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("title", models.CharField(max_length=100, verbose_name="Наименование курса")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("done", "Завершено"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="pending",
+                        max_length=7,
+                        verbose_name="Статус",
+                    ),
+                ),
+                ("lessons_total", models.PositiveIntegerField(default=0, verbose_name="Уроков к удалению")),
+                ("lessons_deleted", models.PositiveIntegerField(default=0, verbose_name="Удалено уроков")),
+                ("subscriptions_total", models.PositiveIntegerField(default=0, verbose_name="Подписок к удалению")),
+                ("subscriptions_deleted", models.PositiveIntegerField(default=0, verbose_name="Удалено подписок")),
+                ("payments_total", models.PositiveIntegerField(default=0, verbose_name="Платежей к отвязке")),
+                ("payments_detached", models.PositiveIntegerField(default=0, verbose_name="Отвязано платежей")),
+                ("error", models.TextField(blank=True, verbose_name="Ошибка")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="Дата запроса")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="Дата последнего изменения")),
+                ("finished_at", models.DateTimeField(blank=True, null=True, verbose_name="Дата завершения")),
+            ],
+            options={
+                "verbose_name": "удаление курса",
+                "verbose_name_plural": "удаления курсов",
+            },
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="is_hidden",
+            field=models.BooleanField(default=False, editable=False, verbose_name="Скрыт до удаления"),
+        ),
+        migrations.AddField(
+            model_name="coursedeletion",
+            name="course",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="deletions",
+                to="lms.course",
+                verbose_name="Курс",
+            ),
+        ),
+        migrations.AddField(
+            model_name="coursedeletion",
+            name="owner",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Инициатор удаления",
+            ),
+        ),
+    ]
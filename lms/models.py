@@ -1,9 +1,24 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils.functional import cached_property
+
+from config.mixins import AtomicSaveMixin
+from lms.cache import reference_cache
+
+
+class VisibleCourseManager(models.Manager):
+    """Менеджер курсов для API: курсы, скрытые до асинхронного удаления, не видны"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_hidden=False)
 
 
 class Course(models.Model):
     """Модель курса"""
 
+    COUNTER_FIELDS = ("lessons_count", "subscribers_count", "purchases_count")
+
     title = models.CharField(max_length=100, unique=True, verbose_name="Наименование курса")
     preview = models.ImageField(
         upload_to="lms/courses/previews/",
@@ -18,29 +33,70 @@ class Course(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2, default=1000, verbose_name="Цена курса")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата последнего изменения")
+    lessons_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество уроков")
+    subscribers_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество подписчиков")
+    purchases_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество покупок")
+    search_vector = SearchVectorField(null=True, editable=False)
+    is_hidden = models.BooleanField(default=False, editable=False, verbose_name="Скрыт до удаления")
+
+    # менеджер по умолчанию видит и скрытые курсы: админка, dumpdata, проверка уникальности названия
+    objects = models.Manager()
+    visible = VisibleCourseManager()
 
     def __str__(self):
         """Строковое отображение курса"""
         return self.title
 
+    def save(self, *args, **kwargs):
+        """
+        При обновлении не записывает счетчики (и неподгруженные поля, как save() по умолчанию):
+        счетчики меняют только UPDATE с F(), а значения в загруженном экземпляре могут быть устаревшими
+        """
+
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            skipped = set(self.COUNTER_FIELDS) | self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+    @cached_property
+    def lessons_preview(self):
+        """Первые уроки курса для превью (annotate_courses загружает их prefetch в этот же атрибут)"""
+        return list(self.lessons.all()[: settings.LESSONS_PREVIEW_SIZE])
+
     class Meta:
         verbose_name = "курс"
         verbose_name_plural = "курсы"
         ordering = [
             "title",
         ]
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="lms_course_updated_at_idx"),
+            models.Index(fields=["created_at", "id"], name="lms_course_created_at_idx"),
+            models.Index(fields=["price", "id"], name="lms_course_price_idx"),
+            models.Index(fields=["owner", "created_at"], name="lms_course_owner_created_idx"),
+            models.Index(
+                fields=["title"], condition=models.Q(lessons_count__gt=0), name="lms_course_with_lessons_idx"
+            ),
+        ]
 
 
 def get_default_course():
-    """Устанавливает курс по умолчанию 'Вне курса'"""
+    """Устанавливает курс по умолчанию 'Вне курса' (id берется из справочного кэша)"""
 
-    course, created = Course.objects.get_or_create(
-        title="Вне курса", defaults={"description": "Дополнительно, вне курса"}
-    )
-    return course.id
+    def load():
+        course, created = Course.objects.get_or_create(
+            title="Вне курса", defaults={"description": "Дополнительно, вне курса"}
+        )
+        return course.id
+
+    return reference_cache.get("default-course", load)
 
 
-class Lesson(models.Model):
+class Lesson(AtomicSaveMixin, models.Model):
     """Модель урока"""
 
     title = models.CharField(max_length=100, unique=True, verbose_name="Наименование урока")
@@ -63,6 +119,7 @@ class Lesson(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2, default=500, verbose_name="Цена урока")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата последнего изменения")
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def __str__(self):
         """Строковое отображение урока"""
@@ -74,9 +131,14 @@ class Lesson(models.Model):
         ordering = [
             "title",
         ]
+        indexes = [
+            models.Index(fields=["category", "title"], name="lms_lesson_category_title_idx"),
+            models.Index(fields=["category", "updated_at", "id"], name="lms_lesson_cat_updated_idx"),
+            models.Index(fields=["updated_at", "id"], name="lms_lesson_updated_at_idx"),
+        ]
 
 
-class CourseSubscription(models.Model):
+class CourseSubscription(AtomicSaveMixin, models.Model):
     """Модель подписки пользователя на обновления курса"""
 
     user = models.ForeignKey(
@@ -98,3 +160,78 @@ class CourseSubscription(models.Model):
 
     def __str__(self):
         return f"{self.user} - {self.course}"
+
+
+class CourseDocument(models.Model):
+    """Готовое представление курса (без данных пользователя), которое отдается при чтении курса"""
+
+    course = models.OneToOneField(to=Course, on_delete=models.CASCADE, primary_key=True, related_name="document")
+    data = models.JSONField(verbose_name="Представление курса")
+    built_at = models.DateTimeField(verbose_name="Дата построения")
+
+    class Meta:
+        verbose_name = "представление курса"
+        verbose_name_plural = "представления курсов"
+
+    def __str__(self):
+        return f"{self.course_id} ({self.built_at})"
+
+
+class Tombstone(models.Model):
+    """Отметка об удалении курса или урока для дельта-синхронизации клиентов"""
+
+    KIND_CHOICES = [
+        ("course", "Курс"),
+        ("lesson", "Урок"),
+    ]
+
+    kind = models.CharField(max_length=6, choices=KIND_CHOICES, verbose_name="Тип объекта")
+    object_id = models.PositiveIntegerField(verbose_name="ID удаленного объекта")
+    deleted_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата удаления")
+
+    class Meta:
+        verbose_name = "отметка об удалении"
+        verbose_name_plural = "отметки об удалении"
+        indexes = [
+            models.Index(fields=["deleted_at", "id"], name="lms_tombstone_deleted_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} ({self.deleted_at})"
+
+
+class CourseDeletion(models.Model):
+    """Асинхронное удаление курса: зависимые строки удаляются задачей пачками, здесь хранится прогресс"""
+
+    STATUS_CHOICES = [
+        ("pending", "В очереди"),
+        ("running", "Выполняется"),
+        ("done", "Завершено"),
+        ("failed", "Ошибка"),
+    ]
+
+    course = models.ForeignKey(
+        to=Course, on_delete=models.SET_NULL, null=True, related_name="deletions", verbose_name="Курс"
+    )
+    title = models.CharField(max_length=100, verbose_name="Наименование курса")
+    owner = models.ForeignKey(
+        to="users.CustomUser", on_delete=models.SET_NULL, null=True, verbose_name="Инициатор удаления"
+    )
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default="pending", verbose_name="Статус")
+    lessons_total = models.PositiveIntegerField(default=0, verbose_name="Уроков к удалению")
+    lessons_deleted = models.PositiveIntegerField(default=0, verbose_name="Удалено уроков")
+    subscriptions_total = models.PositiveIntegerField(default=0, verbose_name="Подписок к удалению")
+    subscriptions_deleted = models.PositiveIntegerField(default=0, verbose_name="Удалено подписок")
+    payments_total = models.PositiveIntegerField(default=0, verbose_name="Платежей к отвязке")
+    payments_detached = models.PositiveIntegerField(default=0, verbose_name="Отвязано платежей")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата запроса")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата последнего изменения")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата завершения")
+
+    class Meta:
+        verbose_name = "удаление курса"
+        verbose_name_plural = "удаления курсов"
+
+    def __str__(self):
+        return f"{self.title} ({self.get_status_display()})"
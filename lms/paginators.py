@@ -1,13 +1,276 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import datetime
+import json
+from collections import OrderedDict
 
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
 
-class CoursePaginator(PageNumberPagination):
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from lms.services import estimate_count
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """JSON-кодировщик значений курсора: даты сохраняются с микросекундами, чтобы позиция была точной"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация по составному ключу сортировки.
+    Следующая страница выбирается условием по значениям ключа последней строки вместо OFFSET,
+    поэтому глубина страницы не влияет на время запроса, а COUNT(*) не выполняется.
+    Ключ - текущая сортировка queryset (OrderingFilter или Meta.ordering), дополненная id
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 10
+    page_size_query_param = None
+    max_page_size = None
+    invalid_cursor_message = "Некорректный курсор"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Возвращает страницу строк после (или перед) позицией из курсора"""
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+
+        values, reverse = self.decode_cursor(request)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values, reverse))
+        ordering = [self.invert(field) for field in self.ordering] if reverse else self.ordering
+
+        rows = list(queryset.order_by(*ordering)[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else values is not None
+        self.has_previous = values is not None if not reverse else has_more
+        self.first_values = self.get_row_values(rows[0]) if rows else None
+        self.last_values = self.get_row_values(rows[-1]) if rows else None
+        return rows
+
+    def get_page_size(self, request):
+        """Возвращает размер страницы с учетом параметра запроса и ограничения max_page_size"""
+
+        if self.page_size_query_param:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+            except (KeyError, ValueError):
+                return self.page_size
+            if page_size > 0:
+                return min(page_size, self.max_page_size) if self.max_page_size else page_size
+        return self.page_size
+
+    @staticmethod
+    def invert(field):
+        """Меняет направление сортировки поля"""
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def get_ordering(queryset):
+        """
+        Возвращает ключ сортировки: сортировку queryset (или Meta.ordering модели),
+        в которой связи заменены на столбцы *_id, дополненную id для уникальности
+        """
+
+        opts = queryset.model._meta
+        ordering = []
+        for field in queryset.query.order_by or opts.ordering:
+            descending = field.startswith("-")
+            name = field.lstrip("-")
+            name = opts.pk.attname if name == "pk" else opts.get_field(name).attname
+            ordering.append(f"-{name}" if descending else name)
+        if opts.pk.attname not in [field.lstrip("-") for field in ordering]:
+            descending = bool(ordering) and ordering[0].startswith("-")
+            ordering.append(f"-{opts.pk.attname}" if descending else opts.pk.attname)
+        return ordering
+
+    def get_keyset_filter(self, values, reverse):
+        """
+        Строит условие "строка после позиции" для составного ключа:
+        (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ... с учетом направления каждого поля
+        """
+
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            ascending = not field.startswith("-")
+            lookup = "gt" if ascending != reverse else "lt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_row_values(self, row):
+        """Возвращает значения ключа для строки (экземпляра модели или словаря values())"""
+
+        names = [field.lstrip("-") for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in names]
+        return [getattr(row, name) for name in names]
+
+    def encode_cursor(self, values, reverse):
+        """Кодирует позицию в непрозрачную строку курсора"""
+
+        payload = json.dumps({"v": values, "r": reverse}, cls=CursorEncoder)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, request):
+        """Декодирует курсор из параметров запроса в (значения ключа, направление)"""
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            values, reverse = payload["v"], bool(payload["r"])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def get_link(self, values, reverse):
+        """Возвращает ссылку на страницу с заданной позицией"""
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, "pagination")
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or self.last_values is None:
+            return None
+        return self.get_link(self.last_values, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_values is None:
+            return None
+        return self.get_link(self.first_values, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class PageNumberOrKeysetPagination(PageNumberPagination):
+    """
+    Постраничная пагинация по умолчанию (для обратной совместимости).
+    При параметре cursor или pagination=cursor используется keyset-пагинация с теми же ограничениями page_size
+    """
+
+    keyset_query_param = "pagination"
+
+    def use_keyset(self, request):
+        """Проверяет, запросил ли клиент keyset-пагинацию"""
+
+        return (
+            KeysetPagination.cursor_query_param in request.query_params
+            or request.query_params.get(self.keyset_query_param) == "cursor"
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = KeysetPagination()
+            self.keyset.page_size = self.page_size
+            self.keyset.page_size_query_param = self.page_size_query_param
+            self.keyset.max_page_size = self.max_page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class CoursePaginator(PageNumberOrKeysetPagination):
     page_size = 3
     page_size_query_param = "page_size"
     max_page_size = 10
 
 
-class LessonPaginator(PageNumberPagination):
+class LessonPaginator(PageNumberOrKeysetPagination):
     page_size = 5
     page_size_query_param = "page_size"
     max_page_size = 10
+
+
+class SearchPaginator(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 50
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор списков админки без COUNT(*) по большим таблицам: число строк берется из оценки
+    планировщика Postgres. Если оценка меньше exact_count_threshold или недоступна (другая СУБД),
+    строки считаются точно. Завышенная оценка уточняется, когда запрошенная страница оказывается неполной
+    или пустой, поэтому несуществующие страницы не выводятся
+    """
+
+    exact_count_threshold = 10000
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list) if hasattr(self.object_list, "query") else None
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        self.estimated = True
+        return estimate
+
+    def set_count(self, count):
+        """Заменяет оценку точным числом строк (число страниц пересчитывается)"""
+
+        self.estimated = False
+        self.__dict__["count"] = count
+        self.__dict__.pop("num_pages", None)
+
+    def page(self, number):
+        """
+        Возвращает страницу. При оценке неполная страница - последняя, и число строк известно без подсчета,
+        а пустая страница означает, что оценка завышена: строки считаются точно и номер страницы проверяется заново
+        """
+
+        page = super().page(number)
+        if not self.estimated or len(page.object_list) >= self.per_page:
+            return page
+        if page.object_list:
+            self.set_count((page.number - 1) * self.per_page + len(page.object_list))
+            return page
+        self.set_count(self.object_list.count())
+        return super().page(number)
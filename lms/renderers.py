@@ -0,0 +1,94 @@
+from django.conf import settings
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен, без него работают стандартные классы DRF
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson is not None else 0
+LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson с тем же выводом, что и у DRF.
+    Даты, Decimal, ленивые строки и прочие нестандартные типы кодируются методом default JSONEncoder DRF,
+    U+2028/U+2029 экранируются так же. Отступы (?indent=, Browsable API), ensure_ascii, некомпактный вывод
+    и значения, которые orjson не кодирует (например, целые больше 64 бит), отдаются стандартному рендереру.
+    Отличается только запись float в экспоненциальной форме (1e-5 вместо 1e-05, значение то же)
+    и NaN/Infinity, которые orjson кодирует как null
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser на orjson. Тела не в UTF-8 и JSON, который orjson не принимает
+    (NaN/Infinity при STRICT_JSON=False), разбираются стандартным json.
+    Целые больше 64 бит orjson возвращает как float
+    """
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            pass
+        try:
+            parse_constant = json.strict_constant if self.strict else None
+            return json.loads(body.decode(encoding), parse_constant=parse_constant)
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Рендерер NDJSON (строка JSON на объект). Потоковые ответы формируют строки сами и отдаются
+    StreamingHttpResponse, через рендерер проходят только ошибки - одной строкой
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return FastJSONRenderer().render(data) + b"\n"
+
+
+class NDJSONParser(BaseParser):
+    """Парсер NDJSON: возвращает тело запроса потоком, строки по одной разбирает читающий код"""
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream
@@ -1,13 +1,23 @@
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models
+from django.utils import timezone
+
 from rest_framework import serializers
 
-from lms.models import Course, CourseSubscription, Lesson
+from lms.cache import CACHE_PREFIX, get_versions
+from lms.models import Course, CourseDeletion, CourseSubscription, Lesson
+from lms.services import get_subscribed_course_ids, limit_lessons_per_course
 from lms.validators import VideoLinkValidator
 
 
 class LessonSerializer(serializers.ModelSerializer):
     """Сериализатор урока"""
 
-    category = serializers.PrimaryKeyRelatedField(queryset=Course.objects.all())
+    category = serializers.PrimaryKeyRelatedField(queryset=Course.visible.all())
     video_link = serializers.URLField(
         required=False, allow_blank=True, validators=[VideoLinkValidator(field="video_link")]
     )
@@ -17,28 +27,230 @@ class LessonSerializer(serializers.ModelSerializer):
         fields = ("id", "title", "preview", "description", "video_link", "category", "owner", "price")
 
 
-class CourseSerializer(serializers.ModelSerializer):
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, который берет объект из загруженных списочным сериализатором (атрибут preloaded),
+    а не выполняет запрос на каждый элемент пакета
+    """
+
+    def to_internal_value(self, data):
+        objects = getattr(self.root, "preloaded", {}).get(self.field_name)
+        if objects is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        if pk not in objects:
+            self.fail("does_not_exist", pk_value=data)
+        return objects[pk]
+
+
+class LessonBulkListSerializer(serializers.ListSerializer):
+    """
+    Пакетное создание и изменение уроков через bulk_create/bulk_update.
+    Курсы, изменяемые уроки и занятые названия загружаются одним запросом на пакет,
+    поэтому проверка элементов не обращается к БД. Ошибки возвращаются списком в порядке элементов.
+    При изменении instance - словарь {id: урок} доступных пользователю уроков
+    """
+
+    def to_internal_value(self, data):
+        self.validated_instances = []
+        if isinstance(data, list):
+            self.preload([item for item in data if isinstance(item, dict)])
+        return super().to_internal_value(data)
+
+    def preload(self, items):
+        """Загружает курсы элементов и уроки, уже использующие названия из пакета"""
+
+        course_ids = set()
+        for item in items:
+            try:
+                course_ids.add(int(item["category"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+        self.preloaded = {"category": Course.visible.only("id").in_bulk(course_ids)}
+
+        titles = [str(item["title"]).strip() for item in items if item.get("title") is not None]
+        self.title_counts = Counter(titles)
+        self.taken_titles = dict(Lesson.objects.filter(title__in=set(titles)).values_list("title", "id"))
+        self.id_counts = Counter(item.get("id") for item in items)
+
+    def run_child_validation(self, data):
+        instance = None
+        if self.instance is not None:
+            pk = data.get("id") if isinstance(data, dict) else None
+            instance = self.instance.get(pk) if isinstance(pk, int) and not isinstance(pk, bool) else None
+            if instance is None:
+                raise serializers.ValidationError({"id": ["Урок не найден или нет прав на его изменение"]})
+            if self.id_counts[pk] > 1:
+                raise serializers.ValidationError({"id": ["Урок повторяется в пакете"]})
+        self.child.instance = instance
+        self.child.initial_data = data
+
+        validated = super().run_child_validation(data)
+        title = validated.get("title")
+        if title is not None:
+            if self.title_counts[title] > 1:
+                raise serializers.ValidationError({"title": ["Название повторяется в пакете"]})
+            if self.taken_titles.get(title, getattr(instance, "pk", None)) != getattr(instance, "pk", None):
+                raise serializers.ValidationError({"title": ["Урок с таким наименованием уже существует"]})
+        self.validated_instances.append(instance)
+        return validated
+
+    def create(self, validated_data):
+        lessons = [Lesson(**attrs) for attrs in validated_data]
+        return Lesson.objects.bulk_create(lessons)
+
+    def update(self, instance, validated_data):
+        """Изменяет уроки одним bulk_update, updated_at (auto_now) проставляется явно"""
+
+        now = timezone.now()
+        fields = {"updated_at"}
+        lessons = []
+        self.previous_category_ids = {}
+        for lesson, attrs in zip(self.validated_instances, validated_data):
+            self.previous_category_ids[lesson.pk] = lesson.category_id
+            for name, value in attrs.items():
+                setattr(lesson, name, value)
+                fields.add(name)
+            lesson.updated_at = now
+            lessons.append(lesson)
+        Lesson.objects.bulk_update(lessons, sorted(fields))
+        return lessons
+
+
+class LessonBulkSerializer(LessonSerializer):
+    """Элемент пакетного создания и изменения уроков (владелец задается представлением)"""
+
+    category = PreloadedPrimaryKeyRelatedField(queryset=Course.visible.all())
+
+    class Meta(LessonSerializer.Meta):
+        read_only_fields = ("owner",)
+        # уникальность названий проверяет LessonBulkListSerializer для всего пакета
+        extra_kwargs = {"title": {"validators": []}}
+        list_serializer_class = LessonBulkListSerializer
+
+
+class CourseBundleSerializer(serializers.ModelSerializer):
+    """
+    Курс в пакете курса: без id и владельца. Превью не переносится: файлов может не быть в целевом окружении,
+    а имя файла из пакета указывало бы на любой файл хранилища
+    """
+
+    class Meta:
+        model = Course
+        fields = ("title", "description", "price")
+
+
+class LessonBundleSerializer(serializers.ModelSerializer):
+    """Урок в пакете курса: без id, курса, владельца и превью"""
+
+    video_link = serializers.URLField(
+        max_length=500,
+        required=False,
+        allow_blank=True,
+        allow_null=True,
+        validators=[VideoLinkValidator(field="video_link")],
+    )
+
+    class Meta:
+        model = Lesson
+        fields = ("title", "description", "video_link", "price")
+        # уникальность названий проверяется для пачки уроков одним запросом
+        extra_kwargs = {"title": {"validators": []}}
+
+
+class DynamicFieldsMixin:
+    """
+    Оставляет в сериализаторе только запрошенные поля (context["fields"])
+    и раскрываемые вложенные поля из context["expand"].
+    Если в контексте нет fields/expand, сериализатор отдает все поля
+    """
+
+    expandable_fields = ()
+
+    @classmethod
+    def select_fields(cls, names, requested=None, expand=None):
+        """Возвращает имена полей, которые войдут в представление"""
+
+        selected = []
+        for name in names:
+            if requested is not None and name not in requested:
+                continue
+            explicitly_requested = requested is not None and name in requested
+            collapsed = expand is not None and name not in expand
+            if name in cls.expandable_fields and collapsed and not explicitly_requested:
+                continue
+            selected.append(name)
+        return selected
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.select_fields(fields, self.context.get("fields"), self.context.get("expand"))
+        return {name: field for name, field in fields.items() if name in selected}
+
+
+class CourseListSerializer(serializers.ListSerializer):
+    """Список курсов: признак подписки курсов без аннотации is_subscribed проверяется одним обращением на список"""
+
+    def to_representation(self, data):
+        courses = list(data.all() if isinstance(data, models.Manager) else data)
+        request = self.context.get("request")
+        missing = [course for course in courses if not hasattr(course, "is_subscribed")]
+        if missing and request is not None and "is_subscribed" in self.child.fields:
+            subscribed = get_subscribed_course_ids(request.user, [course.pk for course in missing])
+            for course in missing:
+                course.is_subscribed = course.pk in subscribed
+        return super().to_representation(courses)
+
+
+class CourseSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Сериализатор курса"""
 
-    lessons_amount = serializers.SerializerMethodField()
-    lessons = LessonSerializer(many=True, read_only=True)
-    is_subscribed = serializers.SerializerMethodField()
+    expandable_fields = ("lessons",)
 
-    @staticmethod
-    def get_lessons_amount(instance):
-        """Возвращает количество уроков в курсе"""
-        return instance.lessons.count()
+    lessons_amount = serializers.IntegerField(source="lessons_count", read_only=True)
+    subscribers_amount = serializers.IntegerField(source="subscribers_count", read_only=True)
+    purchases_amount = serializers.IntegerField(source="purchases_count", read_only=True)
+    lessons = LessonSerializer(
+        source="lessons_preview", many=True, read_only=True, help_text="Первые уроки курса, все уроки - в /lessons/"
+    )
+    is_subscribed = serializers.SerializerMethodField()
 
     def get_is_subscribed(self, obj):
         """Возвращает булевое значение для поля подписки пользователем на курс"""
-        user = self.context.get("request").user
-        if user.is_authenticated:
-            return CourseSubscription.objects.filter(user=user, course=obj).exists()
-        return False
+        if not hasattr(obj, "is_subscribed"):
+            obj.is_subscribed = obj.pk in get_subscribed_course_ids(self.context.get("request").user, [obj.pk])
+        return obj.is_subscribed
 
     class Meta:
         model = Course
-        fields = ("id", "title", "preview", "description", "lessons_amount", "lessons", "is_subscribed", "price")
+        fields = (
+            "id",
+            "title",
+            "preview",
+            "description",
+            "lessons_amount",
+            "subscribers_amount",
+            "purchases_amount",
+            "lessons",
+            "is_subscribed",
+            "price",
+        )
+        list_serializer_class = CourseListSerializer
+
+
+class SearchResultSerializer(serializers.Serializer):
+    """Сериализатор результата поиска по курсам и урокам"""
+
+    id = serializers.IntegerField()
+    kind = serializers.CharField(help_text="course или lesson")
+    title = serializers.CharField()
+    course_id = serializers.IntegerField(help_text="Курс, к которому относится результат")
+    rank = serializers.FloatField()
 
 
 class CourseSubscriptionInputSerializer(serializers.Serializer):
@@ -47,9 +259,236 @@ class CourseSubscriptionInputSerializer(serializers.Serializer):
     course_id = serializers.IntegerField()
 
 
+class CourseSubscriptionBulkSerializer(serializers.Serializer):
+    """Сериализатор пакетной подписки и отписки"""
+
+    action = serializers.ChoiceField(choices=["subscribe", "unsubscribe"])
+    course_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_course_ids(self, value):
+        """Убирает повторы и ограничивает размер пакета"""
+
+        value = list(dict.fromkeys(value))
+        if len(value) > settings.SUBSCRIPTION_BULK_MAX_SIZE:
+            raise serializers.ValidationError(f"Не более {settings.SUBSCRIPTION_BULK_MAX_SIZE} курсов")
+        return value
+
+
 class CourseSubscriptionSerializer(serializers.ModelSerializer):
     """Сериализатор подписки для get запросов"""
 
     class Meta:
         model = CourseSubscription
         fields = "__all__"
+
+
+class CourseDeletionSerializer(serializers.ModelSerializer):
+    """Сериализатор прогресса асинхронного удаления курса"""
+
+    class Meta:
+        model = CourseDeletion
+        fields = (
+            "id",
+            "course",
+            "title",
+            "status",
+            "lessons_total",
+            "lessons_deleted",
+            "subscriptions_total",
+            "subscriptions_deleted",
+            "payments_total",
+            "payments_detached",
+            "error",
+            "created_at",
+            "updated_at",
+            "finished_at",
+        )
+
+
+class ValuesSerializer:
+    """
+    Быстрый read-only сериализатор строк queryset.values() для списков.
+    Не создает экземпляры моделей и не обходит поля через ModelSerializer: значения столбцов
+    преобразуются методами to_representation полей исходного сериализатора,
+    поэтому JSON совпадает с ответом исходного сериализатора байт в байт
+    """
+
+    serializer_class = None
+    fragment_exclude = ()
+    fragment_column = "updated_at"
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        self.request = self.context.get("request")
+        self.fields = self.serializer_class(context=self.context).fields
+        self.file_urls = {}
+        self.converters = []
+        for name, field in self.fields.items():
+            converter = self.get_converter(name, field)
+            if converter is not None:
+                self.converters.append(converter)
+        self.fragment_converters = [item for item in self.converters if item[0] not in self.fragment_exclude]
+        self.overlay_converters = [item for item in self.converters if item[0] in self.fragment_exclude]
+
+    def get_converter(self, name, field):
+        """Возвращает кортеж (имя поля, столбец values(), функция преобразования) для поля сериализатора"""
+
+        opts = self.serializer_class.Meta.model._meta
+        if isinstance(field, serializers.SerializerMethodField):
+            return name, name, None
+        if isinstance(field, serializers.RelatedField):
+            return name, opts.get_field(field.source).attname, None
+        if isinstance(field, serializers.FileField):
+            storage = opts.get_field(field.source).storage
+            return name, field.source, lambda value: self.file_url(storage, value)
+        return name, field.source, field.to_representation
+
+    def file_url(self, storage, value):
+        """Строит URL файла так же, как FileField.to_representation (одинаковые файлы - один раз)"""
+
+        if not value:
+            return None
+        if value not in self.file_urls:
+            url = storage.url(value)
+            if self.request is not None:
+                url = self.request.build_absolute_uri(url)
+            self.file_urls[value] = url
+        return self.file_urls[value]
+
+    def get_columns(self):
+        """Возвращает столбцы, которые нужно выбрать через values()"""
+
+        columns = [column for _, column, _ in self.converters]
+        if self.use_fragment_cache():
+            columns.append(self.fragment_column)
+        return columns
+
+    def get_values_queryset(self, queryset):
+        """
+        Превращает queryset в выборку словарей только с нужными столбцами
+        (и столбцами сортировки, которые нужны курсорной пагинации)
+        """
+
+        opts = queryset.model._meta
+        ordering = [field.lstrip("-") for field in queryset.query.order_by or opts.ordering]
+        ordering_columns = [opts.get_field(name).attname for name in ordering if name != "pk"]
+        columns = dict.fromkeys(self.get_columns() + ordering_columns + [opts.pk.attname])
+        return queryset.prefetch_related(None).values(*columns)
+
+    @staticmethod
+    def convert(row, converters):
+        """Преобразует столбцы строки values() в поля представления"""
+
+        ret = {}
+        for name, column, convert in converters:
+            value = row[column]
+            ret[name] = value if value is None or convert is None else convert(value)
+        return ret
+
+    def to_representation(self, row):
+        """Преобразует строку values() в представление объекта"""
+        return self.convert(row, self.converters)
+
+    def use_fragment_cache(self):
+        """Проверяет, включен ли кэш фрагментов"""
+        return settings.CACHE_ENABLED and settings.FRAGMENT_CACHE
+
+    def get_fragment_keys(self, rows):
+        """
+        Возвращает ключи фрагментов строк: модель, id и updated_at строки, а также версия фрагментов модели,
+        набор кэшируемых полей и адрес сайта (от него зависят абсолютные URL файлов)
+        """
+
+        opts = self.serializer_class.Meta.model._meta
+        (version,) = get_versions([f"fragments:{opts.label_lower}"])
+        base_url = self.request.build_absolute_uri("/") if self.request is not None else ""
+        names = ",".join(name for name, _, _ in self.fragment_converters)
+        digest = hashlib.md5(f"{base_url}|{names}".encode()).hexdigest()
+        prefix = f"{CACHE_PREFIX}:fragment:{opts.label_lower}:{version}:{digest}"
+        return [f"{prefix}:{row[opts.pk.attname]}:{row[self.fragment_column].timestamp()}" for row in rows]
+
+    def to_representation_many(self, rows):
+        """
+        Преобразует набор строк values() в список представлений.
+        Представления строк берутся из кэша фрагментов одним get_many, сериализуются только промахи;
+        поля из fragment_exclude (счетчики, данные пользователя) не кэшируются и добавляются к каждой строке
+        """
+
+        rows = list(rows)
+        if not rows or not self.use_fragment_cache():
+            return [self.to_representation(row) for row in rows]
+
+        keys = self.get_fragment_keys(rows)
+        cached = cache.get_many(keys)
+        missing = {}
+        data = []
+        for row, key in zip(rows, keys):
+            fragment = cached.get(key)
+            if fragment is None:
+                fragment = missing[key] = self.convert(row, self.fragment_converters)
+            if self.overlay_converters:
+                fragment = {**fragment, **self.convert(row, self.overlay_converters)}
+                fragment = {name: fragment[name] for name, _, _ in self.converters}
+            data.append(fragment)
+        if missing:
+            cache.set_many(missing, settings.FRAGMENT_CACHE_TIMEOUT)
+        return data
+
+
+class LessonValuesSerializer(ValuesSerializer):
+    """Быстрый сериализатор списка уроков, совпадающий по выводу с LessonSerializer"""
+
+    serializer_class = LessonSerializer
+
+
+class CatalogLessonSerializer(LessonSerializer):
+    """Публичные поля урока для статического каталога: без ссылки на видео, описания и владельца"""
+
+    class Meta(LessonSerializer.Meta):
+        fields = ("id", "title", "preview", "category", "price")
+
+
+class CatalogLessonValuesSerializer(LessonValuesSerializer):
+    """Быстрый сериализатор уроков статического каталога"""
+
+    serializer_class = CatalogLessonSerializer
+
+
+class CourseValuesSerializer(ValuesSerializer):
+    """
+    Быстрый сериализатор списка курсов, совпадающий по выводу с CourseSerializer.
+    Счетчики берутся из столбцов курса, признак подписки - из аннотации queryset или кэша подписок,
+    превью уроков загружается одним запросом values() для всей страницы.
+    Счетчики и признак подписки меняются без изменения updated_at курса, поэтому в кэш фрагментов не входят
+    """
+
+    serializer_class = CourseSerializer
+    fragment_exclude = ("lessons_amount", "subscribers_amount", "purchases_amount", "is_subscribed")
+
+    def get_converter(self, name, field):
+        if name == "lessons" or (name == "is_subscribed" and settings.SUBSCRIPTION_CACHE):
+            return None
+        return super().get_converter(name, field)
+
+    def to_representation_many(self, rows):
+        rows = list(rows)
+        data = super().to_representation_many(rows)
+        subscriptions = settings.SUBSCRIPTION_CACHE and "is_subscribed" in self.fields
+        if subscriptions:
+            user = getattr(self.request, "user", None)
+            subscribed = get_subscribed_course_ids(user, [row["id"] for row in rows])
+            for row, representation in zip(rows, data):
+                representation["is_subscribed"] = row["id"] in subscribed
+        if "lessons" not in self.fields:
+            return [{name: item[name] for name in self.fields} for item in data] if subscriptions else data
+
+        lesson_serializer = LessonValuesSerializer(context=self.context)
+        lessons = limit_lessons_per_course(Lesson.objects.filter(category_id__in=[row["id"] for row in rows]))
+        lesson_rows = list(lesson_serializer.get_values_queryset(lessons))
+        lessons_by_course = {}
+        for lesson, representation in zip(lesson_rows, lesson_serializer.to_representation_many(lesson_rows)):
+            lessons_by_course.setdefault(lesson["category_id"], []).append(representation)
+        for row, representation in zip(rows, data):
+            representation["lessons"] = lessons_by_course.get(row["id"], [])
+        # порядок ключей должен совпадать с порядком полей CourseSerializer
+        return [{name: representation[name] for name in self.fields} for representation in data]
@@ -1,4 +1,416 @@
-from lms.models import Course, CourseSubscription
+import json
+import time
+from functools import partial
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connection, connections, transaction
+from django.db.models import (
+    BooleanField,
+    CharField,
+    Count,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Value,
+    Window,
+)
+from django.db.models.functions import Coalesce, Greatest, RowNumber
+from django.utils import timezone
+
+from lms.cache import bump_versions_on_commit, run_on_commit, subscription_cache
+from lms.models import Course, CourseDeletion, CourseSubscription, Lesson, Tombstone
+from users.models import CustomUser, Payment
+
+COURSE_REQUIRED_COLUMNS = ("id", "owner", "updated_at", *Course.COUNTER_FIELDS)
+SEARCH_CONFIG = "russian"
+LESSON_COLUMNS = ("id", "title", "preview", "description", "video_link", "category", "owner", "price", "updated_at")
+
+
+def annotate_courses(queryset, user, fields=None):
+    """
+    Готовит queryset курсов для чтения: загружает только столбцы и prefetch, нужные полям представления,
+    и добавляет признак подписки пользователя аннотацией, чтобы сериализатор не выполнял
+    отдельные запросы для каждого курса (с SUBSCRIPTION_CACHE признак берет сериализатор из кэша подписок).
+    Счетчики берутся из столбцов курса без JOIN,
+    уроки загружаются только для превью (первые LESSONS_PREVIEW_SIZE уроков каждого курса).
+    fields - имена полей CourseSerializer, None означает все поля
+    """
+
+    model_columns = {field.name for field in Course._meta.concrete_fields}
+    if fields is not None:
+        columns = set(COURSE_REQUIRED_COLUMNS) | {name for name in fields if name in model_columns}
+        queryset = queryset.only(*columns)
+
+    annotations = {}
+    if fields is None or "is_subscribed" in fields:
+        if not user.is_authenticated:
+            annotations["is_subscribed"] = Value(False, output_field=BooleanField())
+        elif not settings.SUBSCRIPTION_CACHE:
+            annotations["is_subscribed"] = Exists(CourseSubscription.objects.filter(user=user, course=OuterRef("pk")))
+    if fields is None or "lessons" in fields:
+        lessons = Lesson.objects.filter(category__is_hidden=False).only(*LESSON_COLUMNS)
+        preview = Prefetch("lessons", queryset=lessons[: settings.LESSONS_PREVIEW_SIZE], to_attr="lessons_preview")
+        queryset = queryset.prefetch_related(preview)
+
+    return queryset.annotate(**annotations)
+
+
+def get_subscribed_course_ids(user, course_ids):
+    """
+    Возвращает множество id из course_ids, на которые подписан пользователь:
+    одним SMISMEMBER к кэшу подписок (SUBSCRIPTION_CACHE) или одним запросом к БД
+    """
+
+    if user is None or not user.is_authenticated:
+        return set()
+    if not settings.SUBSCRIPTION_CACHE:
+        subscriptions = CourseSubscription.objects.filter(user=user, course_id__in=list(course_ids))
+        return set(subscriptions.values_list("course_id", flat=True))
+    return subscription_cache.get_subscribed(user.pk, course_ids, partial(_load_subscribed_course_ids, user.pk))
+
+
+def _load_subscribed_course_ids(user_id):
+    """Возвращает id всех курсов, на которые подписан пользователь"""
+    return CourseSubscription.objects.filter(user_id=user_id).values_list("course_id", flat=True)
+
+
+def check_subscription_cache(fix=False, batch_size=500):
+    """
+    Сравнивает построенные множества подписок в кэше с таблицей подписок пачками пользователей.
+    Возвращает список (id пользователя, id курсов, которых нет в кэше, лишние id в кэше);
+    при fix=True множества с расхождениями удаляются и строятся заново при следующем обращении
+    """
+
+    mismatches = []
+    user_ids = list(CustomUser.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(user_ids), batch_size):
+        cached = subscription_cache.get_cached(user_ids[start : start + batch_size])
+        if not cached:
+            continue
+        stored = {user_id: set() for user_id in cached}
+        subscriptions = CourseSubscription.objects.filter(user_id__in=list(cached)).values_list("user_id", "course_id")
+        for user_id, course_id in subscriptions:
+            stored[user_id].add(course_id)
+        for user_id, course_ids in cached.items():
+            if course_ids != stored[user_id]:
+                mismatches.append(
+                    (user_id, sorted(stored[user_id] - course_ids), sorted(course_ids - stored[user_id]))
+                )
+    if fix and mismatches:
+        subscription_cache.delete(*(user_id for user_id, _, _ in mismatches))
+    return mismatches
+
+
+def limit_lessons_per_course(queryset, size=None):
+    """
+    Оставляет не более size первых (в порядке Meta.ordering) уроков каждого курса.
+    Отбор выполняется в том же запросе оконной функцией ROW_NUMBER() по category_id
+    """
+
+    size = settings.LESSONS_PREVIEW_SIZE if size is None else size
+    position = Window(RowNumber(), partition_by=F("category_id"), order_by=[*Lesson._meta.ordering, "pk"])
+    return queryset.annotate(preview_position=position).filter(preview_position__lte=size)
+
+
+def counter_expression(name, delta):
+    """
+    Выражение нового значения счетчика курса. Уменьшение не опускается ниже нуля: разошедшийся счетчик
+    нарушил бы CHECK положительного поля, и удаление урока, подписки или платежа завершилось бы ошибкой
+    (расхождение исправляет recompute_course_counters)
+    """
+    return Greatest(F(name) + delta, 0) if delta < 0 else F(name) + delta
+
+
+def update_course_counters(course_id, **deltas):
+    """Атомарно изменяет счетчики курса на переданные приращения одним UPDATE с F()"""
+
+    if course_id is None:
+        return
+    Course.objects.filter(pk=course_id).update(
+        **{name: counter_expression(name, delta) for name, delta in deltas.items()}
+    )
+
+
+def subscribe_user(user_id, course_ids):
+    """
+    Подписывает пользователя на курсы одним INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING:
+    несуществующие и скрытые курсы и уже существующие подписки (в том числе созданные параллельным запросом)
+    пропускаются без ошибки уникальности. Возвращает созданные подписки, сигналы post_save не отправляются
+    """
+
+    if not course_ids:
+        return []
+    created_at = timezone.now()
+    placeholders = ", ".join(["%s"] * len(course_ids))
+    sql = f"""
+        INSERT INTO lms_coursesubscription (user_id, course_id, created_at)
+        SELECT %s, id, %s FROM lms_course WHERE id IN ({placeholders}) AND is_hidden = %s
+        ON CONFLICT (user_id, course_id) DO NOTHING
+        RETURNING id, course_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, connection.ops.adapt_datetimefield_value(created_at), *course_ids, False])
+        rows = cursor.fetchall()
+    return [
+        CourseSubscription(id=pk, user_id=user_id, course_id=course_id, created_at=created_at)
+        for pk, course_id in rows
+    ]
+
+
+def unsubscribe_user(user_id, course_ids):
+    """
+    Удаляет подписки пользователя на курсы одним DELETE ... RETURNING.
+    Возвращает id курсов, подписки на которые были удалены, сигналы post_delete не отправляются
+    """
+
+    if not course_ids:
+        return []
+    placeholders = ", ".join(["%s"] * len(course_ids))
+    sql = f"""
+        DELETE FROM lms_coursesubscription WHERE user_id = %s AND course_id IN ({placeholders})
+        RETURNING course_id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [user_id, *course_ids])
+        return [course_id for (course_id,) in cursor.fetchall()]
+
+
+def _count_by_course(queryset, course_field):
+    """Возвращает подзапрос количества строк queryset для курса из внешнего запроса"""
+
+    counts = (
+        queryset.filter(**{course_field: OuterRef("pk")})
+        .order_by()
+        .values(course_field)
+        .annotate(amount=Count("pk"))
+        .values("amount")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def recompute_course_counters(queryset=None):
+    """
+    Пересчитывает счетчики курсов по таблицам уроков, подписок и платежей
+    и исправляет расхождения одним UPDATE. Возвращает количество исправленных курсов
+    """
+
+    actual = {
+        "lessons_count": _count_by_course(Lesson.objects.all(), "category"),
+        "subscribers_count": _count_by_course(CourseSubscription.objects.all(), "course"),
+        "purchases_count": _count_by_course(Payment.objects.all(), "paid_course"),
+    }
+    queryset = Course.objects.all() if queryset is None else queryset
+    drift = Q()
+    for name in Course.COUNTER_FIELDS:
+        drift |= ~Q(**{name: F(f"actual_{name}")})
+    drifted = queryset.annotate(**{f"actual_{name}": value for name, value in actual.items()}).filter(drift)
+    drifted_ids = list(drifted.values_list("pk", flat=True))
+    if drifted_ids:
+        Course.objects.filter(pk__in=drifted_ids).update(**actual)
+        bump_versions_on_commit("courses:list", *(f"courses:{pk}" for pk in drifted_ids))
+    return len(drifted_ids)
+
+
+def _search_rows(queryset, kind, course_id, rank):
+    """Приводит курсы и уроки к общему набору столбцов результата поиска"""
+
+    return (
+        queryset.annotate(
+            kind=Value(kind, output_field=CharField()),
+            course_id=course_id,
+            rank=rank,
+        )
+        .values("id", "kind", "title", "course_id", "rank")
+        .order_by()
+    )
+
+
+def _ranked_union(course_filter, lesson_filter, rank):
+    """Объединяет найденные курсы и уроки в один ранжированный queryset"""
+
+    courses = _search_rows(Course.visible.filter(course_filter), "course", F("id"), rank)
+    lessons = _search_rows(
+        Lesson.objects.filter(lesson_filter, category__is_hidden=False), "lesson", F("category_id"), rank
+    )
+    return courses.union(lessons, all=True).order_by("-rank", "kind", "id")
+
+
+def search_catalog(query):
+    """
+    Ищет курсы и уроки по названию и описанию.
+    В PostgreSQL используется поддерживаемый триггером столбец search_vector (GIN-индекс, русская морфология),
+    а если полнотекстовый поиск ничего не нашел - триграммное сходство названия (опечатки).
+    В других СУБД выполняется поиск подстроки без ранжирования
+    """
+
+    if connection.vendor != "postgresql":
+        text_filter = Q(title__icontains=query) | Q(description__icontains=query)
+        return _ranked_union(text_filter, text_filter, Value(0.0, output_field=FloatField()))
+
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+    results = _ranked_union(
+        Q(search_vector=search_query), Q(search_vector=search_query), SearchRank(F("search_vector"), search_query)
+    )
+    if results[:1]:
+        return results
+
+    trigram_filter = Q(title__trigram_similar=query)
+    return _ranked_union(trigram_filter, trigram_filter, TrigramSimilarity("title", query))
+
+
+def delete_expired_tombstones():
+    """Удаляет отметки об удалении старше SYNC_TOMBSTONE_RETENTION, возвращает количество удаленных"""
+
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - settings.SYNC_TOMBSTONE_RETENTION).delete()
+    return deleted
+
+
+def hide_course(course, user):
+    """
+    Скрывает курс до асинхронного удаления одним UPDATE и создает запись прогресса удаления.
+    Объемы зависимых строк берутся из счетчиков курса, без COUNT по таблицам.
+    Возвращает None, если курс уже скрыт параллельным запросом
+    """
+
+    if not Course.visible.filter(pk=course.pk).update(is_hidden=True, updated_at=timezone.now()):
+        return None
+    return CourseDeletion.objects.create(
+        course=course,
+        title=course.title,
+        owner=user if user.is_authenticated else None,
+        lessons_total=course.lessons_count,
+        subscriptions_total=course.subscribers_count,
+        payments_total=course.purchases_count,
+    )
+
+
+def _delete_rows(model, ids):
+    """Удаляет строки по id одним DELETE, без сборщика связей и сигналов (зависимые строки уже обработаны)"""
+
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {model._meta.db_table} WHERE id IN ({placeholders})", ids)
+
+
+def _delete_lessons_batch(course_id, size):
+    """Удаляет пачку уроков курса: отвязывает их платежи и оставляет отметки об удалении для синхронизации"""
+
+    ids = list(Lesson.objects.filter(category_id=course_id).order_by("pk").values_list("pk", flat=True)[:size])
+    if ids:
+        Payment.objects.filter(paid_lesson_id__in=ids).update(paid_lesson=None)
+        _delete_rows(Lesson, ids)
+        Tombstone.objects.bulk_create(Tombstone(kind="lesson", object_id=pk) for pk in ids)
+        bump_versions_on_commit("lessons:list")
+    return len(ids)
+
+
+def _delete_subscriptions_batch(course_id, size):
+    """Удаляет пачку подписок на курс и убирает курс из множеств подписок пользователей"""
+
+    rows = list(
+        CourseSubscription.objects.filter(course_id=course_id).order_by("pk").values_list("pk", "user_id")[:size]
+    )
+    if rows:
+        _delete_rows(CourseSubscription, [pk for pk, _ in rows])
+        for _, user_id in rows:
+            run_on_commit(subscription_cache.remove, user_id, [course_id])
+        bump_versions_on_commit(*(f"subscriptions:{user_id}" for _, user_id in rows))
+    return len(rows)
+
+
+def _detach_payments_batch(course_id, size):
+    """Отвязывает пачку платежей от курса (SET_NULL, как при обычном удалении)"""
+
+    ids = list(Payment.objects.filter(paid_course_id=course_id).order_by("pk").values_list("pk", flat=True)[:size])
+    if ids:
+        Payment.objects.filter(pk__in=ids).update(paid_course=None)
+    return len(ids)
+
+
+COURSE_DELETION_STEPS = (
+    ("lessons_deleted", _delete_lessons_batch),
+    ("subscriptions_deleted", _delete_subscriptions_batch),
+    ("payments_detached", _detach_payments_batch),
+)
+
+
+def delete_course_batch(deletion_id, size):
+    """
+    Обрабатывает одну пачку зависимых строк скрытого курса в транзакции вместе с записью прогресса:
+    сначала уроки, затем подписки, затем платежи. Когда зависимых строк не осталось, удаляет сам курс
+    (с обычными сигналами: отметка об удалении, инвалидация кэша, экспорт каталога).
+    Запись прогресса блокируется, поэтому перезапущенная задача не обрабатывает те же строки параллельно.
+    Возвращает True, если удаление завершено
+    """
+
+    with transaction.atomic():
+        deletion = CourseDeletion.objects.select_for_update().get(pk=deletion_id)
+        if deletion.status == "done":
+            return True
+        if deletion.course_id is not None:
+            for field, step in COURSE_DELETION_STEPS:
+                count = step(deletion.course_id, size)
+                if count:
+                    setattr(deletion, field, getattr(deletion, field) + count)
+                    deletion.save(update_fields=[field, "updated_at"])
+                    return False
+            course = Course.objects.filter(pk=deletion.course_id).first()
+            if course is not None:
+                course.delete()
+        deletion.status = "done"
+        deletion.finished_at = timezone.now()
+        deletion.save(update_fields=["status", "finished_at", "updated_at"])
+    return True
+
+
+def run_course_deletion(deletion_id, seconds):
+    """
+    Удаляет скрытый курс пачками по COURSE_DELETE_BATCH_SIZE строк, пока удаление не завершится
+    или не пройдет seconds секунд. Каждая пачка - отдельная короткая транзакция, поэтому блокировки
+    не держатся долго, а прерванное удаление продолжается с того же места. Возвращает True по завершении
+    """
+
+    CourseDeletion.objects.filter(pk=deletion_id).exclude(status="done").update(
+        status="running", error="", updated_at=timezone.now()
+    )
+    deadline = time.monotonic() + seconds
+    while not delete_course_batch(deletion_id, settings.COURSE_DELETE_BATCH_SIZE):
+        if time.monotonic() >= deadline:
+            return False
+    return True
+
+
+def get_stalled_course_deletions(timeout):
+    """Возвращает id незавершенных удалений курсов, прогресс которых не менялся дольше timeout"""
+
+    return list(
+        CourseDeletion.objects.exclude(status="done")
+        .filter(updated_at__lt=timezone.now() - timeout)
+        .values_list("id", flat=True)
+    )
+
+
+def estimate_count(queryset):
+    """
+    Возвращает оценку числа строк queryset по статистике планировщика Postgres (Plan Rows из EXPLAIN)
+    без выполнения COUNT(*). Для других СУБД возвращает None
+    """
+
+    db = connections[queryset.db]
+    if db.vendor != "postgresql":
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with db.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
 
 
 def get_subscribers_emails(course_id):
@@ -0,0 +1,329 @@
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from lms.cache import bump_versions_on_commit, reference_cache, run_on_commit, subscription_cache
+from lms.documents import DOCUMENT_REBUILD_DEBOUNCE, document_pending_key
+from lms.export import CATALOG_EXPORT_PENDING_KEY
+from lms.models import Course, CourseSubscription, Lesson, Tombstone
+from lms.services import counter_expression, update_course_counters
+from lms.tasks import delete_course, export_catalog, rebuild_course_document
+from users.models import City, CustomUser, Payment
+
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_course_cache(sender, instance, **kwargs):
+    """Инвалидирует закэшированные ответы по курсу и списку курсов"""
+    bump_versions_on_commit("courses:list", f"courses:{instance.pk}")
+
+
+def schedule_document_rebuild(*course_ids):
+    """
+    Ставит перестроение представлений курсов в очередь после фиксации транзакции.
+    Если представления выключены (COURSE_DOCUMENTS), ничего не делает
+    """
+
+    if not settings.COURSE_DOCUMENTS:
+        return
+    for course_id in set(course_ids):
+        if course_id:
+            run_on_commit(enqueue_document_rebuild, course_id)
+
+
+def enqueue_document_rebuild(course_id):
+    """
+    Ставит задачу перестроения представления курса, если задача курса еще не ждет выполнения.
+    Отметка ожидания ставится только после фиксации, а при ошибке постановки снимается:
+    иначе откаченная транзакция или недоступный брокер отключили бы перестроение на DOCUMENT_REBUILD_DEBOUNCE
+    """
+
+    key = document_pending_key(course_id)
+    if not cache.add(key, 1, DOCUMENT_REBUILD_DEBOUNCE):
+        return
+    try:
+        rebuild_course_document.delay(course_id)
+    except Exception:
+        cache.delete(key)
+        raise
+
+
+@receiver(post_save, sender=Course)
+def rebuild_saved_course_document(sender, instance, **kwargs):
+    """Перестраивает представление измененного курса"""
+    schedule_document_rebuild(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def rebuild_lesson_course_documents(sender, instance, **kwargs):
+    """Перестраивает представления курсов, в превью которых мог входить урок"""
+    schedule_document_rebuild(instance.category_id, getattr(instance, "_previous_category_id", None))
+
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Lesson)
+def schedule_catalog_export(sender, instance, **kwargs):
+    """Ставит экспорт каталога в очередь при изменении курсов и уроков"""
+    request_catalog_export()
+
+
+def request_catalog_export():
+    """
+    Ставит экспорт каталога в очередь с задержкой CATALOG_EXPORT_DEBOUNCE после фиксации транзакции,
+    чтобы серия изменений давала один снимок
+    """
+
+    if settings.CATALOG_EXPORT and cache.add(CATALOG_EXPORT_PENDING_KEY, 1, settings.CATALOG_EXPORT_DEBOUNCE * 2):
+        run_on_commit(export_catalog.apply_async, countdown=settings.CATALOG_EXPORT_DEBOUNCE)
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Lesson)
+def create_tombstone(sender, instance, **kwargs):
+    """Сохраняет отметку об удалении, чтобы клиенты синхронизации узнали об удаленном объекте"""
+    Tombstone.objects.create(kind=sender._meta.model_name, object_id=instance.pk)
+
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_category(sender, instance, **kwargs):
+    """Запоминает прежний курс урока, чтобы при переносе инвалидировать оба курса"""
+
+    if instance.pk:
+        instance._previous_category_id = (
+            Lesson.objects.filter(pk=instance.pk).values_list("category_id", flat=True).first()
+        )
+
+
+def update_counters_on_save(instance, created, course_field, counter):
+    """Переносит единицу счетчика курса при создании объекта или смене его курса"""
+
+    course_id = getattr(instance, f"{course_field}_id")
+    previous_course_id = getattr(instance, f"_previous_{course_field}_id", None)
+    if created:
+        update_course_counters(course_id, **{counter: 1})
+    elif previous_course_id != course_id:
+        update_course_counters(previous_course_id, **{counter: -1})
+        update_course_counters(course_id, **{counter: 1})
+
+
+@receiver(post_save, sender=Lesson)
+def count_saved_lesson(sender, instance, created, **kwargs):
+    """Обновляет счетчики уроков курса"""
+    update_counters_on_save(instance, created, "category", "lessons_count")
+
+
+@receiver(post_delete, sender=Lesson)
+def count_deleted_lesson(sender, instance, **kwargs):
+    """Уменьшает счетчик уроков курса"""
+    update_course_counters(instance.category_id, lessons_count=-1)
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def invalidate_lesson_cache(sender, instance, **kwargs):
+    """Инвалидирует закэшированные ответы по уроку, списку уроков и курсам, в которые он входит"""
+
+    namespaces = {"lessons:list", f"lessons:{instance.pk}", "courses:list", f"courses:{instance.category_id}"}
+    previous_category_id = getattr(instance, "_previous_category_id", None)
+    if previous_category_id:
+        namespaces.add(f"courses:{previous_category_id}")
+    bump_versions_on_commit(*namespaces)
+
+
+def lessons_bulk_saved(lessons, previous_category_ids=None):
+    """
+    Выполняет для уроков, записанных bulk_create/bulk_update (сигналы при этом не отправляются),
+    то же, что обработчики post_save: счетчики уроков (один UPDATE на курс), инвалидацию кэша ответов,
+    перестроение представлений курсов и экспорт каталога.
+    previous_category_ids - {id урока: прежний курс} для измененных уроков, None для созданных
+    """
+
+    deltas = Counter()
+    namespaces = {"lessons:list", "courses:list"}
+    for lesson in lessons:
+        if previous_category_ids is None:
+            deltas[lesson.category_id] += 1
+        else:
+            namespaces.add(f"lessons:{lesson.pk}")
+            previous_category_id = previous_category_ids.get(lesson.pk)
+            if previous_category_id != lesson.category_id:
+                deltas[previous_category_id] -= 1
+                deltas[lesson.category_id] += 1
+    course_ids = {lesson.category_id for lesson in lessons} | set(deltas)
+    for course_id, delta in deltas.items():
+        if delta:
+            update_course_counters(course_id, lessons_count=delta)
+
+    bump_versions_on_commit(*namespaces, *(f"courses:{course_id}" for course_id in course_ids if course_id))
+    schedule_document_rebuild(*course_ids)
+    if lessons:
+        request_catalog_export()
+
+
+def courses_bulk_updated(course_ids):
+    """
+    Выполняет для курсов, измененных одним UPDATE (сигналы при этом не отправляются), то же,
+    что обработчики post_save: инвалидацию кэша ответов, перестроение представлений и экспорт каталога
+    """
+
+    if not course_ids:
+        return
+    bump_versions_on_commit("courses:list", *(f"courses:{course_id}" for course_id in course_ids))
+    schedule_document_rebuild(*course_ids)
+    request_catalog_export()
+
+
+def course_hidden(course, deletion):
+    """
+    Выполняет для курса, скрытого до асинхронного удаления (UPDATE без сигналов), инвалидацию ответов
+    и экспорт каталога и ставит задачу удаления в очередь после фиксации транзакции
+    """
+
+    bump_versions_on_commit("courses:list", f"courses:{course.pk}", "lessons:list")
+    request_catalog_export()
+    run_on_commit(delete_course.delay, deletion.pk)
+
+
+def write_subscription_cache(user_id, subscribed=(), unsubscribed=()):
+    """Дописывает изменения подписок в множество подписок пользователя после фиксации транзакции"""
+
+    if subscribed:
+        run_on_commit(subscription_cache.add, user_id, list(subscribed))
+    if unsubscribed:
+        run_on_commit(subscription_cache.remove, user_id, list(unsubscribed))
+
+
+def subscriptions_changed(user_id, subscribed=(), unsubscribed=()):
+    """
+    Выполняет для подписок, созданных или удаленных без ORM (subscribe_user/unsubscribe_user),
+    то же, что обработчики сигналов: счетчики подписчиков (один UPDATE на направление), инвалидацию кэша ответов
+    и запись в кэш подписок
+    """
+
+    for course_ids, delta in ((subscribed, 1), (unsubscribed, -1)):
+        if course_ids:
+            Course.objects.filter(pk__in=course_ids).update(
+                subscribers_count=counter_expression("subscribers_count", delta)
+            )
+    write_subscription_cache(user_id, subscribed, unsubscribed)
+    course_ids = {*subscribed, *unsubscribed}
+    if course_ids:
+        bump_versions_on_commit(
+            f"subscriptions:{user_id}", "courses:list", *(f"courses:{course_id}" for course_id in course_ids)
+        )
+
+
+@receiver(post_save, sender=CourseSubscription)
+def count_saved_subscription(sender, instance, created, **kwargs):
+    """Увеличивает счетчик подписчиков курса"""
+    if created:
+        update_course_counters(instance.course_id, subscribers_count=1)
+
+
+@receiver(post_delete, sender=CourseSubscription)
+def count_deleted_subscription(sender, instance, **kwargs):
+    """Уменьшает счетчик подписчиков курса"""
+    update_course_counters(instance.course_id, subscribers_count=-1)
+
+
+@receiver(post_save, sender=CourseSubscription)
+def cache_saved_subscription(sender, instance, created, **kwargs):
+    """Добавляет курс в множество подписок пользователя"""
+    if created:
+        write_subscription_cache(instance.user_id, subscribed=[instance.course_id])
+
+
+@receiver(post_delete, sender=CourseSubscription)
+def cache_deleted_subscription(sender, instance, **kwargs):
+    """Удаляет курс из множества подписок пользователя"""
+    write_subscription_cache(instance.user_id, unsubscribed=[instance.course_id])
+
+
+@receiver([post_save, post_delete], sender=CourseSubscription)
+def invalidate_subscription_cache(sender, instance, **kwargs):
+    """
+    Инвалидирует закэшированные курсы пользователя (изменился признак подписки)
+    и ответы с курсом, так как изменилось количество подписчиков
+    """
+    bump_versions_on_commit(f"subscriptions:{instance.user_id}", "courses:list", f"courses:{instance.course_id}")
+
+
+@receiver(pre_save, sender=Payment)
+def remember_payment_course(sender, instance, **kwargs):
+    """Запоминает прежний оплаченный курс, чтобы при его смене перенести покупку в счетчиках"""
+
+    if instance.pk:
+        instance._previous_paid_course_id = (
+            Payment.objects.filter(pk=instance.pk).values_list("paid_course_id", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Payment)
+def count_saved_payment(sender, instance, created, **kwargs):
+    """Обновляет счетчики покупок курса"""
+    update_counters_on_save(instance, created, "paid_course", "purchases_count")
+
+
+@receiver(post_delete, sender=Payment)
+def count_deleted_payment(sender, instance, **kwargs):
+    """Уменьшает счетчик покупок курса"""
+    update_course_counters(instance.paid_course_id, purchases_count=-1)
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def invalidate_payment_cache(sender, instance, **kwargs):
+    """Инвалидирует ответы с курсом, так как изменилось количество покупок"""
+
+    namespaces = {"courses:list"}
+    for course_id in (instance.paid_course_id, getattr(instance, "_previous_paid_course_id", None)):
+        if course_id:
+            namespaces.add(f"courses:{course_id}")
+    bump_versions_on_commit(*namespaces)
+
+
+def invalidate_reference(*keys):
+    """Сбрасывает справочные данные во всех процессах после фиксации транзакции"""
+    run_on_commit(reference_cache.invalidate, *keys)
+
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_default_course(sender, instance, **kwargs):
+    """Сбрасывает id курса по умолчанию: измененный или удаленный курс мог быть курсом 'Вне курса'"""
+    invalidate_reference("default-course")
+
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_moderators(sender, instance, **kwargs):
+    """Сбрасывает список модераторов при переименовании или удалении группы"""
+    invalidate_reference("moderator-ids")
+
+
+@receiver([post_save, post_delete], sender=City)
+def invalidate_cities(sender, instance, **kwargs):
+    """Сбрасывает справочник городов"""
+    invalidate_reference("cities")
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+def invalidate_user_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """Инвалидирует закэшированные ответы пользователя при изменении его групп (прав модератора)"""
+
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        user_ids = pk_set or []
+    else:
+        user_ids = [instance.pk]
+    bump_versions_on_commit(*(f"users:{user_id}" for user_id in user_ids))
+    invalidate_reference("moderator-ids")
+
+
+@receiver(post_delete, sender=CustomUser)
+def invalidate_owner_fragments(sender, instance, **kwargs):
+    """
+    При удалении пользователя владелец его курсов и уроков обнуляется UPDATE без изменения updated_at,
+    поэтому закэшированные фрагменты курсов и уроков сбрасываются целиком
+    """
+    bump_versions_on_commit("fragments:lms.course", "fragments:lms.lesson")
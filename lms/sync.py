@@ -0,0 +1,123 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from lms.models import Course, Lesson, Tombstone
+from lms.paginators import CursorEncoder
+from lms.serializers import CourseValuesSerializer, LessonValuesSerializer
+
+SYNC_COURSE_FIELDS = ("id", "title", "preview", "description", "price")
+SYNC_SOURCES = ("courses", "lessons", "deleted")
+
+
+class SyncCursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = "Отметки об удалениях для этого курсора уже удалены, выполните полную синхронизацию"
+    default_code = "sync_cursor_expired"
+
+
+def encode_since(positions):
+    """Кодирует позиции источников {источник: (время, id)} в непрозрачный курсор"""
+
+    payload = json.dumps({source: list(position) for source, position in positions.items()}, cls=CursorEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_since(encoded):
+    """Декодирует курсор в позиции источников, ValidationError для некорректного курсора"""
+
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        positions = {source: (parse_datetime(payload[source][0]), int(payload[source][1])) for source in SYNC_SOURCES}
+    except (TypeError, ValueError, KeyError, IndexError):
+        raise ValidationError({"since": "Некорректный курсор синхронизации"})
+    if any(timestamp is None for timestamp, _ in positions.values()):
+        raise ValidationError({"since": "Некорректный курсор синхронизации"})
+    return positions
+
+
+def _after(queryset, time_field, position):
+    """Оставляет строки после позиции (время, id) в порядке (time_field, id)"""
+
+    queryset = queryset.order_by(time_field, "id")
+    if position is None:
+        return queryset
+    timestamp, pk = position
+    return queryset.filter(Q(**{f"{time_field}__gt": timestamp}) | Q(**{time_field: timestamp, "id__gt": pk}))
+
+
+def _read(rows, time_field, started, size):
+    """
+    Возвращает (строки, новая позиция, есть ли еще строки).
+    Если источник прочитан до конца, позиция переносится на начало синхронизации минус SYNC_SAFETY_MARGIN:
+    время строки ставится до фиксации транзакции, и строка, зафиксированная после чтения, может оказаться
+    раньше начала синхронизации. Строки из этого окна приходят повторно, клиент применяет их по id
+    """
+
+    rows = list(rows[: size + 1])
+    has_more = len(rows) > size
+    rows = rows[:size]
+    position = (rows[-1][time_field], rows[-1]["id"]) if has_more else (started - settings.SYNC_SAFETY_MARGIN, 0)
+    return rows, position, has_more
+
+
+def collect_changes(request, since=None):
+    """
+    Собирает изменения каталога после курсора since: измененные курсы и уроки (updated_at) и удаленные id.
+    Каждый источник читается одним диапазонным запросом по индексу (время, id), поэтому синхронизация
+    без изменений - это три пустых index probe. Без since возвращается весь каталог без удалений
+    """
+
+    started = timezone.now()
+    size = settings.SYNC_PAGE_SIZE
+    if since:
+        positions = decode_since(since)
+        if positions["deleted"][0] < started - settings.SYNC_TOMBSTONE_RETENTION:
+            raise SyncCursorExpired()
+    else:
+        positions = {"courses": None, "lessons": None, "deleted": (started, 0)}
+
+    context = {"request": request, "fields": set(SYNC_COURSE_FIELDS), "expand": set()}
+    courses_serializer = CourseValuesSerializer(context=context)
+    lessons_serializer = LessonValuesSerializer(context=context)
+
+    courses, positions["courses"], courses_more = _read(
+        courses_serializer.get_values_queryset(_after(Course.visible.all(), "updated_at", positions["courses"])),
+        "updated_at",
+        started,
+        size,
+    )
+    lessons, positions["lessons"], lessons_more = _read(
+        lessons_serializer.get_values_queryset(
+            _after(Lesson.objects.filter(category__is_hidden=False), "updated_at", positions["lessons"])
+        ),
+        "updated_at",
+        started,
+        size,
+    )
+    tombstones, positions["deleted"], deleted_more = _read(
+        _after(Tombstone.objects.all(), "deleted_at", positions["deleted"]).values(
+            "id", "kind", "object_id", "deleted_at"
+        ),
+        "deleted_at",
+        started,
+        size,
+    )
+
+    deleted = {"courses": [], "lessons": []}
+    for tombstone in tombstones:
+        deleted[f"{tombstone['kind']}s"].append(tombstone["object_id"])
+    return {
+        "courses": courses_serializer.to_representation_many(courses),
+        "lessons": lessons_serializer.to_representation_many(lessons),
+        "deleted": deleted,
+        "has_more": courses_more or lessons_more or deleted_more,
+        "since": encode_since(positions),
+    }
@@ -1,11 +1,23 @@
 from datetime import datetime
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import send_mail
+from django.utils import timezone
 
 from celery import shared_task
 
 from config.settings import EMAIL_HOST_USER
-from lms.services import get_course_update_mail_info, get_subscribers_emails
+from lms.documents import build_course_documents, document_pending_key
+from lms.export import CATALOG_EXPORT_PENDING_KEY, write_catalog_snapshot
+from lms.models import CourseDeletion
+from lms.services import (
+    delete_expired_tombstones,
+    get_course_update_mail_info,
+    get_stalled_course_deletions,
+    get_subscribers_emails,
+    run_course_deletion,
+)
 from users.models import CustomUser
 
 
@@ -34,3 +46,56 @@ def send_course_update_email(self, course_id):
         send_mail(subject=subject, message=message, recipient_list=emails, from_email=EMAIL_HOST_USER)
     except Exception as exc:
         raise self.retry(exc=exc)
+
+
+@shared_task
+def purge_tombstones():
+    """Удаляет устаревшие отметки об удалении курсов и уроков"""
+    return delete_expired_tombstones()
+
+
+@shared_task
+def rebuild_course_document(course_id):
+    """Перестраивает готовое представление курса"""
+
+    cache.delete(document_pending_key(course_id))
+    return build_course_documents([course_id])
+
+
+@shared_task
+def export_catalog():
+    """Записывает статический снимок каталога для отдачи через nginx"""
+
+    cache.delete(CATALOG_EXPORT_PENDING_KEY)
+    return write_catalog_snapshot()
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=60)
+def delete_course(self, deletion_id):
+    """
+    Удаляет скрытый курс пачками. Если удаление не уложилось в COURSE_DELETE_TASK_SECONDS,
+    продолжение ставится в очередь отдельной задачей, чтобы не занимать воркер надолго
+    """
+
+    try:
+        done = run_course_deletion(deletion_id, settings.COURSE_DELETE_TASK_SECONDS)
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            CourseDeletion.objects.filter(pk=deletion_id).update(
+                status="failed", error=repr(exc), updated_at=timezone.now()
+            )
+            raise
+        raise self.retry(exc=exc)
+    if not done:
+        delete_course.delay(deletion_id)
+    return done
+
+
+@shared_task
+def resume_course_deletions():
+    """Перезапускает удаления курсов, задачи которых потерялись или завершились ошибкой"""
+
+    deletion_ids = get_stalled_course_deletions(settings.COURSE_DELETE_STALLED_AFTER)
+    for deletion_id in deletion_ids:
+        delete_course.delay(deletion_id)
+    return len(deletion_ids)
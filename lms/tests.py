@@ -1,11 +1,68 @@
+import datetime
+import gzip
+import json
+import os
+import re
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import MagicMock, call, patch
+
+from django.conf import settings
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.paginator import EmptyPage
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
 
+from redis.exceptions import WatchError
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient, APITestCase
 
-from lms.models import Course, CourseSubscription, Lesson
-from users.models import CustomUser
+from lms.cache import (
+    SUBSCRIPTIONS_LOADED_MARKER,
+    SUBSCRIPTIONS_UPDATE_SCRIPT,
+    bump_versions_on_commit,
+    get_or_recompute,
+    get_response_cache_stats,
+    reference_cache,
+    subscription_cache,
+)
+from lms.documents import build_course_documents, document_pending_key
+from lms.export import write_catalog_snapshot
+from lms.models import (
+    Course,
+    CourseDeletion,
+    CourseDocument,
+    CourseSubscription,
+    Lesson,
+    Tombstone,
+    get_default_course,
+)
+from lms.paginators import EstimatedCountPaginator
+from lms.renderers import FastJSONParser, FastJSONRenderer
+from lms.serializers import CourseSerializer, CourseValuesSerializer, LessonValuesSerializer
+from lms.services import (
+    delete_expired_tombstones,
+    get_subscribed_course_ids,
+    recompute_course_counters,
+    run_course_deletion,
+    subscribe_user,
+)
+from lms.tasks import resume_course_deletions
+from users.models import CustomUser, Payment
+from users.permissions import get_moderator_ids
 
 
 class TestBaseLMSViewSet(APITestCase):
@@ -14,6 +71,7 @@ class TestBaseLMSViewSet(APITestCase):
     def setUp(self):
         """Формирует тестовые данные"""
         super().setUp()
+        cache.clear()
         self.superuser = CustomUser.objects.create_superuser(
             email="admin@test.com", username="admin", password="admin123"
         )
@@ -151,6 +209,2026 @@ class TestCourseViewSet(TestBaseLMSViewSet):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+class TestCourseFilters(TestBaseLMSViewSet):
+    """Тестирует фильтры каталога курсов"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.cheap = Course.objects.create(title="Cheap", price="100.00", owner=self.user)
+        self.expensive = Course.objects.create(title="Expensive", price="5000.00", owner=self.stranger)
+        Lesson.objects.create(title="Lesson", category=self.cheap, owner=self.user)
+        Course.objects.filter(pk=self.expensive.pk).update(created_at=timezone.now() - timedelta(days=30))
+        self.url = reverse("lms:courses-list")
+
+    def titles(self, params):
+        """Возвращает названия курсов из списка с фильтрами"""
+        response = self.client_super.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [course["title"] for course in response.data["results"]]
+
+    def test_filters(self):
+        """Проверяет фильтры по цене, владельцу, датам и наличию уроков"""
+        week_ago = (timezone.now() - timedelta(days=7)).isoformat()
+        self.assertEqual(self.titles({"price_min": 1000}), ["Expensive"])
+        self.assertEqual(self.titles({"price_max": 1000}), ["Cheap"])
+        self.assertEqual(self.titles({"owner": self.stranger.id}), ["Expensive"])
+        self.assertEqual(self.titles({"created_after": week_ago}), ["Cheap"])
+        self.assertEqual(self.titles({"created_before": week_ago}), ["Expensive"])
+        self.assertEqual(self.titles({"updated_after": week_ago}), ["Cheap", "Expensive"])
+        self.assertEqual(self.titles({"has_lessons": "true"}), ["Cheap"])
+        self.assertEqual(self.titles({"has_lessons": "false"}), ["Expensive"])
+
+    def test_invalid_filter(self):
+        """Проверяет ошибку валидации некорректного значения фильтра"""
+        response = self.client_super.get(self.url, {"price_min": "abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filters_do_not_apply_to_lessons(self):
+        """Проверяет, что фильтры курсов не применяются к урокам курса"""
+        response = self.client_super.get(reverse("lms:courses-lessons", args=[self.cheap.id]), {"price_min": 1000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+
+
+class TestCourseFilterPlans(APITestCase):
+    """
+    Проверяет по планам (EXPLAIN) запросов, которые выполняет список курсов с фильтрами,
+    что фильтры каталога используют индексы. Таблица заполняется небольшим числом курсов,
+    планировщик выбирает индексы по статистике ANALYZE
+    """
+
+    rows = 500
+    owners = 100
+    fill_sql = {
+        "postgresql": """
+            INSERT INTO lms_course (title, preview, description, owner_id, price, created_at, updated_at,
+                                    lessons_count, subscribers_count, purchases_count, is_hidden)
+            SELECT 'plan-' || n, '', NULL, %(first_owner)s + n %% %(owners)s, (n %% 100000) / 10.0,
+                   %(now)s::timestamptz - n * interval '1 minute', %(now)s::timestamptz - n * interval '1 minute',
+                   CASE WHEN n %% 100 = 0 THEN 1 ELSE 0 END, 0, 0, FALSE
+            FROM generate_series(1, %(rows)s) AS n
+        """,
+        "sqlite": """
+            INSERT INTO lms_course (title, preview, description, owner_id, price, created_at, updated_at,
+                                    lessons_count, subscribers_count, purchases_count, is_hidden)
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %(rows)s)
+            SELECT 'plan-' || n, '', NULL, %(first_owner)s + n %% %(owners)s, (n %% 100000) / 10.0,
+                   strftime('%%Y-%%m-%%d %%H:%%M:%%f', %(now)s, '-' || n || ' minutes'),
+                   strftime('%%Y-%%m-%%d %%H:%%M:%%f', %(now)s, '-' || n || ' minutes'),
+                   CASE WHEN n %% 100 = 0 THEN 1 ELSE 0 END, 0, 0, FALSE
+            FROM seq
+        """,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        """Заполняет таблицу курсов одним INSERT ... SELECT и обновляет статистику планировщика"""
+        owners = CustomUser.objects.bulk_create(
+            CustomUser(email=f"owner{i}@test.com", username=f"owner{i}") for i in range(cls.owners)
+        )
+        cls.owner = owners[0]
+        cls.now = timezone.now()
+        params = {"first_owner": cls.owner.id, "owners": cls.owners, "now": cls.now.isoformat(), "rows": cls.rows}
+        with connection.cursor() as cursor:
+            cursor.execute(cls.fill_sql[connection.vendor], params)
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def explain(sql):
+        """Возвращает текст плана запроса"""
+        prefix = "EXPLAIN" if connection.vendor == "postgresql" else "EXPLAIN QUERY PLAN"
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}")
+            return "\n".join(str(row[-1]) for row in cursor.fetchall())
+
+    def assert_uses_index(self, params, index_name):
+        """
+        Запрашивает список курсов с фильтрами и проверяет, что запросы к курсам, которые выполнил эндпоинт
+        (подсчет и страница с аннотациями и сортировкой по названию), используют индекс
+        """
+
+        client = APIClient()
+        client.force_authenticate(user=self.owner)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("lms:courses-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        selects = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT") and 'FROM "lms_course"' in query["sql"]
+        ]
+        self.assertEqual(len(selects), 2)
+        for sql in selects:
+            plan = self.explain(sql)
+            self.assertIn(index_name, plan, f"{sql}\n{plan}")
+
+    def test_price_range(self):
+        """Проверяет индекс по цене"""
+        self.assert_uses_index({"price_min": 10, "price_max": 11}, "lms_course_price_idx")
+
+    def test_owner_created_window(self):
+        """Проверяет индекс по владельцу и дате создания"""
+        params = {"owner": self.owner.id, "created_after": (self.now - timedelta(days=30)).isoformat()}
+        self.assert_uses_index(params, "lms_course_owner_created_idx")
+
+    def test_created_window(self):
+        """Проверяет индекс по дате создания"""
+        params = {"created_after": (self.now - timedelta(hours=1)).isoformat(), "created_before": self.now.isoformat()}
+        self.assert_uses_index(params, "lms_course_created_at_idx")
+
+    def test_updated_window(self):
+        """Проверяет индекс по дате изменения"""
+        params = {"updated_after": (self.now - timedelta(hours=1)).isoformat(), "updated_before": self.now.isoformat()}
+        self.assert_uses_index(params, "lms_course_updated_at_idx")
+
+    def test_has_lessons(self):
+        """Проверяет частичный индекс курсов с уроками"""
+        self.assert_uses_index({"has_lessons": "true"}, "lms_course_with_lessons_idx")
+
+
+@skipUnless(
+    os.getenv("PLAN_TESTS_COURSES") and connection.vendor == "postgresql",
+    "Проверка на большой таблице включается переменной окружения PLAN_TESTS_COURSES и требует PostgreSQL",
+)
+class TestCourseFilterPlansLarge(TestCourseFilterPlans):
+    """Проверяет индексы фильтров каталога в PostgreSQL на PLAN_TESTS_COURSES курсах (например, 1000000)"""
+
+    rows = int(os.getenv("PLAN_TESTS_COURSES", 0))
+
+
+class TestListQueryPlans(APITestCase):
+    """
+    Регрессионные тесты планов запросов списков: запросы каждого списочного эндпоинта
+    на заполненных таблицах выполняются через EXPLAIN, и тест падает, если какой-либо запрос
+    читает таблицу больше max_scan_rows строк целиком: последовательным сканированием или полным проходом по индексу.
+    Таблицы заполняются небольшим числом строк, планировщик выбирает индексы по статистике ANALYZE.
+    Поиск (/lms/search/) не проверяется: вне PostgreSQL он намеренно ищет подстроку полным просмотром
+    """
+
+    courses = 300
+    lessons_per_course = 5
+    subscriptions = 2000
+    payments = 2000
+    owners = 100
+    max_scan_rows = 100
+    fill_sql = {
+        "postgresql": [
+            """
+            INSERT INTO lms_course (title, preview, description, owner_id, price, created_at, updated_at,
+                                    lessons_count, subscribers_count, purchases_count, is_hidden)
+            SELECT 'plan-' || n, '', NULL, %(first_owner)s + n %% %(owners)s, (n %% 1000) / 10.0,
+                   %(now)s::timestamptz - n * interval '1 minute', %(now)s::timestamptz - n * interval '1 minute',
+                   %(lessons_per_course)s, 0, 0, FALSE
+            FROM generate_series(1, %(courses)s) AS n
+            """,
+            """
+            INSERT INTO lms_lesson (title, description, preview, video_link, category_id, owner_id, price,
+                                    created_at, updated_at)
+            SELECT 'plan-' || c.id || '-' || n, NULL, '', NULL, c.id, c.owner_id, 500,
+                   c.created_at, c.updated_at
+            FROM lms_course AS c CROSS JOIN generate_series(1, %(lessons_per_course)s) AS n
+            """,
+            """
+            INSERT INTO lms_coursesubscription (user_id, course_id, created_at)
+            SELECT %(first_owner)s + n %% %(owners)s, %(first_course)s + n / %(owners)s, %(now)s::timestamptz
+            FROM generate_series(0, %(subscriptions)s - 1) AS n
+            """,
+            """
+            INSERT INTO users_payment (user_id, payment_amount, paid_course_id, paid_lesson_id, payment_method,
+                                       created_at)
+            SELECT %(first_owner)s + n %% %(owners)s, 1000, %(first_course)s + n %% %(courses)s, NULL, 'STRIPE',
+                   %(now)s::timestamptz - n * interval '1 minute'
+            FROM generate_series(1, %(payments)s) AS n
+            """,
+        ],
+        "sqlite": [
+            """
+            INSERT INTO lms_course (title, preview, description, owner_id, price, created_at, updated_at,
+                                    lessons_count, subscribers_count, purchases_count, is_hidden)
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %(courses)s)
+            SELECT 'plan-' || n, '', NULL, %(first_owner)s + n %% %(owners)s, (n %% 1000) / 10.0,
+                   strftime('%%Y-%%m-%%d %%H:%%M:%%f', %(now)s, '-' || n || ' minutes'),
+                   strftime('%%Y-%%m-%%d %%H:%%M:%%f', %(now)s, '-' || n || ' minutes'),
+                   %(lessons_per_course)s, 0, 0, FALSE
+            FROM seq
+            """,
+            """
+            INSERT INTO lms_lesson (title, description, preview, video_link, category_id, owner_id, price,
+                                    created_at, updated_at)
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %(lessons_per_course)s)
+            SELECT 'plan-' || c.id || '-' || n, NULL, '', NULL, c.id, c.owner_id, 500, c.created_at, c.updated_at
+            FROM lms_course AS c CROSS JOIN seq
+            """,
+            """
+            INSERT INTO lms_coursesubscription (user_id, course_id, created_at)
+            WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < %(subscriptions)s - 1)
+            SELECT %(first_owner)s + n %% %(owners)s, %(first_course)s + n / %(owners)s, %(now)s
+            FROM seq
+            """,
+            """
+            INSERT INTO users_payment (user_id, payment_amount, paid_course_id, paid_lesson_id, payment_method,
+                                       created_at)
+            WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %(payments)s)
+            SELECT %(first_owner)s + n %% %(owners)s, 1000, %(first_course)s + n %% %(courses)s, NULL, 'STRIPE',
+                   strftime('%%Y-%%m-%%d %%H:%%M:%%f', %(now)s, '-' || n || ' minutes')
+            FROM seq
+            """,
+        ],
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        """Заполняет курсы, уроки, подписки и платежи запросами INSERT ... SELECT и обновляет статистику"""
+        owners = CustomUser.objects.bulk_create(
+            CustomUser(email=f"owner{i}@test.com", username=f"owner{i}") for i in range(cls.owners)
+        )
+        cls.user = owners[0]
+        cls.moderator = owners[1]
+        cls.moderator.groups.add(Group.objects.create(name="moderators"))
+        params = {
+            "first_owner": cls.user.id,
+            "owners": cls.owners,
+            "now": timezone.now().isoformat(),
+            "courses": cls.courses,
+            "lessons_per_course": cls.lessons_per_course,
+            "subscriptions": cls.subscriptions,
+            "payments": cls.payments,
+            "first_course": 0,
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(cls.fill_sql[connection.vendor][0], params)
+            params["first_course"] = Course.objects.order_by("id").values_list("id", flat=True).first()
+            for sql in cls.fill_sql[connection.vendor][1:]:
+                cursor.execute(sql, params)
+            cursor.execute("ANALYZE")
+        cls.course = Course.objects.get(id=params["first_course"])
+        cls.table_rows = {
+            model._meta.db_table: model.objects.count() for model in (Course, Lesson, CourseSubscription, Payment)
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    def get_scanned_tables(self, sql):
+        """
+        Возвращает таблицы, которые план запроса читает без ограничения: последовательным сканированием
+        или полным проходом по индексу. В PostgreSQL запрос выполняется (EXPLAIN ANALYZE), и учитываются узлы,
+        прочитавшие больше max_scan_rows строк. SQLite числа строк не сообщает, поэтому проход по индексу
+        (SCAN ... USING INDEX) считается ограниченным, только если запрос заканчивается LIMIT
+        """
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")
+                nodes = [cursor.fetchone()[0][0]["Plan"]]
+                scanned = []
+                while nodes:
+                    node = nodes.pop()
+                    read = (
+                        node.get("Actual Rows", 0)
+                        + node.get("Rows Removed by Filter", 0)
+                        + node.get("Rows Removed by Index Recheck", 0)
+                    ) * node.get("Actual Loops", 1)
+                    if "Relation Name" in node and read > self.max_scan_rows:
+                        scanned.append(node["Relation Name"])
+                    nodes.extend(node.get("Plans", []))
+                return scanned
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            details = [row[-1] for row in cursor.fetchall()]
+        # в плане SQLite таблицы подзапросов указаны псевдонимами (U0, user_subscription)
+        aliases = {alias: table for table, alias in re.findall(r'(?:FROM|JOIN) "(\w+)" (\w+)', sql)}
+        limited = re.search(r"LIMIT \d+( OFFSET \d+)?$", sql) is not None
+        scanned = [
+            detail.split()[1]
+            for detail in details
+            if detail.startswith("SCAN ") and (" USING " not in detail or not limited)
+        ]
+        return [aliases.get(name, name) for name in scanned]
+
+    def assert_no_seq_scans(self, user, url, params=None):
+        """
+        Выполняет запрос к эндпоинту и проверяет планы всех его SELECT-запросов.
+        COUNT(*) постраничной пагинации не проверяется: он по определению читает все подходящие строки
+        """
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        selects = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT") and not query["sql"].startswith("SELECT COUNT(*)")
+        ]
+        self.assertTrue(selects)
+        for sql in selects:
+            large = [
+                table for table in self.get_scanned_tables(sql) if self.table_rows.get(table, 0) > self.max_scan_rows
+            ]
+            self.assertFalse(large, f"Чтение всей таблицы {large}:\n{sql}")
+
+    def test_course_list(self):
+        """Проверяет список курсов с постраничной и курсорной пагинацией"""
+        url = reverse("lms:courses-list")
+        for params in ({}, {"pagination": "cursor"}, {"ordering": "-created_at"}, {"expand": "lessons"}):
+            with self.subTest(params=params):
+                self.assert_no_seq_scans(self.user, url, params)
+
+    def test_lesson_list(self):
+        """Проверяет список уроков"""
+        url = reverse("lms:lesson_list")
+        for params in ({}, {"pagination": "cursor"}, {"ordering": "category"}):
+            with self.subTest(params=params):
+                self.assert_no_seq_scans(self.user, url, params)
+
+    def test_course_lessons(self):
+        """Проверяет уроки курса (запрашивает владелец курса)"""
+        url = reverse("lms:courses-lessons", args=[self.course.id])
+        for params in ({}, {"ordering": "-updated_at"}):
+            with self.subTest(params=params):
+                self.assert_no_seq_scans(self.course.owner, url, params)
+
+    def test_payment_list(self):
+        """Проверяет платежи пользователя и все платежи для модератора"""
+        url = reverse("users:payment_list")
+        for user in (self.user, self.moderator):
+            for params in ({}, {"pagination": "cursor"}):
+                with self.subTest(user=user.username, params=params):
+                    self.assert_no_seq_scans(user, url, params)
+
+    def test_catalog_sync(self):
+        """Проверяет первую страницу синхронизации каталога"""
+        self.assert_no_seq_scans(self.user, reverse("lms:sync"))
+
+
+@skipUnless(
+    os.getenv("PLAN_TESTS_COURSES") and connection.vendor == "postgresql",
+    "Проверка на больших таблицах включается переменной окружения PLAN_TESTS_COURSES и требует PostgreSQL",
+)
+class TestListQueryPlansLarge(TestListQueryPlans):
+    """
+    Проверяет планы запросов списков в PostgreSQL на PLAN_TESTS_COURSES курсах
+    и впятеро большем числе подписок и платежей
+    """
+
+    courses = int(os.getenv("PLAN_TESTS_COURSES", 0))
+    subscriptions = courses * 5
+    payments = courses * 5
+    max_scan_rows = 1000
+
+
+class TestCourseQueryCount(TestBaseLMSViewSet):
+    """Тестирует, что число запросов к БД при чтении курсов не зависит от их количества"""
+
+    def create_courses(self, amount):
+        """Создает курсы с уроками и подписками текущего пользователя"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.all().delete()
+            for i in range(amount):
+                course = Course.objects.create(title=f"Course {i}", owner=self.user)
+                Lesson.objects.create(title=f"Lesson {i}-1", category=course, owner=self.user)
+                Lesson.objects.create(title=f"Lesson {i}-2", category=course, owner=self.user)
+                if i % 2:
+                    CourseSubscription.objects.create(user=self.user, course=course)
+
+    def test_list_courses_query_count(self):
+        """Проверяет, что список курсов загружается фиксированным числом запросов"""
+        url = reverse("lms:courses-list")
+        for amount in (1, 10, 100):
+            with self.subTest(amount=amount):
+                self.create_courses(amount)
+                with self.assertNumQueries(3):
+                    response = self.client_user.get(url, {"page_size": 10, "expand": "lessons"})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.data["count"], amount)
+                first = response.data["results"][0]
+                self.assertEqual(first["lessons_amount"], 2)
+                self.assertFalse(first["is_subscribed"])
+
+    def test_retrieve_course_query_count(self):
+        """Проверяет, что курс загружается фиксированным числом запросов"""
+        for amount in (1, 10, 100):
+            with self.subTest(amount=amount):
+                self.create_courses(amount)
+                course = Course.objects.get(title="Course 1" if amount > 1 else "Course 0")
+                url = reverse("lms:courses-detail", args=[course.id])
+                with self.assertNumQueries(3):
+                    response = self.client_user.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.data["lessons_amount"], 2)
+                self.assertEqual(response.data["is_subscribed"], amount > 1)
+
+
+class TestCourseCounters(TestBaseLMSViewSet):
+    """Тестирует денормализованные счетчики уроков, подписчиков и покупок курса"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.course = Course.objects.create(title="Test Course", owner=self.user)
+        self.other = Course.objects.create(title="Other Course", owner=self.user)
+
+    def assertCounters(self, course, lessons, subscribers, purchases):
+        """Проверяет значения счетчиков курса в базе"""
+        course.refresh_from_db()
+        self.assertEqual(
+            (course.lessons_count, course.subscribers_count, course.purchases_count), (lessons, subscribers, purchases)
+        )
+
+    def test_lesson_counter(self):
+        """Проверяет счетчик уроков при создании, переносе и удалении урока"""
+        lesson = Lesson.objects.create(title="Lesson", category=self.course, owner=self.user)
+        self.assertCounters(self.course, 1, 0, 0)
+
+        lesson.category = self.other
+        lesson.save()
+        self.assertCounters(self.course, 0, 0, 0)
+        self.assertCounters(self.other, 1, 0, 0)
+
+        lesson.delete()
+        self.assertCounters(self.other, 0, 0, 0)
+
+    def test_subscription_and_payment_counters(self):
+        """Проверяет счетчики подписчиков и покупок"""
+        url = reverse("lms:subscription")
+        self.client_user.post(url, {"course_id": self.course.id})
+        self.client_stranger.post(url, {"course_id": self.course.id})
+        payment = Payment.objects.create(user=self.user, paid_course=self.course, payment_amount=1000)
+        self.assertCounters(self.course, 0, 2, 1)
+
+        self.client_user.post(url, {"course_id": self.course.id})
+        payment.delete()
+        self.assertCounters(self.course, 0, 1, 0)
+
+    def test_course_payload_without_joins(self):
+        """Проверяет, что список курсов отдает счетчики без JOIN с уроками, подписками и платежами"""
+        Lesson.objects.create(title="Lesson", category=self.course, owner=self.user)
+        CourseSubscription.objects.create(user=self.stranger, course=self.course)
+        Payment.objects.create(user=self.stranger, paid_course=self.course, payment_amount=1000)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_user.get(reverse("lms:courses-list"))
+        course = next(item for item in response.data["results"] if item["id"] == self.course.id)
+        self.assertEqual(
+            (course["lessons_amount"], course["subscribers_amount"], course["purchases_amount"]), (1, 1, 1)
+        )
+        select = [query["sql"] for query in queries.captured_queries if '"lms_course"."title"' in query["sql"]][-1]
+        self.assertNotIn("JOIN", select)
+
+    def test_course_save_keeps_counters(self):
+        """Проверяет, что сохранение загруженного ранее курса не затирает счетчики"""
+        Lesson.objects.create(title="Lesson", category=self.course, owner=self.user)
+        self.course.title = "Renamed"
+        self.course.save()
+        self.assertCounters(self.course, 1, 0, 0)
+
+        response = self.client_user.patch(reverse("lms:courses-detail", args=[self.course.id]), {"title": "Patched"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertCounters(self.course, 1, 0, 0)
+
+    def test_recompute_repairs_drift(self):
+        """Проверяет, что пересчет исправляет разошедшиеся счетчики"""
+        Lesson.objects.create(title="Lesson", category=self.course, owner=self.user)
+        Course.objects.filter(pk=self.course.pk).update(lessons_count=10, subscribers_count=5)
+
+        self.assertEqual(recompute_course_counters(), 1)
+        self.assertCounters(self.course, 1, 0, 0)
+        self.assertEqual(recompute_course_counters(), 0)
+
+    def test_drifted_counters_do_not_go_negative(self):
+        """Проверяет, что удаление при разошедшемся нулевом счетчике не нарушает CHECK и не опускает его ниже нуля"""
+        lesson = Lesson.objects.create(title="Lesson", category=self.course, owner=self.user)
+        CourseSubscription.objects.create(user=self.stranger, course=self.course)
+        payment = Payment.objects.create(user=self.stranger, paid_course=self.course, payment_amount=1000)
+        Course.objects.filter(pk=self.course.pk).update(lessons_count=0, subscribers_count=0, purchases_count=0)
+
+        lesson.delete()
+        payment.delete()
+        self.client_stranger.post(reverse("lms:subscription"), {"course_id": self.course.id})
+        self.assertCounters(self.course, 0, 0, 0)
+
+
+class TestCourseSparseFields(TestBaseLMSViewSet):
+    """Тестирует выбор полей (?fields=) и раскрытие уроков (?expand=) в представлении курсов"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.course = Course.objects.create(title="Test Course", description="Long text", owner=self.user)
+        Lesson.objects.create(title="Test Lesson", category=self.course, owner=self.user)
+
+    def test_list_without_lessons_by_default(self):
+        """Проверяет, что список курсов не содержит уроков без ?expand=lessons"""
+        response = self.client_user.get(reverse("lms:courses-list"))
+        course = response.data["results"][0]
+        self.assertNotIn("lessons", course)
+        self.assertEqual(course["lessons_amount"], 1)
+
+    def test_list_expand_lessons(self):
+        """Проверяет, что ?expand=lessons добавляет уроки в список курсов"""
+        response = self.client_user.get(reverse("lms:courses-list"), {"expand": "lessons"})
+        self.assertEqual(response.data["results"][0]["lessons"][0]["title"], "Test Lesson")
+
+    def test_retrieve_with_lessons_by_default(self):
+        """Проверяет, что детальное представление курса по умолчанию содержит уроки"""
+        response = self.client_user.get(reverse("lms:courses-detail", args=[self.course.id]))
+        self.assertEqual(len(response.data["lessons"]), 1)
+
+    def test_sparse_fields(self):
+        """Проверяет, что ?fields= оставляет только запрошенные поля и не загружает лишние столбцы"""
+        url = reverse("lms:courses-list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_user.get(url, {"fields": "id,title"})
+        self.assertEqual(set(response.data["results"][0]), {"id", "title"})
+        select = [query["sql"] for query in queries.captured_queries if '"lms_course"."title"' in query["sql"]][-1]
+        self.assertNotIn("description", select)
+        self.assertNotIn("lms_lesson", select)
+        self.assertNotIn("lms_coursesubscription", select)
+
+    def test_fields_with_lessons(self):
+        """Проверяет, что поле lessons в ?fields= раскрывает уроки"""
+        url = reverse("lms:courses-list")
+        response = self.client_user.get(url, {"fields": "id,lessons"})
+        self.assertEqual(set(response.data["results"][0]), {"id", "lessons"})
+        self.assertEqual(len(response.data["results"][0]["lessons"]), 1)
+
+
+class TestCourseLessons(TestBaseLMSViewSet):
+    """Тестирует подресурс уроков курса и ограниченное превью уроков в курсе"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.course = Course.objects.create(title="Test Course", owner=self.user)
+        for i in range(12):
+            Lesson.objects.create(title=f"Lesson {i:02}", category=self.course, owner=self.user)
+        Lesson.objects.create(title="Foreign Lesson", category=Course.objects.create(title="Other"))
+        self.url = reverse("lms:courses-lessons", args=[self.course.id])
+
+    def test_lessons_pagination_and_ordering(self):
+        """Проверяет постраничную выдачу уроков курса и сортировку"""
+        response = self.client_user.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(
+            [lesson["title"] for lesson in response.data["results"]], [f"Lesson {i:02}" for i in range(5)]
+        )
+
+        response = self.client_user.get(self.url, {"ordering": "-title", "pagination": "cursor"})
+        self.assertEqual(response.data["results"][0]["title"], "Lesson 11")
+        self.assertIsNotNone(response.data["next"])
+
+    def test_lessons_permissions(self):
+        """Проверяет, что уроки курса доступны владельцу и модератору"""
+        self.assertEqual(self.client_mod.get(self.url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client_stranger.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_lessons_not_modified_until_change(self):
+        """Проверяет ETag подресурса уроков"""
+        etag = self.client_user.get(self.url)["ETag"]
+        self.assertEqual(self.client_user.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.filter(title="Lesson 03").first().delete()
+        response = self.client_user.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 11)
+
+    def test_course_detail_lessons_preview(self):
+        """Проверяет, что курс отдает превью уроков и их общее количество"""
+        response = self.client_user.get(reverse("lms:courses-detail", args=[self.course.id]))
+        self.assertEqual(response.data["lessons_amount"], 12)
+        self.assertEqual(len(response.data["lessons"]), settings.LESSONS_PREVIEW_SIZE)
+
+    def test_course_list_lessons_preview(self):
+        """Проверяет, что список курсов раскрывает только превью уроков"""
+        response = self.client_user.get(reverse("lms:courses-list"), {"expand": "lessons"})
+        course = next(item for item in response.data["results"] if item["id"] == self.course.id)
+        self.assertEqual([lesson["title"] for lesson in course["lessons"]], [f"Lesson {i:02}" for i in range(5)])
+
+
+class TestBatchRetrieve(TestBaseLMSViewSet):
+    """Тестирует пакетное получение курсов и уроков по ?ids="""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.own = [Course.objects.create(title=f"Own {i}", owner=self.user) for i in range(3)]
+        self.foreign = Course.objects.create(title="Foreign", owner=self.stranger)
+        self.lessons = [
+            Lesson.objects.create(title=f"Lesson {i}", category=self.own[0], owner=self.user) for i in range(3)
+        ]
+        self.foreign_lesson = Lesson.objects.create(title="Foreign Lesson", category=self.foreign, owner=self.stranger)
+
+    def test_courses_in_request_order_with_errors(self):
+        """Проверяет порядок результатов и ошибки для чужого и несуществующего курса"""
+        ids = [self.own[2].id, self.foreign.id, 999999, self.own[0].id]
+        response = self.client_user.get(reverse("lms:courses-batch"), {"ids": ",".join(map(str, ids))})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual([item["id"] for item in results], ids)
+        self.assertEqual([item["status"] for item in results], [200, 403, 404, 200])
+        self.assertEqual(results[0]["data"]["title"], "Own 2")
+        self.assertEqual(len(results[3]["data"]["lessons"]), 3)
+
+    def test_courses_query_count(self):
+        """Проверяет, что число запросов не зависит от количества id"""
+        ids = ",".join(str(course.id) for course in self.own)
+        with self.assertNumQueries(3):
+            response = self.client_mod.get(reverse("lms:courses-batch"), {"ids": ids})
+        self.assertEqual([item["status"] for item in response.data["results"]], [200, 200, 200])
+
+    def test_lessons_batch(self):
+        """Проверяет пакетное получение уроков одним запросом"""
+        ids = [self.lessons[1].id, self.foreign_lesson.id, self.lessons[0].id]
+        with self.assertNumQueries(2):
+            response = self.client_user.get(reverse("lms:lesson_batch"), {"ids": ",".join(map(str, ids))})
+        self.assertEqual([item["status"] for item in response.data["results"]], [200, 403, 200])
+        self.assertEqual(response.data["results"][0]["data"]["title"], "Lesson 1")
+
+    def test_invalid_ids(self):
+        """Проверяет ошибки параметра ids"""
+        url = reverse("lms:lesson_batch")
+        for ids in ("", "1,a", ",".join(str(i) for i in range(1, 52))):
+            with self.subTest(ids=ids):
+                response = self.client_user.get(url, {"ids": ids})
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn("ids", response.data)
+
+
+class TestLessonBulk(TestBaseLMSViewSet):
+    """Тестирует пакетное создание и изменение уроков"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.url = reverse("lms:lesson_bulk")
+        self.course = Course.objects.create(title="Course", owner=self.user)
+        self.other = Course.objects.create(title="Other", owner=self.user)
+        self.lessons = [
+            Lesson.objects.create(title=f"Lesson {i}", category=self.course, owner=self.user) for i in range(3)
+        ]
+        self.foreign_lesson = Lesson.objects.create(title="Foreign Lesson", category=self.other, owner=self.stranger)
+
+    def test_bulk_create(self):
+        """Проверяет создание пакета уроков, владельца и счетчики курсов"""
+        data = [
+            {"title": "New 1", "category": self.course.id},
+            {"title": "New 2", "category": self.other.id, "video_link": "https://youtu.be/x"},
+            {"title": "New 3", "category": self.other.id, "owner": self.stranger.id},
+        ]
+        response = self.client_user.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item["title"] for item in response.data], ["New 1", "New 2", "New 3"])
+        self.assertTrue(all(item["id"] for item in response.data))
+        self.assertEqual(Lesson.objects.filter(title__startswith="New", owner=self.user).count(), 3)
+        self.course.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.course.lessons_count, self.other.lessons_count), (4, 3))
+
+    def test_bulk_create_item_errors(self):
+        """Проверяет, что ошибки возвращаются по элементам и пакет не сохраняется частично"""
+        data = [
+            {"title": "Valid", "category": self.course.id},
+            {"title": "Lesson 0", "category": self.course.id},
+            {"title": "Twice", "category": self.course.id},
+            {"title": "Twice", "category": self.course.id},
+            {"title": "Bad link", "category": self.course.id, "video_link": "https://example.com/video"},
+            {"title": "No course", "category": 999999},
+        ]
+        response = self.client_user.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("title", response.data[1])
+        self.assertIn("title", response.data[2])
+        self.assertIn("title", response.data[3])
+        self.assertIn("video_link", response.data[4])
+        self.assertIn("category", response.data[5])
+        self.assertFalse(Lesson.objects.filter(title="Valid").exists())
+
+    def test_bulk_create_moderator_forbidden(self):
+        """Проверяет, что модератор не создает уроки"""
+        response = self.client_mod.post(self.url, [{"title": "New", "category": self.course.id}], format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_create_limits(self):
+        """Проверяет ошибки для пустого пакета и пакета больше LESSON_BULK_MAX_SIZE"""
+        with self.settings(LESSON_BULK_MAX_SIZE=2):
+            for data in ([], [{"title": f"New {i}", "category": self.course.id} for i in range(3)]):
+                with self.subTest(size=len(data)):
+                    response = self.client_user.post(self.url, data, format="json")
+                    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_query_count(self):
+        """Проверяет, что 1000 уроков создаются без запросов на каждый урок"""
+        data = [{"title": f"Bulk {i}", "category": self.course.id} for i in range(1000)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_user.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertLess(len(queries), 30)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.lessons_count, 1003)
+
+    def test_bulk_update(self):
+        """Проверяет изменение пакета уроков, перенос счетчиков и updated_at"""
+        updated_at = self.lessons[0].updated_at
+        data = [
+            {"id": self.lessons[0].id, "title": "Renamed"},
+            {"id": self.lessons[1].id, "category": self.other.id},
+            {"id": self.lessons[2].id, "title": "Lesson 2"},
+        ]
+        response = self.client_user.patch(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[1]["category"], self.other.id)
+        self.lessons[0].refresh_from_db()
+        self.assertEqual(self.lessons[0].title, "Renamed")
+        self.assertGreater(self.lessons[0].updated_at, updated_at)
+        self.course.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.course.lessons_count, self.other.lessons_count), (2, 2))
+
+    def test_bulk_update_item_errors(self):
+        """Проверяет ошибки для чужого, несуществующего и повторяющегося урока"""
+        data = [
+            {"id": self.lessons[0].id, "title": "Renamed"},
+            {"id": self.foreign_lesson.id, "title": "Stolen"},
+            {"id": 999999, "title": "Missing"},
+            {"id": self.lessons[1].id, "title": "Lesson 2"},
+        ]
+        response = self.client_user.patch(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("id", response.data[1])
+        self.assertIn("id", response.data[2])
+        self.assertIn("title", response.data[3])
+        self.assertFalse(Lesson.objects.filter(title="Renamed").exists())
+
+    def test_bulk_update_moderator(self):
+        """Проверяет, что модератор изменяет чужие уроки"""
+        data = [{"id": self.foreign_lesson.id, "description": "Проверено"}]
+        response = self.client_mod.patch(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.foreign_lesson.refresh_from_db()
+        self.assertEqual(self.foreign_lesson.description, "Проверено")
+
+
+class TestCourseBundle(TestBaseLMSViewSet):
+    """Тестирует выгрузку и импорт пакета курса NDJSON"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.course = Course.objects.create(title="Bundle Course", owner=self.user, price=Decimal("1500.50"))
+        for i in range(7):
+            Lesson.objects.create(
+                title=f"Bundle Lesson {i}", category=self.course, owner=self.user, video_link="https://youtu.be/x"
+            )
+        self.import_url = reverse("lms:courses-import-bundle")
+
+    def export(self, client=None):
+        """Выгружает пакет курса через API"""
+        response = (client or self.client_user).get(reverse("lms:courses-bundle", args=[self.course.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return b"".join(response.streaming_content)
+
+    def import_bundle(self, body, client=None):
+        """Отправляет пакет на импорт"""
+        return (client or self.client_stranger).post(self.import_url, body, content_type="application/x-ndjson")
+
+    def test_export(self):
+        """Проверяет, что пакет начинается с курса и содержит все уроки без id и владельца"""
+        rows = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual(rows[0]["type"], "course")
+        self.assertEqual((rows[0]["title"], rows[0]["price"]), ("Bundle Course", "1500.50"))
+        self.assertEqual([row["type"] for row in rows[1:]], ["lesson"] * 7)
+        self.assertNotIn("owner", rows[1])
+        self.assertNotIn("id", rows[1])
+        self.assertNotIn("preview", rows[0])
+        self.assertNotIn("preview", rows[1])
+        self.assertEqual(self.export(self.client_mod).count(b"\n"), 8)
+
+    def test_course_hidden_while_streaming(self):
+        """Проверяет, что курс загружается до начала потока и его скрытие во время выгрузки не обрывает ответ"""
+        response = self.client_user.get(reverse("lms:courses-bundle", args=[self.course.id]))
+        Course.objects.filter(pk=self.course.id).update(is_hidden=True)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(rows[0]["title"], "Bundle Course")
+        self.assertEqual(len(rows), 8)
+
+    def test_preview_not_imported(self):
+        """Проверяет, что имя файла превью из пакета не попадает в курс и уроки"""
+        body = (
+            b'{"type": "course", "title": "Imported", "preview": "users/other.png"}\n'
+            b'{"type": "lesson", "title": "A", "preview": "../secret.png"}\n'
+        )
+        response = self.import_bundle(body)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        course = Course.objects.get(pk=response.data["id"])
+        self.assertEqual(course.preview.name, Course._meta.get_field("preview").get_default())
+        self.assertEqual(course.lessons.get().preview.name, Lesson._meta.get_field("preview").get_default())
+
+    def test_export_forbidden(self):
+        """Проверяет, что чужой пакет не выгружается"""
+        response = self.client_stranger.get(reverse("lms:courses-bundle", args=[self.course.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(BUNDLE_IMPORT_BATCH_SIZE=3)
+    def test_round_trip(self):
+        """Проверяет, что выгруженный пакет импортируется пачками с новым владельцем и счетчиком уроков"""
+        body = self.export()
+        self.course.delete()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.import_bundle(body)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["lessons_count"], 7)
+        self.assertLess(len(queries), 30)
+        course = Course.objects.get(pk=response.data["id"])
+        self.assertEqual(
+            (course.title, course.price, course.owner), ("Bundle Course", Decimal("1500.50"), self.stranger)
+        )
+        self.assertEqual(course.lessons_count, 7)
+        self.assertEqual(course.lessons.filter(owner=self.stranger, video_link="https://youtu.be/x").count(), 7)
+
+    @override_settings(BUNDLE_IMPORT_BATCH_SIZE=2)
+    def test_import_errors(self):
+        """Проверяет, что ошибка в любой строке возвращается с ее номером и ничего не сохраняется"""
+        course = b'{"type": "course", "title": "Imported"}\n'
+        lesson = b'{"type": "lesson", "title": "%s"}\n'
+        cases = [
+            (b"", 0),
+            (b'{"type": "lesson", "title": "First"}\n', 1),
+            (course + b"not json\n", 2),
+            (course + lesson % b"A" + b'{"type": "lesson", "video_link": "https://example.com/v"}\n', 3),
+            (course + lesson % b"A" + lesson % b"B" + b"\n" + lesson % b"A", 5),
+            (course + lesson % b"A" + lesson % b"Bundle Lesson 3", 3),
+            (b'{"type": "course", "title": "Bundle Course"}\n', 1),
+        ]
+        for body, line in cases:
+            with self.subTest(body=body):
+                response = self.import_bundle(body)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertEqual(response.data["line"], str(line))
+        self.assertFalse(Course.objects.filter(title="Imported").exists())
+        self.assertFalse(Lesson.objects.filter(title="A").exists())
+
+    def test_import_permissions(self):
+        """Проверяет, что модератор не импортирует курсы, а тело в другом формате не принимается"""
+        self.assertEqual(self.import_bundle(self.export(), self.client_mod).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client_user.post(self.import_url, {"title": "Course"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_commands(self):
+        """Проверяет выгрузку и импорт пакета командами"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "course.ndjson")
+            call_command("export_course_bundle", self.course.id, output=path, stdout=StringIO())
+            with self.assertRaises(CommandError):
+                call_command("import_course_bundle", path, stdout=StringIO())
+            self.course.delete()
+            out = StringIO()
+            call_command("import_course_bundle", path, owner=self.stranger.email, batch_size=4, stdout=out)
+        course = Course.objects.get(title="Bundle Course")
+        self.assertIn(str(course.id), out.getvalue())
+        self.assertEqual((course.owner, course.lessons.count(), course.lessons_count), (self.stranger, 7, 7))
+
+
+@override_settings(COURSE_DELETE_BATCH_SIZE=2)
+class TestCourseAsyncDelete(TestBaseLMSViewSet):
+    """Тестирует асинхронное удаление курса пачками"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.course = Course.objects.create(title="Big Course", owner=self.user)
+        self.lessons = [
+            Lesson.objects.create(title=f"Big Lesson {i}", category=self.course, owner=self.user) for i in range(5)
+        ]
+        for user in (self.stranger, self.moderator, self.superuser):
+            CourseSubscription.objects.create(user=user, course=self.course)
+        self.course_payment = Payment.objects.create(user=self.stranger, paid_course=self.course, payment_amount=1000)
+        self.lesson_payment = Payment.objects.create(
+            user=self.stranger, paid_lesson=self.lessons[0], payment_amount=500
+        )
+        self.url = reverse("lms:courses-detail", args=[self.course.id])
+
+    def test_async_delete(self):
+        """Проверяет ответ 202, удаление зависимых строк пачками и итоговый прогресс"""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_user.delete(f"{self.url}?async=true")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], "pending")
+        self.assertEqual((response.data["lessons_total"], response.data["subscriptions_total"]), (5, 3))
+
+        self.assertFalse(Course.objects.filter(pk=self.course.id).exists())
+        self.assertFalse(Lesson.objects.filter(title__startswith="Big Lesson").exists())
+        self.assertFalse(CourseSubscription.objects.exists())
+        self.course_payment.refresh_from_db()
+        self.lesson_payment.refresh_from_db()
+        self.assertIsNone(self.course_payment.paid_course)
+        self.assertIsNone(self.lesson_payment.paid_lesson)
+        self.assertEqual(Tombstone.objects.filter(kind="lesson").count(), 5)
+        self.assertTrue(Tombstone.objects.filter(kind="course", object_id=self.course.id).exists())
+
+        progress = self.client_user.get(response["Location"])
+        self.assertEqual(progress.status_code, status.HTTP_200_OK)
+        self.assertEqual(progress.data["status"], "done")
+        self.assertIsNone(progress.data["course"])
+        self.assertEqual(
+            (
+                progress.data["lessons_deleted"],
+                progress.data["subscriptions_deleted"],
+                progress.data["payments_detached"],
+            ),
+            (5, 3, 1),
+        )
+
+    def test_hidden_immediately(self):
+        """Проверяет, что курс скрывается до выполнения задачи, а его название остается занятым"""
+        response = self.client_user.delete(f"{self.url}?async=true")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(Course.objects.filter(pk=self.course.id, is_hidden=True).exists())
+        self.assertEqual(self.client_user.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client_user.get(reverse("lms:courses-list")).data["count"], 0)
+        self.assertEqual(self.client_user.delete(f"{self.url}?async=true").status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(subscribe_user(self.user.id, [self.course.id]), [])
+
+        response = self.client_user.post(reverse("lms:courses-list"), {"title": "Big Course"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("title", response.data)
+
+        progress_url = reverse("lms:course_deletion", args=[CourseDeletion.objects.get().id])
+        self.assertEqual(self.client_stranger.get(progress_url).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client_mod.get(progress_url).data["status"], "pending")
+
+    def test_hidden_course_lessons_not_listed(self):
+        """Проверяет, что уроки скрытого курса сразу пропадают из списка уроков, поиска и синхронизации"""
+        lessons_url = reverse("lms:lesson_list")
+        self.assertEqual(self.client_user.get(lessons_url).data["count"], 5)
+        with patch("lms.signals.delete_course"), self.captureOnCommitCallbacks(execute=True):
+            self.client_user.delete(f"{self.url}?async=true")
+        self.assertTrue(Lesson.objects.filter(category=self.course).exists())
+
+        self.assertEqual(self.client_user.get(lessons_url).data["count"], 0)
+        self.assertEqual(self.client_user.get(reverse("lms:search"), {"q": "Big Lesson"}).data["count"], 0)
+        self.assertEqual(self.client_user.get(reverse("lms:sync")).data["lessons"], [])
+
+    def test_default_manager_keeps_hidden(self):
+        """Проверяет, что менеджер по умолчанию видит скрытые курсы, а скрытый курс «Вне курса» не создается заново"""
+        self.client_user.delete(f"{self.url}?async=true")
+        self.assertIs(Course._default_manager, Course.objects)
+        self.assertTrue(Course.objects.filter(pk=self.course.id).exists())
+        self.assertFalse(Course.visible.filter(pk=self.course.id).exists())
+
+        default_id = get_default_course()
+        Course.objects.filter(pk=default_id).update(is_hidden=True)
+        reference_cache.invalidate("default-course")
+        self.assertEqual(get_default_course(), default_id)
+
+    def test_threshold(self):
+        """Проверяет, что большой курс удаляется асинхронно без параметра, а небольшой - сразу"""
+        with self.settings(COURSE_ASYNC_DELETE_THRESHOLD=0):
+            small = Course.objects.create(title="Small", owner=self.user)
+            response = self.client_user.delete(reverse("lms:courses-detail", args=[small.id]))
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        with self.settings(COURSE_ASYNC_DELETE_THRESHOLD=9):
+            self.assertEqual(self.client_user.delete(self.url).status_code, status.HTTP_202_ACCEPTED)
+
+    def test_resume_in_bounded_runs(self):
+        """Проверяет, что прерванное по времени удаление продолжается с того же места"""
+        self.client_user.delete(f"{self.url}?async=true")
+        deletion = CourseDeletion.objects.get()
+        self.assertFalse(run_course_deletion(deletion.id, 0))
+        deletion.refresh_from_db()
+        self.assertEqual((deletion.status, deletion.lessons_deleted), ("running", 2))
+        self.assertEqual(self.course.lessons.count(), 3)
+
+        with self.settings(COURSE_DELETE_STALLED_AFTER=timedelta(0)):
+            self.assertEqual(resume_course_deletions.delay().get(), 1)
+        deletion.refresh_from_db()
+        self.assertEqual(deletion.status, "done")
+        self.assertFalse(Course.objects.filter(pk=self.course.id).exists())
+
+
+class TestAdminBulkActions(TestBaseLMSViewSet):
+    """Тестирует списки админ-панели и массовые действия одним UPDATE"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.client.force_login(self.superuser)
+        self.course = Course.objects.create(title="Admin Course", owner=self.user)
+        self.other_course = Course.objects.create(title="Other Admin Course", owner=self.user)
+        self.lessons = [
+            Lesson.objects.create(title=f"Admin Lesson {i}", category=self.course, owner=self.user) for i in range(3)
+        ]
+        self.lessons_url = reverse("admin:lms_lesson_changelist")
+        self.courses_url = reverse("admin:lms_course_changelist")
+
+    def run_action(self, url, action, objects, **values):
+        data = {"action": action, "_selected_action": [obj.pk for obj in objects], "index": 0}
+        return self.client.post(url, {**data, **values}, follow=True)
+
+    def test_changelists(self):
+        """Проверяет списки без точного подсчета, фильтр по id курса и форму действий"""
+        for url in (self.lessons_url, self.courses_url, reverse("admin:users_customuser_changelist")):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIsInstance(response.context["cl"].paginator, EstimatedCountPaginator)
+
+        response = self.client.get(self.lessons_url, {"category_id": self.other_course.id, "q": "Admin"})
+        self.assertEqual(response.context["cl"].result_count, 0)
+        self.assertContains(response, 'name="q" value="Admin"')
+        response = self.client.get(self.lessons_url, {"category_id": self.course.id})
+        self.assertEqual(response.context["cl"].result_count, 3)
+        self.assertContains(response, 'name="category"')
+
+    def test_estimated_count_fallback(self):
+        """Проверяет точный подсчет, когда оценка планировщика недоступна (не PostgreSQL)"""
+        paginator = EstimatedCountPaginator(Lesson.objects.order_by("pk"), 2)
+        self.assertEqual(paginator.count, 3)
+        with patch("lms.paginators.estimate_count", return_value=50_000):
+            self.assertEqual(EstimatedCountPaginator(Lesson.objects.order_by("pk"), 2).count, 50_000)
+        with patch("lms.paginators.estimate_count", return_value=10):
+            self.assertEqual(EstimatedCountPaginator(Lesson.objects.order_by("pk"), 2).count, 3)
+
+    def test_estimated_count_overshoot(self):
+        """Проверяет, что завышенная оценка уточняется и несуществующие страницы не выводятся"""
+        with patch("lms.paginators.estimate_count", return_value=50_000):
+            paginator = EstimatedCountPaginator(Lesson.objects.order_by("pk"), 2)
+            self.assertEqual(len(paginator.page(1)), 2)
+            self.assertEqual(paginator.num_pages, 25_000)
+            self.assertEqual(len(paginator.page(2)), 1)
+            self.assertEqual((paginator.count, paginator.num_pages), (3, 2))
+
+            paginator = EstimatedCountPaginator(Lesson.objects.order_by("pk"), 2)
+            with self.assertRaises(EmptyPage):
+                paginator.page(100)
+            self.assertEqual((paginator.count, paginator.num_pages), (3, 2))
+            response = self.client.get(self.lessons_url, {"p": 100})
+            self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+    def test_lesson_actions(self):
+        """Проверяет изменение цены, владельца и перенос уроков в другой курс со счетчиками"""
+        with CaptureQueriesContext(connection) as queries:
+            self.run_action(self.lessons_url, "reprice", self.lessons[:2], price="99.50")
+        self.assertEqual(len([q for q in queries if q["sql"].startswith('UPDATE "lms_lesson"')]), 1)
+        self.assertEqual(Lesson.objects.filter(price=Decimal("99.50")).count(), 2)
+
+        self.run_action(self.lessons_url, "reassign_owner", self.lessons, owner=self.stranger.id)
+        self.assertEqual(Lesson.objects.filter(owner=self.stranger).count(), 3)
+
+        self.run_action(self.lessons_url, "move_category", self.lessons[:2], category=self.other_course.id)
+        self.assertEqual(self.other_course.lessons.count(), 2)
+        self.course.refresh_from_db()
+        self.other_course.refresh_from_db()
+        self.assertEqual((self.course.lessons_count, self.other_course.lessons_count), (1, 2))
+
+    def test_action_requires_value(self):
+        """Проверяет, что действие без значения ничего не меняет и сообщает об ошибке"""
+        response = self.run_action(self.lessons_url, "move_category", self.lessons)
+        self.assertContains(response, "Укажите поле")
+        self.assertEqual(self.course.lessons.count(), 3)
+
+    def test_course_actions(self):
+        """Проверяет массовые изменения курсов и инвалидацию кэша их ответов"""
+        url = reverse("lms:courses-detail", args=[self.course.id])
+        self.assertEqual(self.client_user.get(url).data["price"], "1000.00")
+        self.run_action(self.courses_url, "reprice", [self.course, self.other_course], price="10")
+        self.run_action(self.courses_url, "reassign_owner", [self.course], owner=self.stranger.id)
+        self.assertEqual(Course.objects.filter(price=10).count(), 2)
+        self.assertEqual(self.client_stranger.get(url).data["price"], "10.00")
+
+
+@override_settings(COURSE_DOCUMENTS=True)
+class TestCourseDocuments(TestBaseLMSViewSet):
+    """Тестирует чтение курса из готового представления CourseDocument"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.course = Course.objects.create(title="Test Course", description="Text", owner=self.user)
+        for i in range(3):
+            Lesson.objects.create(title=f"Lesson {i}", category=self.course, owner=self.user)
+        CourseSubscription.objects.create(user=self.user, course=self.course)
+        self.url = reverse("lms:courses-detail", args=[self.course.id])
+
+    def test_same_content_as_serializer(self):
+        """Проверяет, что ответ из представления совпадает с ответом CourseSerializer"""
+        for client in (self.client_user, self.client_mod):
+            with self.subTest(client=client):
+                from_document = client.get(self.url)
+                with override_settings(COURSE_DOCUMENTS=False):
+                    cache.clear()
+                    serialized = client.get(self.url)
+                cache.clear()
+                self.assertEqual(from_document.content, serialized.content)
+
+    def test_built_on_first_read_and_query_count(self):
+        """Проверяет построение представления при первом чтении и число запросов при последующих"""
+        self.assertFalse(CourseDocument.objects.exists())
+        self.client_user.get(self.url)
+        self.assertTrue(CourseDocument.objects.filter(course=self.course).exists())
+
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client_user.get(self.url)
+        self.assertTrue(response.data["is_subscribed"])
+        self.assertEqual(response.data["lessons_amount"], 3)
+
+    def test_rebuilt_after_lesson_change(self):
+        """Проверяет асинхронное перестроение представления после изменения урока"""
+        build_course_documents()
+        lesson = Lesson.objects.get(title="Lesson 0")
+        with self.captureOnCommitCallbacks(execute=True):
+            lesson.title = "Renamed Lesson"
+            lesson.save()
+        response = self.client_user.get(self.url)
+        self.assertIn("Renamed Lesson", [item["title"] for item in response.data["lessons"]])
+
+    def test_rebuild_command(self):
+        """Проверяет команду перестроения всех представлений"""
+        Course.objects.create(title="Other Course", owner=self.user)
+        call_command("rebuild_course_documents", stdout=StringIO())
+        self.assertEqual(CourseDocument.objects.count(), Course.objects.count())
+
+    @override_settings(COURSE_DOCUMENTS=False)
+    def test_not_scheduled_when_disabled(self):
+        """Проверяет, что при выключенных представлениях изменения не ставят перестроение в очередь"""
+        cache.clear()
+        with patch("lms.signals.rebuild_course_document.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                Lesson.objects.create(title="Lesson 3", category=self.course, owner=self.user)
+                self.course.save()
+        delay.assert_not_called()
+
+    def test_pending_mark_set_after_commit(self):
+        """Проверяет, что откат транзакции и ошибка постановки задачи не откладывают следующие перестроения"""
+        with patch("lms.signals.rebuild_course_document.delay") as delay:
+            with self.captureOnCommitCallbacks():
+                # транзакция откатилась: обработчики on_commit не выполнены
+                self.course.save()
+            self.assertIsNone(cache.get(document_pending_key(self.course.id)))
+
+            delay.side_effect = ConnectionError
+            with self.assertLogs("django.test", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+                self.course.save()
+            self.assertIsNone(cache.get(document_pending_key(self.course.id)))
+
+            delay.side_effect = None
+            with self.captureOnCommitCallbacks(execute=True):
+                self.course.save()
+                self.course.save()
+        self.assertEqual(delay.call_count, 2)
+        delay.assert_called_with(self.course.id)
+
+
+class TestValuesSerializers(TestBaseLMSViewSet):
+    """Тестирует, что быстрые сериализаторы списков выдают тот же JSON, что и ModelSerializer"""
+
+    def setUp(self):
+        """Формирует тестовые данные с пустыми и заполненными необязательными полями"""
+        super().setUp()
+        for i in range(4):
+            course = Course.objects.create(
+                title=f"Course {i}", description=None if i % 2 else "Описание", price="1234.50", owner=self.user
+            )
+            for j in range(3):
+                Lesson.objects.create(
+                    title=f"Lesson {i}-{j}",
+                    category=course,
+                    owner=None if j == 2 else self.user,
+                    preview=None if j == 1 else "lms/lessons/previews/урок.png",
+                    video_link="https://www.youtube.com/watch?v=1" if j == 0 else None,
+                    price="99.90",
+                )
+        CourseSubscription.objects.create(user=self.user, course=course)
+
+    def assert_same_content(self, url, params):
+        """Сравнивает ответы быстрого и обычного сериализатора байт в байт"""
+        fast = self.client_user.get(url, params)
+        cache.clear()
+        with self.settings(FAST_LIST_SERIALIZERS=False):
+            slow = self.client_user.get(url, params)
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_lesson_list_identical(self):
+        """Проверяет совпадение JSON списка уроков"""
+        self.assert_same_content(reverse("lms:lesson_list"), {"page_size": 10, "ordering": "-category"})
+
+    def test_course_list_identical(self):
+        """Проверяет совпадение JSON списка курсов с уроками"""
+        self.assert_same_content(reverse("lms:courses-list"), {"page_size": 10, "expand": "lessons"})
+
+    def test_course_list_fields_identical(self):
+        """Проверяет совпадение JSON списка курсов с выбором полей и курсорной пагинацией"""
+        self.assert_same_content(
+            reverse("lms:courses-list"), {"fields": "id,is_subscribed,price", "pagination": "cursor"}
+        )
+
+
+class TestFragmentCache(TestBaseLMSViewSet):
+    """Тестирует кэш сериализованных представлений отдельных курсов и уроков"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.course = Course.objects.create(title="Course", owner=self.user)
+        self.lesson = Lesson.objects.create(title="Lesson", category=self.course, owner=self.stranger)
+
+    def serialize(self, serializer, queryset):
+        """Сериализует queryset быстрым сериализатором"""
+        return serializer.to_representation_many(serializer.get_values_queryset(queryset))
+
+    def test_lesson_fragment_keyed_by_updated_at(self):
+        """Проверяет, что фрагмент урока берется из кэша, пока не изменится updated_at"""
+        lessons = Lesson.objects.filter(pk=self.lesson.pk)
+        self.assertEqual(self.serialize(LessonValuesSerializer(), lessons)[0]["title"], "Lesson")
+
+        lessons.update(title="Stale")
+        self.assertEqual(self.serialize(LessonValuesSerializer(), lessons)[0]["title"], "Lesson")
+
+        self.lesson.title = "Renamed"
+        self.lesson.save()
+        self.assertEqual(self.serialize(LessonValuesSerializer(), lessons)[0]["title"], "Renamed")
+
+    def test_course_counters_not_cached(self):
+        """Проверяет, что счетчики курса не берутся из закэшированного фрагмента"""
+        serializer = CourseValuesSerializer(context={"fields": {"id", "title", "subscribers_amount"}})
+        courses = Course.objects.filter(pk=self.course.pk)
+        self.serialize(serializer, courses)
+        courses.update(subscribers_count=5)
+        self.assertEqual(
+            self.serialize(serializer, courses), [{"id": self.course.pk, "title": "Course", "subscribers_amount": 5}]
+        )
+
+    def test_owner_deleted(self):
+        """Проверяет сброс фрагментов, когда удаление владельца обнуляет owner без изменения updated_at"""
+        lessons = Lesson.objects.filter(pk=self.lesson.pk)
+        self.assertEqual(self.serialize(LessonValuesSerializer(), lessons)[0]["owner"], self.stranger.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stranger.delete()
+        self.assertIsNone(self.serialize(LessonValuesSerializer(), lessons)[0]["owner"])
+
+
+class TestFastJSON(TestBaseLMSViewSet):
+    """Тестирует, что рендерер и парсер на orjson работают так же, как стандартные классы DRF"""
+
+    def test_render_identical(self):
+        """Проверяет совпадение вывода для Decimal, дат, ленивых строк, разделителей строк и ключей-чисел"""
+        data = {
+            "price": Decimal("1234.50"),
+            "utc": datetime.datetime(2026, 1, 2, 3, 4, 5, 6, tzinfo=datetime.timezone.utc),
+            "offset": datetime.datetime(2026, 1, 2, 3, tzinfo=datetime.timezone(timedelta(hours=3))),
+            "naive": datetime.datetime(2026, 1, 2),
+            "date": datetime.date(2026, 1, 2),
+            "time": datetime.time(3, 4),
+            "duration": timedelta(minutes=90),
+            "lazy": gettext_lazy("Курс"),
+            "text": 'строка\u2028с\u2029разделителями "😀"',
+            1: (1, None, True),
+            "big": 2**70,
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=4"),
+            JSONRenderer().render(data, "application/json; indent=4"),
+        )
+
+    def test_course_response_identical(self):
+        """Проверяет совпадение ответа курса со стандартным рендерером"""
+        course = Course.objects.create(title="Курс", description="Описание\u2028", owner=self.user)
+        Lesson.objects.create(title="Урок", category=course, owner=self.user, price="99.90")
+        response = self.client_user.get(reverse("lms:courses-detail", args=[course.pk]))
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_parse(self):
+        """Проверяет разбор тела запроса и ошибки для некорректного JSON и NaN"""
+        body = '{"title": "Курс", "price": 1.5, "ids": [1, 2], "text": null}'.encode()
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        for body in [b'{"price": NaN}', b"{"]:
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(body))
+
+    def test_benchmark_command(self):
+        """Проверяет, что бенчмарк выполняется и вывод рендереров совпадает"""
+        stdout, stderr = StringIO(), StringIO()
+        call_command("benchmark_json", sizes=[3], lessons=2, repeat=1, stdout=stdout, stderr=stderr)
+        self.assertIn("render courses x3", stdout.getvalue())
+        self.assertEqual(stderr.getvalue(), "")
+
+        stdout = StringIO()
+        call_command("benchmark_serializers", sizes=[3], repeat=1, stdout=stdout)
+        self.assertIn("courses x3: ModelSerializer", stdout.getvalue())
+        self.assertFalse(Course.objects.filter(title__startswith="bench-").exists())
+
+
+class TestResponseCache(TestBaseLMSViewSet):
+    """Тестирует кэширование ответов по курсам и урокам и их инвалидацию сигналами"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.course = Course.objects.create(title="Test Course", owner=self.user)
+        self.lesson = Lesson.objects.create(title="Test Lesson", category=self.course, owner=self.user)
+
+    def test_course_list_cached(self):
+        """Проверяет, что повторный запрос списка курсов отдается из кэша без запросов (ETag - по версиям кэша)"""
+        url = reverse("lms:courses-list")
+        first = self.client_user.get(url)
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.client_user.get(url)
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(first.json(), second.json())
+
+    def test_cache_key_depends_on_params_and_user(self):
+        """Проверяет, что ключ кэша учитывает параметры запроса и пользователя"""
+        url = reverse("lms:courses-list")
+        self.client_user.get(url)
+        self.assertEqual(self.client_user.get(url, {"ordering": "-title"})["X-Cache"], "MISS")
+        self.assertEqual(self.client_stranger.get(url)["X-Cache"], "MISS")
+
+    def test_lesson_change_invalidates_course_and_lessons(self):
+        """Проверяет, что изменение урока инвалидирует курс и список уроков"""
+        course_url = reverse("lms:courses-detail", args=[self.course.id])
+        lessons_url = reverse("lms:lesson_list")
+        self.client_user.get(course_url)
+        self.client_user.get(lessons_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.title = "Renamed Lesson"
+            self.lesson.save()
+
+        course_response = self.client_user.get(course_url)
+        lessons_response = self.client_user.get(lessons_url)
+        self.assertEqual(course_response["X-Cache"], "MISS")
+        self.assertEqual(course_response.data["lessons"][0]["title"], "Renamed Lesson")
+        self.assertEqual(lessons_response["X-Cache"], "MISS")
+
+    def test_subscription_invalidates_is_subscribed(self):
+        """Проверяет, что подписка на курс инвалидирует закэшированный признак подписки"""
+        url = reverse("lms:courses-detail", args=[self.course.id])
+        self.assertFalse(self.client_user.get(url).data["is_subscribed"])
+        with self.captureOnCommitCallbacks(execute=True):
+            CourseSubscription.objects.create(user=self.user, course=self.course)
+        response = self.client_user.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertTrue(response.data["is_subscribed"])
+
+    def test_invalidation_after_commit(self):
+        """Проверяет, что версии ответов поднимаются только после фиксации транзакции"""
+        url = reverse("lms:lesson_list")
+        self.client_user.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.title = "Renamed Lesson"
+            self.lesson.save()
+            self.assertEqual(self.client_user.get(url)["X-Cache"], "HIT")
+        self.assertEqual(self.client_user.get(url)["X-Cache"], "MISS")
+
+    @staticmethod
+    def hold_recompute_locks(basename):
+        """Берет блокировки пересчета всех закэшированных ответов, как процесс, который их пересчитывает"""
+        for made_key in list(cache._cache):
+            key = made_key.split(":", 2)[2]
+            if f":response:{basename}:" in key and not key.endswith(":lock"):
+                cache.add(f"{key}:lock", 1)
+
+    def test_stale_response_not_revalidated(self):
+        """Проверяет, что устаревший ответ, отданный во время пересчета, не подтверждается ETag текущих данных"""
+        for url in (reverse("lms:courses-list"), reverse("lms:courses-detail", args=[self.course.id])):
+            with self.subTest(url=url):
+                cache.clear()
+                old = self.client_user.get(url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.course.title = f"{self.course.title} New"
+                    self.course.save()
+                self.hold_recompute_locks("courses")
+
+                stale = self.client_user.get(url)
+                self.assertEqual(stale["X-Cache"], "STALE")
+                self.assertEqual(stale["Cache-Control"], "no-cache")
+                self.assertEqual(stale.json(), old.json())
+                self.assertEqual(stale["ETag"], old["ETag"])
+                response = self.client_user.get(url, HTTP_IF_NONE_MATCH=stale["ETag"])
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+                cache.delete_many([key.split(":", 2)[2] for key in list(cache._cache) if key.endswith(":lock")])
+                fresh = self.client_user.get(url, HTTP_IF_NONE_MATCH=stale["ETag"])
+                self.assertEqual((fresh.status_code, fresh["X-Cache"]), (status.HTTP_200_OK, "MISS"))
+                self.assertNotEqual(fresh["ETag"], stale["ETag"])
+                self.assertNotEqual(fresh.json(), old.json())
+                not_modified = self.client_user.get(url, HTTP_IF_NONE_MATCH=fresh["ETag"])
+                self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_failed_invalidation_logged(self):
+        """Проверяет, что ошибка инвалидации после фиксации записывается в журнал и не прерывает запрос"""
+        with patch("lms.cache._incr", side_effect=ConnectionError), self.assertLogs("django.test", "ERROR") as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_versions_on_commit("lessons:list")
+        self.assertIn("bump_versions", logs.output[0])
+
+    def test_group_change_invalidates_user_responses(self):
+        """Проверяет, что после снятия прав модератора закэшированный ответ не выдается"""
+        url = reverse("lms:lesson_detail", args=[self.lesson.id])
+        self.assertEqual(self.client_mod.get(url).status_code, status.HTTP_200_OK)
+        self.moderator.groups.clear()
+        self.assertEqual(self.client_mod.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_cache_stats(self):
+        """Проверяет счетчики попаданий и промахов"""
+        url = reverse("lms:lesson_list")
+        self.client_user.get(url)
+        self.client_user.get(url)
+        stats = get_response_cache_stats(["lessons-list"])
+        self.assertEqual(stats["lessons-list"], {"hits": 1, "misses": 1, "stale": 0, "lock_waits": 0})
+
+    def test_stale_while_recompute(self):
+        """Проверяет, что пока другой процесс пересчитывает ответ, отдается прежний"""
+        key = "test:entry"
+        self.assertEqual(get_or_recompute(key, (1,), lambda: ("v1", "v1"), "test", 60), ("v1", "miss", (1,)))
+        self.assertEqual(get_or_recompute(key, (1,), lambda: ("v2", "v2"), "test", 60), ("v1", "hit", (1,)))
+
+        cache.add(f"{key}:lock", 1)
+        self.assertEqual(get_or_recompute(key, (2,), lambda: ("v2", "v2"), "test", 60), ("v1", "stale", (1,)))
+        cache.delete(f"{key}:lock")
+        self.assertEqual(get_or_recompute(key, (2,), lambda: ("v2", "v2"), "test", 60), ("v2", "miss", (2,)))
+        self.assertEqual(
+            get_response_cache_stats(["test"])["test"], {"hits": 1, "misses": 2, "stale": 1, "lock_waits": 0}
+        )
+
+    def test_expired_entry_recomputed(self):
+        """Проверяет, что запись с истекшим сроком пересчитывается, хотя версии не менялись"""
+        get_or_recompute("test:entry", (1,), lambda: ("v1", "v1"), "test", 0)
+        self.assertEqual(get_or_recompute("test:entry", (1,), lambda: ("v2", "v2"), "test", 60), ("v2", "miss", (1,)))
+
+    @patch("lms.cache.RECOMPUTE_LOCK_WAIT", 0.2)
+    def test_cold_key_waits_for_recompute(self):
+        """Проверяет, что без записи процесс ждет пересчета другим процессом, а потом считает сам"""
+        cache.add("test:entry:lock", 1)
+        self.assertEqual(get_or_recompute("test:entry", (1,), lambda: ("v1", "v1"), "test", 60), ("v1", "miss", (1,)))
+        self.assertEqual(get_response_cache_stats(["test"])["test"]["lock_waits"], 1)
+
+        cache.delete("test:entry")
+        with patch("lms.cache.time.sleep", side_effect=lambda seconds: cache.set("test:entry", ((1,), "v0", 1e12))):
+            result = get_or_recompute("test:entry", (1,), lambda: ("v1", "v1"), "test", 60)
+        self.assertEqual(result, ("v0", "wait", (1,)))
+
+
+@override_settings(REFERENCE_CACHE=True)
+class TestReferenceCache(TestBaseLMSViewSet):
+    """Тестирует двухуровневый кэш справочных данных"""
+
+    def setUp(self):
+        """Очищает справочный кэш процесса"""
+        reference_cache.drop_local()
+        self.addCleanup(reference_cache.drop_local)
+        super().setUp()
+
+    def test_default_course(self):
+        """Проверяет, что курс по умолчанию ищется один раз и сбрасывается при удалении курса"""
+        course_id = get_default_course()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_default_course(), course_id)
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_default_course(), course_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.get(pk=course_id).delete()
+        self.assertNotEqual(get_default_course(), course_id)
+        self.assertTrue(Course.objects.filter(pk=get_default_course(), title="Вне курса").exists())
+
+    def test_moderators(self):
+        """Проверяет, что права модератора не запрашиваются повторно и сбрасываются при изменении групп"""
+        self.assertEqual(get_moderator_ids(), {self.moderator.id})
+        with self.assertNumQueries(0):
+            get_moderator_ids()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.moderator.groups.clear()
+        self.assertEqual(get_moderator_ids(), set())
+
+    def test_default_course_renamed(self):
+        """Проверяет, что переименование курса 'Вне курса' сбрасывает его id"""
+        course = Course.objects.get(pk=get_default_course())
+        with self.captureOnCommitCallbacks(execute=True):
+            course.title = "Renamed"
+            course.save()
+        self.assertNotEqual(get_default_course(), course.id)
+
+    def test_stale_load_not_cached(self):
+        """Проверяет, что значение, загруженное до инвалидации и записанное после нее, не используется"""
+
+        def stale_loader():
+            reference_cache.invalidate("test-key")
+            return "stale"
+
+        self.assertEqual(reference_cache.get("test-key", stale_loader), "stale")
+        self.assertNotIn("test-key", reference_cache.entries)
+        self.assertEqual(reference_cache.get("test-key", lambda: "fresh"), "fresh")
+        with self.assertNumQueries(0):
+            self.assertEqual(reference_cache.get("test-key", lambda: "other"), "fresh")
+
+    def test_lru_eviction(self):
+        """Проверяет вытеснение самых давних записей из памяти процесса"""
+        with patch.object(reference_cache, "maxsize", 2):
+            for key in ["a", "b", "c"]:
+                reference_cache.set_local(key, key)
+            self.assertEqual(list(reference_cache.entries), ["b", "c"])
+
+
+@override_settings(SUBSCRIPTION_CACHE=True)
+class TestSubscriptionCache(TestBaseLMSViewSet):
+    """Тестирует кэш множеств подписок пользователей"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.courses = [Course.objects.create(title=f"Course {i}", owner=self.stranger) for i in range(3)]
+        CourseSubscription.objects.create(user=self.user, course=self.courses[1])
+
+    def test_subscribed_ids_from_cache(self):
+        """Проверяет, что после построения множества подписки проверяются без запросов к БД"""
+        ids = [course.id for course in self.courses]
+        self.assertEqual(get_subscribed_course_ids(self.user, ids), {self.courses[1].id})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_subscribed_course_ids(self.user, ids), {self.courses[1].id})
+        self.assertEqual(get_subscribed_course_ids(self.stranger, ids), set())
+
+    def test_write_through(self):
+        """Проверяет, что подписка и отписка через API сразу видны в кэше"""
+        ids = [course.id for course in self.courses]
+        get_subscribed_course_ids(self.user, ids)
+        url = reverse("lms:subscription")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_user.post(url, {"course_id": self.courses[0].id})
+        self.assertEqual(get_subscribed_course_ids(self.user, ids), {self.courses[0].id, self.courses[1].id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client_user.post(url, {"course_id": self.courses[1].id})
+        self.assertEqual(get_subscribed_course_ids(self.user, ids), {self.courses[0].id})
+
+    def test_course_responses(self):
+        """Проверяет признак подписки в списке (оба сериализатора) и в курсе"""
+        expected = {course.id: course == self.courses[1] for course in self.courses}
+        for fast in (True, False):
+            with self.subTest(fast=fast), self.settings(FAST_LIST_SERIALIZERS=fast):
+                cache.clear()
+                response = self.client_user.get(reverse("lms:courses-list"), {"page_size": 50})
+                results = response.data["results"]
+                self.assertEqual({course["id"]: course["is_subscribed"] for course in results}, expected)
+                self.assertEqual(
+                    list(results[0]), [name for name in CourseSerializer.Meta.fields if name != "lessons"]
+                )
+        CourseSubscription.objects.create(user=self.stranger, course=self.courses[2])
+        for course, subscribed in ((self.courses[1], False), (self.courses[2], True)):
+            response = self.client_stranger.get(reverse("lms:courses-detail", args=[course.id]))
+            self.assertEqual(response.data["is_subscribed"], subscribed)
+
+    def test_consistency_check(self):
+        """Проверяет поиск и исправление расхождений кэша с таблицей подписок"""
+        get_subscribed_course_ids(self.user, [self.courses[0].id])
+        call_command("check_subscription_cache", stdout=StringIO())
+
+        CourseSubscription.objects.filter(user=self.user).delete()
+        with self.assertRaises(CommandError):
+            call_command("check_subscription_cache", stdout=StringIO())
+        out = StringIO()
+        call_command("check_subscription_cache", "--fix", stdout=out)
+        self.assertIn(f"Пользователь {self.user.id}", out.getvalue())
+        self.assertEqual(get_subscribed_course_ids(self.user, [self.courses[1].id]), set())
+
+
+@override_settings(SUBSCRIPTION_CACHE=True)
+class TestSubscriptionCacheRedis(TestBaseLMSViewSet):
+    """Тестирует команды кэша подписок к Redis на подмененном клиенте"""
+
+    def setUp(self):
+        """Формирует тестовые данные и подменяет клиент Redis"""
+        super().setUp()
+        self.courses = [Course.objects.create(title=f"Course {i}", owner=self.stranger) for i in range(3)]
+        self.ids = [course.id for course in self.courses]
+        CourseSubscription.objects.create(user=self.user, course=self.courses[1])
+        self.clients = []
+        for patcher in (
+            patch("lms.cache.get_redis_client", side_effect=self.new_client),
+            patch.object(subscription_cache, "update_script", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def new_client(self):
+        """Возвращает новый объект клиента, как get_client() кэша Django"""
+        client = MagicMock()
+        client.smismember.return_value = [0] * (len(self.ids) + 1)
+        self.clients.append(client)
+        return client
+
+    def test_smismember(self):
+        """Проверяет, что построенное множество проверяется одним SMISMEMBER без запросов к БД"""
+        client = MagicMock()
+        client.smismember.return_value = [1, 0, 1, 0]
+        with patch("lms.cache.get_redis_client", return_value=client), self.assertNumQueries(0):
+            self.assertEqual(get_subscribed_course_ids(self.user, self.ids), {self.ids[1]})
+        client.smismember.assert_called_once_with(
+            subscription_cache.key(self.user.pk), [SUBSCRIPTIONS_LOADED_MARKER, *self.ids]
+        )
+
+    def test_rebuild_watch(self):
+        """Проверяет, что множество строится из БД под WATCH поколения и конфликт записи не мешает ответу"""
+        self.assertEqual(get_subscribed_course_ids(self.user, self.ids), {self.ids[1]})
+        pipe = self.clients[-1].pipeline.return_value.__enter__.return_value
+        key = subscription_cache.key(self.user.pk)
+        self.assertEqual(
+            pipe.mock_calls,
+            [
+                call.watch(subscription_cache.generation_key(self.user.pk)),
+                call.multi(),
+                call.delete(key),
+                call.sadd(key, SUBSCRIPTIONS_LOADED_MARKER, self.ids[1]),
+                call.expire(key, settings.SUBSCRIPTION_CACHE_TIMEOUT),
+                call.execute(),
+            ],
+        )
+
+        with patch("lms.cache.get_redis_client", return_value=MagicMock()) as get_client:
+            get_client.return_value.smismember.return_value = [0] * (len(self.ids) + 1)
+            pipe = get_client.return_value.pipeline.return_value.__enter__.return_value
+            pipe.execute.side_effect = WatchError
+            self.assertEqual(get_subscribed_course_ids(self.user, self.ids), {self.ids[1]})
+
+    def test_write_through_script(self):
+        """Проверяет, что скрипт SADD/SREM регистрируется один раз и вызывается с текущим клиентом"""
+        subscription_cache.add(self.user.pk, [self.ids[0]])
+        subscription_cache.remove(self.user.pk, [self.ids[1], self.ids[2]])
+        subscription_cache.add(self.user.pk, [])
+
+        self.assertEqual(len(self.clients), 2)
+        self.clients[0].register_script.assert_called_once_with(SUBSCRIPTIONS_UPDATE_SCRIPT)
+        self.clients[1].register_script.assert_not_called()
+        keys = [subscription_cache.key(self.user.pk), subscription_cache.generation_key(self.user.pk)]
+        timeout = settings.SUBSCRIPTION_CACHE_TIMEOUT
+        self.assertEqual(
+            self.clients[0].register_script.return_value.call_args_list,
+            [
+                call(keys=keys, args=["SADD", timeout, self.ids[0]], client=self.clients[0]),
+                call(keys=keys, args=["SREM", timeout, self.ids[1], self.ids[2]], client=self.clients[1]),
+            ],
+        )
+
+
+class TestConditionalGet(TestBaseLMSViewSet):
+    """Тестирует условные запросы (ETag / Last-Modified) к курсам и урокам"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.course = Course.objects.create(title="Test Course", owner=self.user)
+        self.lesson = Lesson.objects.create(title="Test Lesson", category=self.course, owner=self.user)
+
+    def test_course_list_not_modified(self):
+        """Проверяет, что неизмененный список курсов возвращает 304"""
+        url = reverse("lms:courses-list")
+        etag = self.client_user.get(url)["ETag"]
+        response = self.client_user.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_course_list_modified_after_lesson_delete(self):
+        """Проверяет, что удаление урока меняет ETag списка курсов"""
+        url = reverse("lms:courses-list")
+        etag = self.client_user.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.delete()
+        response = self.client_user.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_course_detail_modified_after_subscription(self):
+        """Проверяет, что подписка меняет ETag курса"""
+        url = reverse("lms:courses-detail", args=[self.course.id])
+        etag = self.client_user.get(url)["ETag"]
+        self.assertEqual(self.client_user.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.captureOnCommitCallbacks(execute=True):
+            CourseSubscription.objects.create(user=self.user, course=self.course)
+        self.assertEqual(self.client_user.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_lesson_detail_last_modified(self):
+        """Проверяет, что урок отдает Last-Modified и поддерживает If-Modified-Since"""
+        url = reverse("lms:lesson_detail", args=[self.lesson.id])
+        last_modified = self.client_user.get(url)["Last-Modified"]
+        response = self.client_user.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_lesson_list_modified_after_update(self):
+        """Проверяет, что изменение урока меняет ETag списка уроков"""
+        url = reverse("lms:lesson_list")
+        etag = self.client_user.get(url)["ETag"]
+        self.assertEqual(self.client_user.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.title = "Updated Lesson"
+            self.lesson.save()
+        self.assertEqual(self.client_user.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_list_validators_without_queries(self):
+        """Проверяет, что ETag списков берется из версий кэша ответов без агрегатов по таблицам"""
+        for url in (reverse("lms:lesson_list"), reverse("lms:courses-list")):
+            with self.subTest(url=url):
+                etag = self.client_user.get(url)["ETag"]
+                with self.assertNumQueries(0):
+                    response = self.client_user.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_version_reset_changes_etag(self):
+        """Проверяет, что версия, вытесненная из кэша, не повторяет ETag прежнего содержимого"""
+        url = reverse("lms:lesson_list")
+        etag = self.client_user.get(url)["ETag"]
+        cache.clear()
+        self.assertNotEqual(self.client_user.get(url)["ETag"], etag)
+
+    @override_settings(CACHE_ENABLED=False)
+    def test_list_validators_without_response_cache(self):
+        """Проверяет ETag по агрегатам, когда кэш ответов выключен"""
+        url = reverse("lms:lesson_list")
+        etag = self.client_user.get(url)["ETag"]
+        self.assertEqual(self.client_user.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.lesson.delete()
+        self.assertEqual(self.client_user.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_retrieve_forbidden_without_validators(self):
+        """Проверяет, что права доступа проверяются до сравнения валидаторов"""
+        url = reverse("lms:lesson_detail", args=[self.lesson.id])
+        etag = self.client_user.get(url)["ETag"]
+        response = self.client_stranger.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestKeysetPagination(TestBaseLMSViewSet):
+    """Тестирует курсорную (keyset) пагинацию списков курсов и уроков"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.courses = [Course.objects.create(title=f"Course {i:02}", owner=self.user) for i in range(7)]
+        for i in range(12):
+            Lesson.objects.create(title=f"Lesson {i:02}", category=self.courses[i % 3], owner=self.user)
+
+    def collect_pages(self, url, params):
+        """Проходит по всем страницам через ссылки next и возвращает собранные результаты"""
+        results = []
+        response = self.client_user.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            results.extend(response.data["results"])
+            if not response.data["next"]:
+                return results, response
+            response = self.client_user.get(response.data["next"])
+
+    def test_offset_pagination_by_default(self):
+        """Проверяет, что без параметра cursor используется постраничная пагинация"""
+        response = self.client_user.get(reverse("lms:courses-list"))
+        self.assertEqual(response.data["count"], 7)
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_course_keyset_pages(self):
+        """Проверяет, что курсорная пагинация обходит все курсы в порядке title без повторов"""
+        results, _ = self.collect_pages(reverse("lms:courses-list"), {"pagination": "cursor"})
+        self.assertEqual([course["title"] for course in results], [f"Course {i:02}" for i in range(7)])
+
+    def test_lesson_keyset_ordering_and_page_size(self):
+        """Проверяет сортировку по неуникальному полю category с дополнением id и ограничение page_size"""
+        url = reverse("lms:lesson_list")
+        first = self.client_user.get(url, {"pagination": "cursor", "ordering": "-category", "page_size": 100})
+        self.assertEqual(len(first.data["results"]), 10)
+
+        results, _ = self.collect_pages(url, {"pagination": "cursor", "ordering": "-category", "page_size": 4})
+        expected = list(Lesson.objects.order_by("-category_id", "-id").values_list("title", flat=True))
+        self.assertEqual([lesson["title"] for lesson in results], expected)
+
+    def test_keyset_previous_link(self):
+        """Проверяет, что ссылка previous возвращает предыдущую страницу"""
+        url = reverse("lms:lesson_list")
+        first = self.client_user.get(url, {"pagination": "cursor"})
+        self.assertIsNone(first.data["previous"])
+        second = self.client_user.get(first.data["next"])
+        back = self.client_user.get(second.data["previous"])
+        self.assertEqual(back.data["results"], first.data["results"])
+
+    def test_invalid_cursor(self):
+        """Проверяет, что некорректный курсор возвращает 404"""
+        response = self.client_user.get(reverse("lms:lesson_list"), {"cursor": "broken"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestCatalogSearch(TestBaseLMSViewSet):
+    """Тестирует поиск по курсам и урокам"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.course = Course.objects.create(
+            title="Математика", description="Простые дроби и уравнения", owner=self.user
+        )
+        self.lesson = Lesson.objects.create(
+            title="Сложение дробей", description="Правила сложения", category=self.course, owner=self.user
+        )
+        Lesson.objects.create(title="Русский язык", description="Орфография", category=self.course)
+        self.url = reverse("lms:search")
+
+    def test_search_requires_query(self):
+        """Проверяет, что пустой запрос возвращает ошибку 400"""
+        response = self.client_user.get(self.url, {"q": " "})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_courses_and_lessons(self):
+        """Проверяет, что поиск находит и курсы, и уроки с указанием курса"""
+        response = self.client_user.get(self.url, {"q": "дроб"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
+        found = {(item["kind"], item["id"], item["course_id"]) for item in response.data["results"]}
+        self.assertEqual(
+            found, {("course", self.course.id, self.course.id), ("lesson", self.lesson.id, self.course.id)}
+        )
+
+    def test_search_requires_auth(self):
+        """Проверяет, что поиск недоступен неавторизованным пользователям"""
+        response = APIClient().get(self.url, {"q": "дроб"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @skipUnless(connection.vendor == "postgresql", "Полнотекстовый поиск доступен только в PostgreSQL")
+    def test_fulltext_stemming_and_typos(self):
+        """Проверяет русскую морфологию и триграммный поиск с опечатками"""
+        stemmed = self.client_user.get(self.url, {"q": "дробь"})
+        self.assertIn(self.lesson.id, [item["id"] for item in stemmed.data["results"] if item["kind"] == "lesson"])
+        typo = self.client_user.get(self.url, {"q": "Матиматика"})
+        self.assertEqual(typo.data["results"][0]["id"], self.course.id)
+
+
+class TestCatalogSync(TestBaseLMSViewSet):
+    """Тестирует дельта-синхронизацию каталога"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.course = Course.objects.create(title="Course", owner=self.user)
+        self.lesson = Lesson.objects.create(title="Lesson", category=self.course, owner=self.user)
+        self.url = reverse("lms:sync")
+
+    def sync(self, since=None):
+        """Выполняет запрос синхронизации"""
+        response = self.client_user.get(self.url, {"since": since} if since else {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    @override_settings(SYNC_SAFETY_MARGIN=timedelta(0))
+    def test_full_then_delta(self):
+        """Проверяет, что повторная синхронизация возвращает только изменения и удаления"""
+        data = self.sync()
+        self.assertEqual([course["id"] for course in data["courses"]], [self.course.id])
+        self.assertEqual([lesson["id"] for lesson in data["lessons"]], [self.lesson.id])
+        self.assertFalse(data["has_more"])
+
+        with self.assertNumQueries(3):
+            empty = self.sync(data["since"])
+        self.assertEqual((empty["courses"], empty["lessons"]), ([], []))
+        self.assertEqual(empty["deleted"], {"courses": [], "lessons": []})
+
+        self.course.title = "Renamed"
+        self.course.save()
+        lesson_id = self.lesson.id
+        self.lesson.delete()
+        delta = self.sync(empty["since"])
+        self.assertEqual([course["title"] for course in delta["courses"]], ["Renamed"])
+        self.assertEqual(delta["lessons"], [])
+        self.assertEqual(delta["deleted"], {"courses": [], "lessons": [lesson_id]})
+
+    def test_late_commit_not_skipped(self):
+        """Проверяет, что строка со временем до начала синхронизации, зафиксированная после чтения, не теряется"""
+        data = self.sync()
+        late = Lesson.objects.create(title="Late", category=self.course)
+        Lesson.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(seconds=30))
+        delta = self.sync(data["since"])
+        self.assertIn(late.id, [lesson["id"] for lesson in delta["lessons"]])
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_has_more(self):
+        """Проверяет постраничную синхронизацию без потери строк с одинаковым updated_at"""
+        for i in range(4):
+            Lesson.objects.create(title=f"Extra {i}", category=self.course)
+        Lesson.objects.update(updated_at=timezone.now())
+        seen = []
+        data = self.sync()
+        seen += [lesson["id"] for lesson in data["lessons"]]
+        while data["has_more"]:
+            data = self.sync(data["since"])
+            seen += [lesson["id"] for lesson in data["lessons"]]
+        self.assertEqual(sorted(seen), sorted(Lesson.objects.values_list("id", flat=True)))
+
+    def test_expired_and_invalid_cursor(self):
+        """Проверяет ответ 410 для устаревшего курсора и 400 для некорректного"""
+        since = self.sync()["since"]
+        with override_settings(SYNC_TOMBSTONE_RETENTION=timedelta(0)):
+            self.assertEqual(self.client_user.get(self.url, {"since": since}).status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.client_user.get(self.url, {"since": "bad"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_purge_tombstones(self):
+        """Проверяет удаление устаревших отметок об удалении"""
+        self.lesson.delete()
+        Tombstone.objects.update(deleted_at=timezone.now() - timedelta(days=365))
+        self.assertEqual(delete_expired_tombstones(), 1)
+        self.assertFalse(Tombstone.objects.exists())
+
+
+class TestCatalogExport(TestBaseLMSViewSet):
+    """Тестирует статический экспорт каталога"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        super().setUp()
+        self.root = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.course = Course.objects.create(title="Course", owner=self.user)
+        self.lesson = Lesson.objects.create(title="Lesson", category=self.course, owner=self.user)
+
+    def test_snapshot(self):
+        """Проверяет файлы версии, сжатые копии, манифест и ссылку current"""
+        version = write_catalog_snapshot(self.root)
+        public = self.root / "public"
+        version_dir = public / "versions" / version
+        courses = (version_dir / "courses.json").read_bytes()
+        self.assertEqual(gzip.decompress((version_dir / "courses.json.gz").read_bytes()), courses)
+        self.assertEqual(
+            json.loads(courses),
+            [
+                {
+                    "id": self.course.id,
+                    "title": "Course",
+                    "preview": "/media/default/default.png",
+                    "description": None,
+                    "lessons_amount": 1,
+                    "price": "1000.00",
+                }
+            ],
+        )
+        lessons = json.loads((version_dir / "lessons.json").read_bytes())
+        self.assertEqual(
+            lessons,
+            [
+                {
+                    "id": self.lesson.id,
+                    "title": "Lesson",
+                    "preview": "/media/default/default.png",
+                    "category": self.course.id,
+                    "price": "500.00",
+                }
+            ],
+        )
+
+        manifest = json.loads((public / "manifest.json").read_text())
+        self.assertEqual(manifest["version"], version)
+        self.assertEqual(manifest["files"]["courses"], f"/catalog/versions/{version}/courses.json")
+        self.assertEqual(os.readlink(public / "current"), os.path.join("versions", version))
+        self.assertEqual(sorted(path.name for path in public.iterdir()), ["current", "manifest.json", "versions"])
+
+    def test_hidden_courses_not_exported(self):
+        """Проверяет, что курс, скрытый до удаления, и его уроки не попадают в публичный каталог"""
+        Course.objects.filter(pk=self.course.pk).update(is_hidden=True)
+        version = write_catalog_snapshot(self.root)
+        version_dir = self.root / "public" / "versions" / version
+        self.assertEqual(json.loads((version_dir / "courses.json").read_bytes()), [])
+        self.assertEqual(json.loads((version_dir / "lessons.json").read_bytes()), [])
+
+    @override_settings(CATALOG_EXPORT_KEEP_VERSIONS=2)
+    def test_versions(self):
+        """Проверяет, что неизменный каталог не создает версию, а старые версии удаляются"""
+        version = write_catalog_snapshot(self.root)
+        self.assertEqual(write_catalog_snapshot(self.root), version)
+        for i in range(3):
+            Lesson.objects.create(title=f"Extra {i}", category=self.course)
+            version = write_catalog_snapshot(self.root)
+        versions = [path.name for path in (self.root / "public" / "versions").iterdir()]
+        self.assertEqual(len(versions), 2)
+        self.assertIn(version, versions)
+
+    @override_settings(CATALOG_EXPORT=True, CATALOG_EXPORT_DEBOUNCE=0)
+    def test_export_on_change(self):
+        """Проверяет, что изменение каталога ставит экспорт в очередь один раз"""
+        with override_settings(CATALOG_EXPORT_ROOT=self.root), self.captureOnCommitCallbacks(execute=True):
+            self.course.title = "Renamed"
+            self.course.save()
+            self.lesson.delete()
+        public = self.root / "public"
+        self.assertEqual(len(list((public / "versions").iterdir())), 1)
+        manifest = json.loads((public / "manifest.json").read_text())
+        courses = json.loads((public / "versions" / manifest["version"] / "courses.json").read_bytes())
+        self.assertEqual([course["title"] for course in courses], ["Renamed"])
+
+
 class TestLessonViewSet(TestBaseLMSViewSet):
     """Тестирует корректность работы CRUD уроков"""
 
@@ -283,6 +2361,7 @@ class TestCourseSubscriptionAPIView(APITestCase):
     """Тесты для подписки и отписки от курса"""
 
     def setUp(self):
+        cache.clear()
         self.user = CustomUser.objects.create_user(username="testuser", email="user@test.com", password="testpass123")
         self.client_user = APIClient()
         self.client_user.force_authenticate(self.user)
@@ -330,3 +2409,67 @@ class TestCourseSubscriptionAPIView(APITestCase):
         self.assertEqual(second_del.data["message"], "Подписка удалена")
 
         self.assertFalse(CourseSubscription.objects.filter(user=self.user, course=self.course).exists())
+
+    def test_subscription_missing_course(self):
+        """Проверяет ответ 404 с сообщением о курсе для несуществующего и скрытого курса"""
+        hidden = Course.objects.create(title="Hidden Course", owner=self.user, is_hidden=True)
+        for course_id in (self.course.id + 100, hidden.id):
+            with self.subTest(course_id=course_id):
+                response = self.client_user.post(self.url, {"course_id": course_id})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+                self.assertEqual(response.data["detail"], "Курс не найден")
+        self.assertFalse(CourseSubscription.objects.exists())
+
+    def test_subscription_add_response_and_counter(self):
+        """Проверяет данные созданной подписки и счетчик подписчиков курса"""
+        response = self.client_user.post(self.url, {"course_id": self.course.id})
+        self.assertEqual(response.data["course"], self.course.id)
+        self.assertEqual(response.data["user"], self.user.id)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.subscribers_count, 1)
+
+        self.client_user.post(self.url, {"course_id": self.course.id})
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.subscribers_count, 0)
+
+    def test_subscribe_existing_without_error(self):
+        """Проверяет, что повторная подписка (как при параллельном запросе) не нарушает уникальность"""
+        self.assertEqual(len(subscribe_user(self.user.id, [self.course.id])), 1)
+        self.assertEqual(subscribe_user(self.user.id, [self.course.id]), [])
+        self.assertEqual(CourseSubscription.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_subscribe_and_unsubscribe(self):
+        """Проверяет пакетную подписку и отписку, счетчики и сброс кэша признака подписки"""
+        other = Course.objects.create(title="Other Course", owner=self.user)
+        url = reverse("lms:subscription_bulk")
+        courses_url = reverse("lms:courses-list")
+        self.assertFalse(any(course["is_subscribed"] for course in self.client_user.get(courses_url).data["results"]))
+
+        data = {"action": "subscribe", "course_ids": [self.course.id, other.id, 999999, self.course.id]}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_user.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["changed"], [self.course.id, other.id])
+        self.assertEqual(response.data["not_found"], [999999])
+        self.assertTrue(all(course["is_subscribed"] for course in self.client_user.get(courses_url).data["results"]))
+        other.refresh_from_db()
+        self.assertEqual(other.subscribers_count, 1)
+
+        response = self.client_user.post(url, data, format="json")
+        self.assertEqual(response.data["changed"], [])
+        self.assertEqual(response.data["unchanged"], [self.course.id, other.id])
+
+        data = {"action": "unsubscribe", "course_ids": [other.id]}
+        response = self.client_user.post(url, data, format="json")
+        self.assertEqual(response.data["changed"], [other.id])
+        self.assertFalse(CourseSubscription.objects.filter(course=other).exists())
+        other.refresh_from_db()
+        self.assertEqual(other.subscribers_count, 0)
+
+    def test_bulk_subscription_validation(self):
+        """Проверяет ошибки входных данных пакетной подписки"""
+        url = reverse("lms:subscription_bulk")
+        for data in ({"action": "subscribe", "course_ids": []}, {"action": "toggle", "course_ids": [1]}):
+            with self.subTest(data=data):
+                response = self.client_user.post(url, data, format="json")
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -4,8 +4,14 @@ from rest_framework.routers import DefaultRouter
 
 from lms.apps import LmsConfig
 from lms.views import (
+    CatalogSearch,
+    CatalogSync,
+    CourseDeletionRetrieve,
     CourseSubscriptionAPIView,
+    CourseSubscriptionBulkAPIView,
     CourseViewSet,
+    LessonBatchRetrieve,
+    LessonBulk,
     LessonCreate,
     LessonDelete,
     LessonList,
@@ -21,10 +27,16 @@ router.register(r"courses", CourseViewSet, basename="courses")
 urlpatterns = [
     path("lessons/", LessonList.as_view(), name="lesson_list"),
     path("lessons/<int:pk>/", LessonRetrieve.as_view(), name="lesson_detail"),
+    path("lessons/batch/", LessonBatchRetrieve.as_view(), name="lesson_batch"),
     path("lessons/create/", LessonCreate.as_view(), name="lesson_create"),
+    path("lessons/bulk/", LessonBulk.as_view(), name="lesson_bulk"),
     path("lessons/<int:pk>/update/", LessonUpdate.as_view(), name="lesson_update"),
     path("lessons/<int:pk>/delete/", LessonDelete.as_view(), name="lesson_delete"),
     path("subscription/", CourseSubscriptionAPIView.as_view(), name="subscription"),
+    path("subscription/bulk/", CourseSubscriptionBulkAPIView.as_view(), name="subscription_bulk"),
+    path("search/", CatalogSearch.as_view(), name="search"),
+    path("sync/", CatalogSync.as_view(), name="sync"),
+    path("courses/deletions/<int:pk>/", CourseDeletionRetrieve.as_view(), name="course_deletion"),
     path("", include(router.urls)),
 ]
 
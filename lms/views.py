@@ -1,39 +1,295 @@
 from datetime import timedelta
+from io import BytesIO
 
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, FilteredRelation, Max, OuterRef, Q, Subquery, Sum
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
 
+from django_filters.rest_framework import DjangoFilterBackend
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.filters import OrderingFilter
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
-from lms.models import Course, CourseSubscription, Lesson
-from lms.paginators import CoursePaginator, LessonPaginator
+from lms.batch import BATCH_IDS_PARAMETER, BatchRetrieveMixin
+from lms.bundle import import_course_bundle, iter_course_bundle
+from lms.cache import ResponseCacheMixin
+from lms.conditional import ConditionalGetMixin
+from lms.documents import CourseDocumentMixin
+from lms.filters import CourseFilterSet
+from lms.models import Course, CourseDeletion, CourseSubscription, Lesson
+from lms.paginators import CoursePaginator, LessonPaginator, SearchPaginator
+from lms.renderers import NDJSONParser, NDJSONRenderer
 from lms.serializers import (
+    CourseDeletionSerializer,
     CourseSerializer,
+    CourseSubscriptionBulkSerializer,
     CourseSubscriptionInputSerializer,
     CourseSubscriptionSerializer,
+    CourseValuesSerializer,
+    LessonBulkSerializer,
     LessonSerializer,
+    LessonValuesSerializer,
+    SearchResultSerializer,
 )
+from lms.services import (
+    annotate_courses,
+    get_subscribed_course_ids,
+    hide_course,
+    search_catalog,
+    subscribe_user,
+    unsubscribe_user,
+)
+from lms.signals import course_hidden, lessons_bulk_saved, subscriptions_changed
+from lms.sync import collect_changes
 from lms.tasks import send_course_update_email
-from users.permissions import IsModerator, IsOwner, NotModerator
+from users.permissions import IsModerator, IsOwner, NotModerator, is_moderator
+
+
+class ValuesListMixin:
+    """
+    Быстрый путь для list: строки выбираются через values() и сериализуются values_serializer_class
+    без создания экземпляров моделей. Включается настройкой FAST_LIST_SERIALIZERS
+    """
+
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        """Возвращает список объектов, сериализованный быстрым read-only сериализатором"""
+
+        if not settings.FAST_LIST_SERIALIZERS:
+            return super().list(request, *args, **kwargs)
+        return self.values_list_response(self.filter_queryset(self.get_queryset()))
+
+    def values_list_response(self, queryset):
+        """Возвращает страницу queryset, сериализованную быстрым read-only сериализатором"""
 
+        serializer = self.values_serializer_class(context=self.get_serializer_context())
+        rows = serializer.get_values_queryset(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation_many(page))
+        return Response(serializer.to_representation_many(rows))
 
-class CourseViewSet(viewsets.ModelViewSet):
+
+class CourseViewSet(
+    ConditionalGetMixin,
+    ResponseCacheMixin,
+    ValuesListMixin,
+    BatchRetrieveMixin,
+    CourseDocumentMixin,
+    viewsets.ModelViewSet,
+):
     """Вьюсет курса"""
 
-    queryset = Course.objects.all().prefetch_related("lessons")
+    queryset = Course.visible.all()
     serializer_class = CourseSerializer
+    values_serializer_class = CourseValuesSerializer
     filter_backends = [
+        DjangoFilterBackend,
         OrderingFilter,
     ]
+    filterset_class = CourseFilterSet
     ordering_fields = [
         "title",
     ]
     pagination_class = CoursePaginator
+    cache_basename = "courses"
+    cache_per_user = True
+
+    def get_cache_namespaces(self, kind):
+        """Ответы с курсами зависят от подписок пользователя (поле is_subscribed)"""
+        return super().get_cache_namespaces(kind) + [f"subscriptions:{self.request.user.pk}"]
+
+    def get_conditional_queryset(self):
+        """Валидаторы списка считаются по курсам без аннотаций"""
+        return Course.visible.all()
+
+    def get_list_validators(self, queryset):
+        """
+        ETag страницы курсов учитывает сами курсы, их уроки, счетчики и подписки текущего пользователя.
+        Подписка пользователя присоединяется не более чем одной строкой на курс, поэтому суммы счетчиков точны
+        """
+
+        lessons_updated = (
+            Lesson.objects.filter(category=OuterRef("pk"))
+            .order_by()
+            .values("category")
+            .annotate(updated=Max("updated_at"))
+            .values("updated")
+        )
+        user_subscription = FilteredRelation(
+            "course_subscriptions", condition=Q(course_subscriptions__user_id=self.request.user.pk)
+        )
+        aggregates = queryset.annotate(user_subscription=user_subscription).aggregate(
+            courses_updated=Max("updated_at"),
+            courses_count=Count("id"),
+            lessons_updated=Max(Subquery(lessons_updated)),
+            lessons_count=Sum("lessons_count"),
+            subscribers_count=Sum("subscribers_count"),
+            purchases_count=Sum("purchases_count"),
+            subscriptions_created=Max("user_subscription__created_at"),
+            subscriptions_count=Count("user_subscription"),
+        )
+        return tuple(aggregates.values()), None
+
+    def get_object_validators(self, obj):
+        """
+        ETag курса учитывает курс, его счетчики, превью уроков (если оно раскрыто и уже загружено prefetch)
+        или время построения готового представления и признак подписки
+        """
+
+        if settings.SUBSCRIPTION_CACHE and not hasattr(obj, "is_subscribed"):
+            # с кэшем подписок признак не аннотируется queryset, сериализатор возьмет уже найденное значение
+            fields = self.get_requested_fields()
+            if fields is None or "is_subscribed" in fields:
+                obj.is_subscribed = obj.pk in get_subscribed_course_ids(self.request.user, [obj.pk])
+        preview = None
+        if "lessons_preview" in obj.__dict__:
+            preview = tuple((lesson.pk, lesson.updated_at) for lesson in obj.lessons_preview)
+        elif self.use_course_document():
+            document = getattr(obj, "document", None)
+            preview = document.built_at if document is not None else None
+        return (
+            obj.pk,
+            obj.updated_at,
+            obj.lessons_count,
+            obj.subscribers_count,
+            obj.purchases_count,
+            preview,
+            getattr(obj, "is_subscribed", None),
+        ), None
+
+    def get_object_last_modified(self, obj):
+        """Счетчики, уроки и подписки меняют курс без сдвига updated_at, поэтому Last-Modified не отдается"""
+        return None
+
+    def get_requested_fields(self):
+        """Возвращает поля из параметра ?fields= или None, если выбор полей не запрошен"""
+
+        fields = self.request.query_params.get("fields")
+        if not fields:
+            return None
+        return {name.strip() for name in fields.split(",") if name.strip()}
+
+    def get_expand(self):
+        """
+        Возвращает раскрываемые вложенные поля из параметра ?expand=.
+        По умолчанию уроки раскрываются везде, кроме списка курсов
+        """
+
+        expand = self.request.query_params.get("expand")
+        if expand is not None:
+            return {name.strip() for name in expand.split(",") if name.strip()}
+        return set() if self.action == "list" else {"lessons"}
+
+    def get_serializer_context(self):
+        """Передает в сериализатор выбранные поля и раскрываемые вложенные поля"""
+
+        context = super().get_serializer_context()
+        if self.request is not None:
+            context["fields"] = self.get_requested_fields()
+            context["expand"] = self.get_expand()
+        return context
+
+    def get_queryset(self):
+        """
+        Для чтения загружает только столбцы и уроки, нужные запрошенному представлению,
+        и аннотирует курсы признаком подписки текущего пользователя,
+        поэтому число запросов не зависит от размера страницы
+        """
+        queryset = super().get_queryset()
+        if self.use_course_document():
+            queryset = self.get_document_queryset(queryset)
+        elif self.action in ["list", "retrieve", "batch"]:
+            fields = CourseSerializer.select_fields(
+                CourseSerializer.Meta.fields, self.get_requested_fields(), self.get_expand()
+            )
+            queryset = annotate_courses(queryset, self.request.user, fields)
+        elif self.action == "lessons":
+            queryset = queryset.only("id", "owner", "lessons_count")
+        elif self.action == "bundle":
+            queryset = queryset.only("id", "owner")
+        return queryset
+
+    @swagger_auto_schema(manual_parameters=[BATCH_IDS_PARAMETER])
+    @action(detail=False, methods=["get"])
+    def batch(self, request, *args, **kwargs):
+        """Возвращает курсы по списку ?ids= одним запросом в порядке запроса"""
+        return self.batch_retrieve(request, *args, **kwargs)
+
+    @swagger_auto_schema(responses={200: LessonSerializer(many=True)})
+    @action(
+        detail=True,
+        methods=["get"],
+        serializer_class=LessonSerializer,
+        values_serializer_class=LessonValuesSerializer,
+        pagination_class=LessonPaginator,
+        filter_backends=[OrderingFilter],
+        ordering_fields=["title", "created_at", "updated_at"],
+    )
+    def lessons(self, request, *args, **kwargs):
+        """Возвращает уроки курса постранично с сортировкой по ?ordering="""
+
+        course = self.get_object()
+        lessons = self.filter_queryset(Lesson.objects.filter(category=course))
+        validators = self.get_version_validators("lessons")
+        if validators is None:
+            lessons_updated = lessons.order_by().aggregate(updated=Max("updated_at"))["updated"]
+            validators = (course.pk, course.lessons_count, lessons_updated), None
+        return self.conditional_response(validators, self.cached_lessons, request, lessons)
+
+    def cached_lessons(self, request, lessons):
+        """Возвращает страницу уроков курса через кэш ответов"""
+        return self.cached_response("lessons", self.lessons_page, request, lessons)
+
+    def lessons_page(self, request, lessons):
+        """Сериализует страницу уроков курса"""
+
+        if settings.FAST_LIST_SERIALIZERS:
+            return self.values_list_response(lessons)
+        page = self.paginate_queryset(lessons)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @swagger_auto_schema(responses={200: "Пакет курса в формате NDJSON"})
+    @action(detail=True, methods=["get"], renderer_classes=[*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer])
+    def bundle(self, request, *args, **kwargs):
+        """
+        Выгружает курс со всеми уроками пакетом NDJSON (первая строка - курс, далее по строке на урок).
+        Ответ формируется потоком, уроки читаются из БД пачками
+        """
+
+        course = self.get_object()
+        response = StreamingHttpResponse(iter_course_bundle(course), content_type=NDJSONRenderer.media_type)
+        response["Content-Disposition"] = f'attachment; filename="course-{course.pk}.ndjson"'
+        return response
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(type=openapi.TYPE_STRING, description="Пакет курса в формате NDJSON"),
+        responses={201: "id и название созданного курса, количество уроков"},
+    )
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[NDJSONParser])
+    def import_bundle(self, request, *args, **kwargs):
+        """
+        Создает курс с уроками из пакета NDJSON в теле запроса (формат выгрузки bundle), владелец -
+        текущий пользователь. Тело читается построчно, уроки записываются пачками в одной транзакции
+        """
+
+        stream = request.data if hasattr(request.data, "readline") else BytesIO()
+        course, lessons_count = import_course_bundle(stream, owner=request.user)
+        return Response(
+            {"id": course.pk, "title": course.title, "lessons_count": lessons_count}, status=status.HTTP_201_CREATED
+        )
 
     def perform_create(self, serializer):
         """При создании курса устанавливает пользователя как владельца"""
@@ -43,22 +299,61 @@ class CourseViewSet(viewsets.ModelViewSet):
         """Определяет права на действия с курсами для разных уровней пользователей:
         - авторизованный суперпользователь - все права;
         - просмотр списка курсов - для авторизованных пользователей;
-        - создание курсов - для авторизованных пользователей, но не модераторов;
-        - просмотр и изменение курса - для авторизованных владельцев и модераторов;
+        - создание курсов (в том числе импорт пакета курса) - для авторизованных пользователей, но не модераторов;
+        - просмотр и изменение курса (в том числе пакетный просмотр, просмотр его уроков и выгрузка пакета) -
+          для авторизованных владельцев и модераторов;
         - удаление курса - для авторизованных владельцев
         """
         if self.request.user.is_superuser:
             return [IsAuthenticated()]
         if self.action == "list":
             self.permission_classes = [IsAuthenticated]
-        elif self.action in ["retrieve", "update", "partial_update"]:
+        elif self.action in ["retrieve", "batch", "lessons", "bundle", "update", "partial_update"]:
             self.permission_classes = [IsAuthenticated, IsModerator | IsOwner]
-        elif self.action == "create":
+        elif self.action in ["create", "import_bundle"]:
             self.permission_classes = [IsAuthenticated, ~IsModerator]
         elif self.action == "destroy":
             self.permission_classes = [IsAuthenticated, IsOwner]
         return [perm() for perm in self.permission_classes]
 
+    def use_async_delete(self, course):
+        """
+        Проверяет, удалять ли курс асинхронно: по ?async=true или если уроков, подписок и покупок
+        в сумме не меньше COURSE_ASYNC_DELETE_THRESHOLD
+        """
+
+        if self.request.query_params.get("async", "").lower() in ("1", "true"):
+            return True
+        threshold = settings.COURSE_ASYNC_DELETE_THRESHOLD
+        return bool(threshold) and sum(getattr(course, name) for name in Course.COUNTER_FIELDS) >= threshold
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "async", openapi.IN_QUERY, description="Удалить асинхронно (true/false)", type=openapi.TYPE_BOOLEAN
+            )
+        ],
+        responses={202: CourseDeletionSerializer, 204: "Курс удален"},
+    )
+    def destroy(self, request, *args, **kwargs):
+        """
+        Удаляет курс. Большой курс (или при ?async=true) сразу скрывается и удаляется задачей пачками:
+        ответ 202 содержит прогресс удаления, а заголовок Location - адрес, по которому его можно отслеживать
+        """
+
+        course = self.get_object()
+        if not self.use_async_delete(course):
+            return super().destroy(request, *args, **kwargs)
+        with transaction.atomic():
+            deletion = hide_course(course, request.user)
+            if deletion is None:
+                raise NotFound()
+            course_hidden(course, deletion)
+        location = request.build_absolute_uri(reverse("lms:course_deletion", args=[deletion.pk]))
+        return Response(
+            CourseDeletionSerializer(deletion).data, status=status.HTTP_202_ACCEPTED, headers={"Location": location}
+        )
+
     def update(self, request, *args, **kwargs):
         """
         Обновляет курс. Если с последнего обновления прошло 4 и более часа,
@@ -79,6 +374,14 @@ class CourseViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class CourseDeletionRetrieve(generics.RetrieveAPIView):
+    """Вьюсет прогресса асинхронного удаления курса (для инициатора удаления и модераторов)"""
+
+    queryset = CourseDeletion.objects.all()
+    serializer_class = CourseDeletionSerializer
+    permission_classes = [IsAuthenticated, IsModerator | IsOwner]
+
+
 class BaseLessonAPIView(generics.GenericAPIView):
     """Базовый вьюсет урока"""
 
@@ -86,21 +389,46 @@ class BaseLessonAPIView(generics.GenericAPIView):
     serializer_class = LessonSerializer
 
 
-class LessonList(BaseLessonAPIView, generics.ListAPIView):
+class LessonList(ConditionalGetMixin, ResponseCacheMixin, ValuesListMixin, BaseLessonAPIView, generics.ListAPIView):
     """Вьюсет списка уроков"""
 
+    values_serializer_class = LessonValuesSerializer
     filter_backends = [
         OrderingFilter,
     ]
     ordering_fields = ["category", "title"]
     permission_classes = [IsAuthenticated]
     pagination_class = LessonPaginator
+    cache_basename = "lessons"
+
+    def get_queryset(self):
+        """Уроки курсов, скрытых до удаления, не выводятся"""
+        return super().get_queryset().filter(category__is_hidden=False)
+
+    def get_list_validators(self, queryset):
+        """ETag страницы уроков считается по MAX(updated_at) и количеству уроков"""
 
+        aggregates = queryset.aggregate(lessons_updated=Max("updated_at"), lessons_count=Count("id"))
+        return tuple(aggregates.values()), None
 
-class LessonRetrieve(BaseLessonAPIView, generics.RetrieveAPIView):
+
+class LessonRetrieve(ConditionalGetMixin, ResponseCacheMixin, BaseLessonAPIView, generics.RetrieveAPIView):
     """Вьюсет урока"""
 
     permission_classes = [IsAuthenticated, IsModerator | IsOwner]
+    cache_basename = "lessons"
+    cache_per_user = True
+
+
+class LessonBatchRetrieve(BatchRetrieveMixin, BaseLessonAPIView):
+    """Вьюсет пакетного получения уроков по списку ?ids="""
+
+    permission_classes = [IsAuthenticated, IsModerator | IsOwner]
+
+    @swagger_auto_schema(manual_parameters=[BATCH_IDS_PARAMETER])
+    def get(self, request, *args, **kwargs):
+        """Возвращает уроки по списку ?ids= одним запросом в порядке запроса"""
+        return self.batch_retrieve(request, *args, **kwargs)
 
 
 class LessonCreate(BaseLessonAPIView, generics.CreateAPIView):
@@ -113,6 +441,67 @@ class LessonCreate(BaseLessonAPIView, generics.CreateAPIView):
         serializer.save(owner=self.request.user)
 
 
+class LessonBulk(BaseLessonAPIView):
+    """
+    Вьюсет пакетного создания (POST) и изменения (PATCH, элементы с id) уроков.
+    Пакет проверяется целиком и записывается одним bulk_create/bulk_update в одной транзакции:
+    при ошибке в любом элементе ничего не сохраняется, а ошибки возвращаются списком в порядке элементов
+    """
+
+    serializer_class = LessonBulkSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_permissions(self):
+        """Создавать уроки могут не модераторы, изменять - владельцы уроков и модераторы"""
+
+        if self.request.method == "POST":
+            return [IsAuthenticated(), NotModerator()]
+        return super().get_permissions()
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(many=True, allow_empty=False, max_length=settings.LESSON_BULK_MAX_SIZE)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_bulk_instances(self, data):
+        """Возвращает {id: урок} для уроков пакета, которые пользователь может изменять, одним запросом"""
+
+        ids = {item.get("id") for item in data if isinstance(item, dict)} if isinstance(data, list) else set()
+        lessons = Lesson.objects.filter(pk__in=[pk for pk in ids if isinstance(pk, int) and not isinstance(pk, bool)])
+        if not (self.request.user.is_superuser or is_moderator(self.request)):
+            lessons = lessons.filter(owner=self.request.user)
+        return lessons.in_bulk()
+
+    def save_bulk(self, serializer, **kwargs):
+        """Записывает пакет и выполняет действия, которые для одиночных уроков делают сигналы"""
+
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                lessons = serializer.save(**kwargs)
+                lessons_bulk_saved(lessons, getattr(serializer, "previous_category_ids", None))
+        except IntegrityError:
+            raise ValidationError(
+                {"non_field_errors": ["Пакет конфликтует с параллельными изменениями, повторите запрос"]}
+            )
+        return lessons
+
+    @swagger_auto_schema(request_body=LessonBulkSerializer(many=True), responses={201: LessonSerializer(many=True)})
+    def post(self, request, *args, **kwargs):
+        """Создает уроки пакета, владелец - текущий пользователь"""
+
+        serializer = self.get_serializer(data=request.data)
+        self.save_bulk(serializer, owner=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(request_body=LessonBulkSerializer(many=True), responses={200: LessonSerializer(many=True)})
+    def patch(self, request, *args, **kwargs):
+        """Частично изменяет уроки пакета по id"""
+
+        serializer = self.get_serializer(self.get_bulk_instances(request.data), data=request.data, partial=True)
+        self.save_bulk(serializer)
+        return Response(serializer.data)
+
+
 class LessonUpdate(BaseLessonAPIView, generics.UpdateAPIView):
     """Вьюсет редактирования урока"""
 
@@ -125,6 +514,52 @@ class LessonDelete(BaseLessonAPIView, generics.DestroyAPIView):
     permission_classes = [IsAuthenticated, IsOwner]
 
 
+class CatalogSearch(generics.ListAPIView):
+    """Поиск по курсам и урокам с ранжированием результатов"""
+
+    serializer_class = SearchResultSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = SearchPaginator
+    filter_backends = []
+    min_query_length = 2
+
+    def get_queryset(self):
+        """Возвращает ранжированные результаты поиска по параметру ?q="""
+
+        if getattr(self, "swagger_fake_view", False):
+            return Course.objects.none()
+        query = self.request.query_params.get("q", "").strip()
+        if len(query) < self.min_query_length:
+            message = f"Поисковый запрос должен содержать не менее {self.min_query_length} символов"
+            raise ValidationError({"q": message})
+        return search_catalog(query)
+
+
+class CatalogSync(APIView):
+    """Дельта-синхронизация каталога для офлайн-клиентов"""
+
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "since",
+                openapi.IN_QUERY,
+                description="Курсор из поля since предыдущего ответа, без него возвращается весь каталог",
+                type=openapi.TYPE_STRING,
+            )
+        ],
+        responses={200: "Изменения каталога", 400: "Некорректный курсор", 410: "Курсор устарел"},
+    )
+    def get(self, request):
+        """
+        Возвращает курсы и уроки, измененные после курсора ?since=, и id удаленных объектов.
+        При has_more=true нужно повторить запрос с новым since. Строки, измененные незадолго до курсора,
+        могут прийти повторно: клиент заменяет объекты по id
+        """
+        return Response(collect_changes(request, request.query_params.get("since")))
+
+
 class CourseSubscriptionAPIView(APIView):
     """Вьюсет подписки пользователя на курс"""
 
@@ -146,16 +581,66 @@ class CourseSubscriptionAPIView(APIView):
         input_serializer = CourseSubscriptionInputSerializer(data=request.data)
         input_serializer.is_valid(raise_exception=True)
 
-        user = request.user
+        user_id = request.user.pk
         course_id = input_serializer.validated_data["course_id"]
 
-        course = get_object_or_404(Course, id=course_id)
-        subs = CourseSubscription.objects.filter(user=user, course=course).first()
-
-        if subs:
-            subs.delete()
-            return Response({"message": "Подписка удалена"}, status=200)
-        CourseSubscription.objects.create(user=user, course=course)
-        output_serializer = CourseSubscriptionSerializer(subs)
+        with transaction.atomic():
+            if unsubscribe_user(user_id, [course_id]):
+                subscriptions_changed(user_id, unsubscribed=[course_id])
+                return Response({"message": "Подписка удалена"}, status=200)
+            created = subscribe_user(user_id, [course_id])
+            subscriptions_changed(user_id, subscribed=[course_id] if created else ())
+
+        if created:
+            subscription = created[0]
+        elif not Course.visible.filter(pk=course_id).exists():
+            raise NotFound("Курс не найден")
+        else:
+            # подписку только что создал параллельный запрос
+            subscription = get_object_or_404(CourseSubscription, user_id=user_id, course_id=course_id)
+        output_serializer = CourseSubscriptionSerializer(subscription)
 
         return Response(output_serializer.data, status=200)
+
+
+class CourseSubscriptionBulkAPIView(APIView):
+    """Вьюсет пакетной подписки и отписки пользователя от курсов"""
+
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        request_body=CourseSubscriptionBulkSerializer,
+        responses={200: "Списки измененных, неизмененных и несуществующих курсов", 400: "Ошибка запроса"},
+    )
+    def post(self, request):
+        """
+        Подписывает (action=subscribe) или отписывает (action=unsubscribe) пользователя от курсов course_ids
+        в одной транзакции одним запросом. changed - курсы, подписка на которые изменилась,
+        unchanged - уже подписанные (или неподписанные) курсы, not_found - несуществующие курсы
+        """
+        input_serializer = CourseSubscriptionBulkSerializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+
+        user_id = request.user.pk
+        action = input_serializer.validated_data["action"]
+        course_ids = input_serializer.validated_data["course_ids"]
+
+        with transaction.atomic():
+            if action == "subscribe":
+                changed = [subscription.course_id for subscription in subscribe_user(user_id, course_ids)]
+                subscriptions_changed(user_id, subscribed=changed)
+            else:
+                changed = unsubscribe_user(user_id, course_ids)
+                subscriptions_changed(user_id, unsubscribed=changed)
+
+        changed_ids = set(changed)
+        rest = [course_id for course_id in course_ids if course_id not in changed_ids]
+        existing = set(Course.visible.filter(pk__in=rest).values_list("id", flat=True)) if rest else set()
+        return Response(
+            {
+                "action": action,
+                "changed": [course_id for course_id in course_ids if course_id in changed_ids],
+                "unchanged": [course_id for course_id in rest if course_id in existing],
+                "not_found": [course_id for course_id in rest if course_id not in existing],
+            }
+        )
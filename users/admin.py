@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 
+from lms.paginators import EstimatedCountPaginator
 from users.models import CustomUser
 
 
@@ -11,6 +12,9 @@ class CustomUserAdmin(UserAdmin):
 
     model = CustomUser
     list_display = ("email", "username", "city", "avatar_preview", "is_active", "is_staff", "is_superuser")
+    list_select_related = ("city",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = UserAdmin.fieldsets + (
         ("Дополнительная информация", {"fields": ("phone_number", "city", "avatar", "avatar_tag")}),
     )
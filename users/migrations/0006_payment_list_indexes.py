@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_remove_payment_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(fields=["-created_at", "-id"], name="users_payment_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(fields=["user", "-created_at", "-id"], name="users_payment_user_created_idx"),
+        ),
+    ]
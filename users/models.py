@@ -4,6 +4,8 @@ from django.db import models
 
 from phonenumber_field.modelfields import PhoneNumberField
 
+from config.mixins import AtomicSaveMixin
+
 
 class City(models.Model):
     """Класс модели города (РФ)"""
@@ -49,7 +51,7 @@ class CustomUser(AbstractUser):
         ]
 
 
-class Payment(models.Model):
+class Payment(AtomicSaveMixin, models.Model):
     """Класс модели платежа"""
 
     METHOD_CHOICES = [
@@ -104,3 +106,7 @@ class Payment(models.Model):
         verbose_name = "платеж"
         verbose_name_plural = "платежи"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="users_payment_created_idx"),
+            models.Index(fields=["user", "-created_at", "-id"], name="users_payment_user_created_idx"),
+        ]
@@ -1,5 +1,25 @@
 from rest_framework.permissions import BasePermission
 
+from lms.cache import reference_cache
+from users.models import CustomUser
+
+
+def get_moderator_ids():
+    """Возвращает id пользователей группы модераторов из справочного кэша"""
+    return reference_cache.get(
+        "moderator-ids",
+        lambda: frozenset(CustomUser.objects.filter(groups__name="moderators").values_list("id", flat=True)),
+    )
+
+
+def is_moderator(request):
+    """Проверяет, входит ли пользователь в группу модераторов (не более одного запроса к БД на HTTP-запрос)"""
+
+    if not hasattr(request, "_is_moderator"):
+        user = request.user
+        request._is_moderator = user.is_authenticated and user.pk in get_moderator_ids()
+    return request._is_moderator
+
 
 class IsModerator(BasePermission):
     """Проверяет, является ли пользователь авторизованным и модератором"""
@@ -7,7 +27,7 @@ class IsModerator(BasePermission):
     def has_permission(self, request, view):
         if request.user.is_superuser:
             return True
-        return request.user.is_authenticated and request.user.groups.filter(name="moderators").exists()
+        return is_moderator(request)
 
 
 class NotModerator(BasePermission):
@@ -16,7 +36,7 @@ class NotModerator(BasePermission):
     def has_permission(self, request, view):
         if request.user.is_superuser:
             return True
-        return not request.user.groups.filter(name="moderators").exists()
+        return not is_moderator(request)
 
 
 class IsOwner(BasePermission):
@@ -25,7 +45,7 @@ class IsOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.is_superuser:
             return True
-        return obj.owner == request.user
+        return obj.owner_id == request.user.id
 
 
 class IsProfileOwner(BasePermission):
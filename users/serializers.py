@@ -1,6 +1,23 @@
 from rest_framework import serializers
 
-from users.models import CustomUser, Payment
+from users.models import City, CustomUser, Payment
+from users.services import get_cities
+
+
+class CityField(serializers.PrimaryKeyRelatedField):
+    """Поле города: существование города проверяется по справочнику из кэша, без запроса к БД"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        name = get_cities().get(pk)
+        if name is None:
+            self.fail("does_not_exist", pk_value=data)
+        return City(pk=pk, name=name)
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -42,6 +59,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
     """Сериализатор для полного профиля пользователя"""
 
     payments = PaymentSerializer(many=True, read_only=True)
+    city = CityField(queryset=City.objects.all(), required=False, allow_null=True)
 
     class Meta:
         model = CustomUser
@@ -52,6 +70,7 @@ class RegisterSerializer(serializers.ModelSerializer):
     """Сериализатор для регистрации пользователя"""
 
     password = serializers.CharField(write_only=True)
+    city = CityField(queryset=City.objects.all(), required=False, allow_null=True)
 
     class Meta:
         model = CustomUser
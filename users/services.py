@@ -2,9 +2,17 @@ from django.conf import settings
 
 import stripe
 
+from lms.cache import reference_cache
+from users.models import City
+
 stripe.api_key = settings.STRIPE_API_KEY
 
 
+def get_cities():
+    """Возвращает справочник городов {id: название} из справочного кэша"""
+    return reference_cache.get("cities", lambda: dict(City.objects.values_list("id", "name")))
+
+
 def create_stripe_product(name: str):
     """Создает сессию товара в stripe"""
     product = stripe.Product.create(name=name)
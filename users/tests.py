@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from lms.cache import reference_cache
+from lms.models import Course
+from users.models import City, CustomUser, Payment
+
+
+class TestPaymentKeysetPagination(APITestCase):
+    """Тестирует курсорную пагинацию списка платежей по ключу (-created_at, -id)"""
+
+    def setUp(self):
+        """Формирует тестовые данные: платежи с одинаковой датой создания"""
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email="user@test.com", username="user", password="user123")
+        self.client_user = APIClient()
+        self.client_user.force_authenticate(user=self.user)
+        course = Course.objects.create(title="Test Course", owner=self.user)
+        for _ in range(25):
+            Payment.objects.create(user=self.user, paid_course=course, payment_amount=1000)
+        Payment.objects.update(created_at=timezone.now())
+
+    def test_payment_keyset_pages(self):
+        """Проверяет, что при совпадающих created_at платежи не теряются и не повторяются"""
+        url = reverse("users:payment_list")
+        response = self.client_user.get(url, {"pagination": "cursor"})
+        ids = []
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 10)
+            ids.extend(payment["id"] for payment in response.data["results"])
+            if not response.data["next"]:
+                break
+            response = self.client_user.get(response.data["next"])
+        self.assertEqual(ids, list(Payment.objects.order_by("-created_at", "-id").values_list("id", flat=True)))
+
+    def test_payment_offset_pagination_by_default(self):
+        """Проверяет, что по умолчанию список платежей использует постраничную пагинацию"""
+        response = self.client_user.get(reverse("users:payment_list"))
+        self.assertEqual(response.data["count"], 25)
+
+
+@override_settings(REFERENCE_CACHE=True)
+class TestCityReference(APITestCase):
+    """Тестирует проверку города профиля по справочнику из кэша"""
+
+    def setUp(self):
+        """Формирует тестовые данные"""
+        cache.clear()
+        reference_cache.drop_local()
+        self.addCleanup(reference_cache.drop_local)
+        self.city = City.objects.create(name="Москва")
+        self.user = CustomUser.objects.create_user(email="user@test.com", username="user", password="user123")
+        self.client_user = APIClient()
+        self.client_user.force_authenticate(user=self.user)
+        self.url = reverse("users:users-detail", args=[self.user.id])
+
+    def test_city_validated_from_cache(self):
+        """Проверяет сохранение существующего города и ошибку для несуществующего"""
+        self.assertEqual(self.client_user.patch(self.url, {"city": self.city.id}).status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.city, self.city)
+
+        response = self.client_user.patch(self.url, {"city": self.city.id + 100})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("city", response.data)
+
+    def test_new_city_invalidates_cache(self):
+        """Проверяет, что добавленный город сразу доступен"""
+        self.client_user.patch(self.url, {"city": self.city.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            city = City.objects.create(name="Казань")
+        self.assertEqual(self.client_user.patch(self.url, {"city": city.id}).status_code, status.HTTP_200_OK)
@@ -9,7 +9,7 @@ from rest_framework.views import APIView
 
 from lms.models import Course, Lesson
 from users.models import CustomUser, Payment
-from users.permissions import IsModerator, IsOwner, IsProfileOwner
+from users.permissions import IsModerator, IsOwner, IsProfileOwner, is_moderator
 from users.serializers import (
     CustomUserSerializer,
     PaymentCreateSerializer,
@@ -91,7 +91,7 @@ class PaymentListViewSet(generics.ListAPIView):
         """
 
         user = self.request.user
-        if user.is_superuser or user.groups.filter(name="moderators").exists():
+        if user.is_superuser or is_moderator(self.request):
             return Payment.objects.all()
         return Payment.objects.filter(user=user)
 
@@ -110,7 +110,7 @@ class PaymentRetrieveViewSet(generics.RetrieveAPIView):
 
         obj = super().get_object()
         user = self.request.user
-        if user.is_superuser or user.groups.filter(name="moderators").exists():
+        if user.is_superuser or is_moderator(self.request):
             return obj
         if obj.user != user:
             raise PermissionDenied("Вы не можете просматривать чужой платеж")
@@ -132,7 +132,7 @@ class PaymentCreateViewSet(generics.CreateAPIView):
         lesson_id = serializer.validated_data.get("lesson_id")
 
         if course_id:
-            course = get_object_or_404(Course, id=course_id)
+            course = get_object_or_404(Course.visible, id=course_id)
             amount = course.price
             payment = Payment.objects.create(user=user, paid_course=course, payment_amount=amount)
             product_name = f"Оплата курса: {course.title}"